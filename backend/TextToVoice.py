@@ -1,23 +1,44 @@
 import asyncio
 import edge_tts
-import pygame
+import math
 import os
 import logging
-from typing import List, Dict
+import struct
+import time
+from typing import AsyncIterator, List, Dict
+
+from backend.metrics import STAGE_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("EdgeTTS")
 
 class EdgeTextToSpeech:
+    # Format of the audio produced by save_audio_async and stream_audio
+    media_type = "audio/mpeg"
+    extension = ".mp3"
+
     def __init__(self):
         """Initialize Microsoft Edge TTS."""
-        try:
-            pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
-            self.current_voice = "en-US-AriaNeural"
-            logger.info("Edge TTS engine initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize pygame mixer: {e}")
+        self.current_voice = "en-US-AriaNeural"
+        self.mixer = None
+        logger.info("Edge TTS engine initialized successfully")
+
+    def _init_mixer(self):
+        """Initialize the pygame mixer on first local playback.
+
+        Saving audio for the web frontend never touches the audio device, so
+        headless servers do not need one.
+        """
+        if self.mixer is None:
+            try:
+                import pygame
+                pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+                self.mixer = pygame.mixer
+            except Exception as e:
+                logger.error(f"Failed to initialize pygame mixer: {e}")
+                raise
+        return self.mixer
 
     async def speak_async(self, text: str, voice: str = None):
         """Convert text to speech using Edge TTS (async)."""
@@ -33,11 +54,12 @@ class EdgeTextToSpeech:
             await communicate.save(temp_filename)
             
             # Play the audio file
-            pygame.mixer.music.load(temp_filename)
-            pygame.mixer.music.play()
+            mixer = self._init_mixer()
+            mixer.music.load(temp_filename)
+            mixer.music.play()
             
             # Wait for playback to finish
-            while pygame.mixer.music.get_busy():
+            while mixer.music.get_busy():
                 await asyncio.sleep(0.1)
             
             # Clean up temporary file
@@ -56,7 +78,8 @@ class EdgeTextToSpeech:
         """Synchronous wrapper for speak_async."""
         return asyncio.run(self.speak_async(text, voice))
 
-    async def save_audio_async(self, text: str, filename: str, voice: str = None):
+    async def save_audio_async(self, text: str, filename: str, voice: str = None,
+                               rate: str = "+0%", pitch: str = "+0Hz"):
         """Save text-to-speech audio to a file (async)."""
         try:
             voice_to_use = voice or self.current_voice
@@ -66,8 +89,9 @@ class EdgeTextToSpeech:
                 filename += '.mp3'
             
             # Create TTS communication and save
-            communicate = edge_tts.Communicate(text, voice_to_use)
-            await communicate.save(filename)
+            communicate = edge_tts.Communicate(text, voice_to_use, rate=rate, pitch=pitch)
+            with STAGE_SECONDS.time(stage="tts_synthesis"):
+                await communicate.save(filename)
             
             logger.info(f"Audio saved to: {filename}")
             return True
@@ -76,6 +100,21 @@ class EdgeTextToSpeech:
             logger.error(f"Error saving audio: {e}")
             return False
 
+    async def stream_audio(self, text: str, voice: str = None,
+                           rate: str = "+0%", pitch: str = "+0Hz") -> AsyncIterator[bytes]:
+        """Yield MP3 audio chunks as Edge TTS produces them."""
+        voice_to_use = voice or self.current_voice
+        communicate = edge_tts.Communicate(text, voice_to_use, rate=rate, pitch=pitch)
+        started = time.perf_counter()
+        first_chunk = True
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                if first_chunk:
+                    first_chunk = False
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="tts_first_chunk")
+                yield chunk["data"]
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="tts_synthesis")
+
     def save_audio(self, text: str, filename: str, voice: str = None):
         """Synchronous wrapper for save_audio_async."""
         return asyncio.run(self.save_audio_async(text, filename, voice))
@@ -171,6 +210,70 @@ class EdgeTextToSpeech:
             except Exception as e:
                 logger.error(f"Error in interactive mode: {e}")
 
+class ToneTextToSpeech:
+    """Offline stand-in for Edge TTS.
+
+    Renders one short beep per word as 16 kHz mono WAV, so the speech
+    pipeline can be exercised without network access or a speech service.
+    """
+
+    media_type = "audio/wav"
+    extension = ".wav"
+    sample_rate = 16000
+    chunk_size = 8192
+
+    def __init__(self):
+        self.current_voice = "tone"
+        logger.info("Offline tone TTS engine initialized")
+
+    def _render(self, text: str, pitch: str = "+0Hz") -> bytes:
+        """Render the PCM samples for text: 120 ms tone and 60 ms silence per word."""
+        try:
+            frequency = 440 + int(pitch.replace("Hz", ""))
+        except ValueError:
+            frequency = 440
+        tone = [int(8000 * math.sin(2 * math.pi * frequency * i / self.sample_rate))
+                for i in range(int(0.12 * self.sample_rate))]
+        silence = [0] * int(0.06 * self.sample_rate)
+        word = struct.pack(f"<{len(tone) + len(silence)}h", *(tone + silence))
+        return word * max(1, len(text.split()))
+
+    def _wav_header(self, data_size: int) -> bytes:
+        return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, 1,
+                           self.sample_rate, self.sample_rate * 2, 2, 16, b"data", data_size)
+
+    async def stream_audio(self, text: str, voice: str = None,
+                           rate: str = "+0%", pitch: str = "+0Hz") -> AsyncIterator[bytes]:
+        """Yield the WAV header followed by the samples in chunks."""
+        started = time.perf_counter()
+        pcm = self._render(text, pitch)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="tts_first_chunk")
+        yield self._wav_header(len(pcm))
+        for start in range(0, len(pcm), self.chunk_size):
+            await asyncio.sleep(0)
+            yield pcm[start:start + self.chunk_size]
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="tts_synthesis")
+
+    async def save_audio_async(self, text: str, filename: str, voice: str = None,
+                               rate: str = "+0%", pitch: str = "+0Hz"):
+        """Save the rendered audio to a file."""
+        try:
+            with open(filename, "wb") as f:
+                async for chunk in self.stream_audio(text, voice, rate, pitch):
+                    f.write(chunk)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving audio: {e}")
+            return False
+
+
+def create_tts_engine():
+    """Build the speech engine selected by TTS_ENGINE ("edge" or the offline "tone")."""
+    engine = os.getenv("TTS_ENGINE", "edge").lower()
+    if engine == "tone":
+        return ToneTextToSpeech()
+    return EdgeTextToSpeech()
+
 if __name__ == "__main__":
     # Install required packages first
     print("Make sure to install required packages:")
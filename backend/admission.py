@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted to a saturated backend."""
+
+
+class AdmissionLimiter:
+    """Caps concurrent calls to a backend, with a bounded and time-limited wait queue.
+
+    At most ``max_concurrent`` callers hold a slot at once. Up to ``max_queue``
+    more may wait, each for at most ``queue_timeout`` seconds. Anyone beyond
+    that is rejected immediately with ``Overloaded``, so overload turns into
+    fast fallbacks instead of timeouts piling up.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if not self._semaphore.locked():
+            # A free slot is taken without yielding, so the check above stays accurate
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"{self.active} active and {self.waiting} waiting")
+            
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(f"no slot within {self.queue_timeout}s") from None
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+class _LoadAbandoned(Exception):
+    """Tells waiters that the caller running a load was cancelled."""
+
+
+class AsyncTTLCache:
+    """In-memory LRU cache with per-entry expiry and single-flight loading.
+
+    Concurrent ``get_or_load`` calls for a key that is not cached share one
+    call of the loader; only the first caller runs it and the others wait
+    for its result. Entries expire after ``ttl`` seconds and the least
+    recently used ones are evicted beyond ``max_entries`` or, when a
+    ``sizeof`` function is given, beyond ``max_bytes``.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value under key, evicting old entries to stay within bounds."""
+        if key in self._entries:
+            self._remove(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), size, value)
+        self._bytes += size
+        
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def items(self) -> Iterator[Tuple[Hashable, float, Any]]:
+        """Yield (key, seconds left to live, value) for unexpired entries, oldest first."""
+        now = time.monotonic()
+        for key, (expires_at, _, value) in list(self._entries.items()):
+            if expires_at > now:
+                yield key, expires_at - now, value
+
+    def clear(self):
+        """Drop every cached entry; loads in progress are not affected."""
+        self._entries.clear()
+        self._bytes = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Return the cached value, joining an in-flight load or running loader.
+
+        Results for which ``cacheable`` returns False are handed to every
+        waiter but not stored. If the caller running the load is cancelled,
+        the waiters start a new load instead of failing with it.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            
+            if key not in self._inflight:
+                break
+            
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _LoadAbandoned:
+                continue
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            self._fail(future, _LoadAbandoned())
+            raise
+        except Exception as e:
+            self._fail(future, e)
+            raise
+        else:
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception):
+        future.set_exception(error)
+        # Waiters re-raise it; mark it retrieved so a future nobody awaited does not warn
+        future.exception()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,73 @@
+from typing import Dict, Optional, Tuple
+
+class CaptureController:
+    """Chooses how often and how large each client should capture camera frames.
+
+    Clients start at ``base_interval_ms``. The interval doubles for every
+    ``stable_frames`` results in a row with the same emotion, so a student
+    whose expression has not changed for a while is sampled rarely, and
+    drops back as soon as it changes. It also stretches as the inference
+    queue fills, up to five times at a full queue, so under load every
+    client backs off instead of frames piling up. Intervals are capped at
+    ``max_interval_ms``. Above ``reduce_width_load`` the capture width is
+    lowered to ``reduced_width``, except in classroom mode where faces are
+    already small.
+    """
+
+    def __init__(self, base_interval_ms: int, max_interval_ms: int, stable_frames: int,
+                 max_width: int, reduced_width: int, reduce_width_load: float):
+        self.base_interval_ms = base_interval_ms
+        self.max_interval_ms = max(base_interval_ms, max_interval_ms)
+        self.stable_frames = stable_frames
+        self.max_width = max_width
+        self.reduced_width = reduced_width
+        self.reduce_width_load = reduce_width_load
+        # Per client: last emotion, consecutive results with it, and the config last sent
+        self._clients: Dict[str, Dict] = {}
+
+    def observe(self, client_id: str, emotion: str):
+        """Record one emotion result for a client."""
+        state = self._clients.setdefault(client_id, {"emotion": None, "streak": 0, "sent": None})
+        if emotion == state["emotion"]:
+            state["streak"] += 1
+        else:
+            state["emotion"] = emotion
+            state["streak"] = 1
+
+    def target(self, client_id: str, load: float, multi_face: bool = False) -> Tuple[int, int]:
+        """Return (interval_ms, max_width) for a client given the inference queue's fill fraction."""
+        state = self._clients.get(client_id, {"streak": 0})
+        stable_steps = state["streak"] // self.stable_frames if self.stable_frames > 0 else 0
+        interval = self.base_interval_ms * 2 ** min(stable_steps, 16)
+
+        # No slowdown while the queue is mostly empty, up to five times as it fills
+        load = min(max(load, 0.0), 1.0)
+        interval *= 1 + 4 * max(0.0, load - 0.25) / 0.75
+
+        width = self.max_width
+        if load >= self.reduce_width_load and not multi_face:
+            width = min(width, self.reduced_width)
+        return int(min(interval, self.max_interval_ms)), width
+
+    def update(self, client_id: str, load: float, multi_face: bool = False) -> Optional[Dict]:
+        """Return a capture_config message if the client's target changed noticeably since the last one."""
+        interval, width = self.target(client_id, load, multi_face)
+        state = self._clients.setdefault(client_id, {"emotion": None, "streak": 0, "sent": None})
+        sent = state["sent"]
+        # Ignore changes under 20% so small queue fluctuations do not produce a message per frame
+        if sent is not None and sent[1] == width and abs(interval - sent[0]) < 0.2 * sent[0]:
+            return None
+        state["sent"] = (interval, width)
+        return {"type": "capture_config", "interval_ms": interval, "max_width": width}
+
+    def release(self, client_id: str):
+        """Forget a disconnected client."""
+        self._clients.pop(client_id, None)
+
+    def stats(self) -> Dict:
+        intervals = [state["sent"][0] for state in self._clients.values() if state["sent"] is not None]
+        return {
+            "clients": len(self._clients),
+            "avg_interval_ms": sum(intervals) / len(intervals) if intervals else 0.0,
+            "max_interval_ms": max(intervals, default=0),
+        }
@@ -0,0 +1,96 @@
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Characters per token of English text for common LLM tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of text; close enough to budget a prompt without loading a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationBuffer:
+    """Recent turns of one client's conversation, sent with each question as chat history.
+
+    History is capped at ``max_tokens``. Rather than dropping the oldest turn
+    on every question, which would change the start of every prompt, the
+    buffer only trims once the budget is exceeded, and then drops a chunk of
+    old turns at once, down to ``trim_to`` of the budget. Between trims each
+    prompt starts with the previous prompt unchanged, so backends with
+    prefix (KV) caching reuse the work already done for it. The questions
+    of dropped turns are kept as a short note of earlier topics, capped at
+    ``summary_tokens``.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, trim_to: Optional[float] = None,
+                 summary_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv("CONVERSATION_MAX_TOKENS", "1500"))
+        self.trim_to = trim_to if trim_to is not None else float(os.getenv("CONVERSATION_TRIM_TO", "0.5"))
+        if summary_tokens is None:
+            summary_tokens = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "100"))
+        self.summary_tokens = summary_tokens
+        # Each turn: (user message, assistant message, tokens)
+        self._turns: Deque[Tuple[Dict, Dict, int]] = deque()
+        self._tokens = 0
+        self._earlier: Deque[str] = deque()
+        self._earlier_tokens = 0
+        self._messages: Optional[List[Dict]] = None
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the history as sent to the model."""
+        return self._tokens + self._earlier_tokens
+
+    def add(self, prompt: str, emotion: str, response: Dict[str, str]):
+        """Record a question and the answer given to it."""
+        # Same shapes as the request and reply of the current turn, rendered once so they never change
+        user = {"role": "user", "content": json.dumps({"prompt": prompt, "emotion": emotion})}
+        assistant = {"role": "assistant",
+                     "content": json.dumps({"result": response["result"], "diagram": response["diagram"]})}
+        tokens = estimate_tokens(user["content"]) + estimate_tokens(assistant["content"])
+        self._turns.append((user, assistant, tokens))
+        self._tokens += tokens
+
+        if self.tokens > self.max_tokens:
+            self._trim()
+        self._messages = None
+
+    def _trim(self):
+        target = self.max_tokens * self.trim_to
+        while self._turns and self.tokens > target:
+            user, _, tokens = self._turns.popleft()
+            self._tokens -= tokens
+            self._remember(json.loads(user["content"])["prompt"])
+
+    def _remember(self, prompt: str):
+        """Keep a dropped question in the earlier-topics note, forgetting the oldest ones."""
+        topic = " ".join(prompt.split())[:80]
+        self._earlier.append(topic)
+        self._earlier_tokens += estimate_tokens(topic)
+        while self._earlier and self._earlier_tokens > self.summary_tokens:
+            self._earlier_tokens -= estimate_tokens(self._earlier.popleft())
+
+    def messages(self) -> List[Dict]:
+        """Chat messages to put before the current question, oldest first."""
+        if self._messages is None:
+            messages = []
+            if self._earlier:
+                messages.append({"role": "system",
+                                 "content": "Earlier in this conversation the student asked about: "
+                                            + "; ".join(self._earlier)})
+            for user, assistant, _ in self._turns:
+                messages.extend((user, assistant))
+            self._messages = messages
+        return self._messages
+
+    def clear(self):
+        self._turns.clear()
+        self._earlier.clear()
+        self._tokens = 0
+        self._earlier_tokens = 0
+        self._messages = None
@@ -1,87 +1,635 @@
+import asyncio
 import cv2
 import numpy as np
 import base64
 import logging
-from deepface import DeepFace
-from typing import Dict, Tuple, Optional
+import multiprocessing
+import os
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
+
+from backend.metrics import EMOTION_BATCH_SIZE, STAGE_SECONDS
+from backend.protocol import FRAME_GRAY, parse_frame_header
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("EmotionProcessor")
 
+# Output order of the DeepFace emotion model and its expected input size
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+EMOTION_INPUT_SIZE = (48, 48)
+
+# Size of the downsampled face used to spot frames that have not meaningfully changed
+THUMBNAIL_SIZE = (16, 16)
+
 class EmotionProcessor:
     def __init__(self):
         """Initialize the emotion processor."""
         try:
             # Load face cascade classifier
             self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.emotion_model = None
+            
+            # Face tracking: full-frame detection every N frames, padded-region search in between
+            self.redetect_interval = int(os.getenv("FACE_REDETECT_INTERVAL", "10"))
+            self.track_padding = float(os.getenv("FACE_TRACK_PADDING", "0.5"))
+            
+            # Reuse the last emotion while the face differs from the last classified one by at most this fraction
+            self.reuse_threshold = float(os.getenv("EMOTION_REUSE_THRESHOLD", "0.03"))
+            
+            # Classroom cameras see faces much smaller than a webcam close-up
+            self.classroom_min_face = int(os.getenv("CLASSROOM_MIN_FACE", "20"))
             logger.info("Emotion processor initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize emotion processor: {e}")
             raise
     
+    def warmup(self):
+        """Build the emotion model and run one inference so the first real frame is fast."""
+        try:
+            blank = np.zeros((48, 48), dtype=np.uint8)
+            self.classify_faces([blank])
+            logger.info("Emotion model warmed up")
+        except Exception as e:
+            logger.error(f"Error warming up emotion model: {e}")
+    
+    def _get_emotion_model(self):
+        """Return the DeepFace emotion model, building it on first use."""
+        if self.emotion_model is None:
+            # Imported here so only inference workers pay for loading TensorFlow
+            from deepface import DeepFace
+            self.emotion_model = DeepFace.build_model("Emotion")
+        return self.emotion_model
+    
+    def decode_base64_image(self, base64_image: str):
+        """Decode a base64 encoded (optionally data URL) image into a BGR frame."""
+        # Remove data URL prefix if present
+        if ',' in base64_image:
+            base64_image = base64_image.split(',')[1]
+        
+        # Decode base64 image
+        img_data = base64.b64decode(base64_image)
+        nparr = np.frombuffer(img_data, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
+    def decode_binary_frame(self, data: bytes):
+        """Decode a binary frame message straight from the received buffer."""
+        kind, width, height, payload = parse_frame_header(data)
+        nparr = np.frombuffer(payload, np.uint8)
+        
+        if kind == FRAME_GRAY:
+            return nparr.reshape(height, width)
+        
+        # Only the grayscale channel is used downstream, so skip colour decoding
+        return cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    
+    def decode_image(self, image: Union[str, bytes]):
+        """Decode either a base64 string or a binary frame message."""
+        if isinstance(image, str):
+            return self.decode_base64_image(image)
+        return self.decode_binary_frame(image)
+    
+    def _detect(self, gray_image, min_size=(30, 30), max_size=None):
+        """Run the Haar cascade on a grayscale image."""
+        if max_size is None:
+            return self.face_cascade.detectMultiScale(gray_image, scaleFactor=1.1, minNeighbors=5, minSize=min_size)
+        return self.face_cascade.detectMultiScale(gray_image, scaleFactor=1.1, minNeighbors=5, minSize=min_size,
+                                                  maxSize=max_size)
+    
+    def _track_face(self, gray_frame, box):
+        """Search for a face only in a padded region around the previous box."""
+        x, y, w, h = box
+        pad = int(max(w, h) * self.track_padding)
+        frame_h, frame_w = gray_frame.shape[:2]
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(frame_w, x + w + pad), min(frame_h, y + h + pad)
+        
+        # The face barely changes size between frames, so bound the search scales too
+        min_side = max(30, int(min(w, h) * 0.6))
+        max_side = int(max(w, h) * 1.6)
+        faces = self._detect(gray_frame[y0:y1, x0:x1], (min_side, min_side), (max_side, max_side))
+        
+        if len(faces) == 0:
+            return None
+        fx, fy, fw, fh = self._closest_face(faces, (x - x0, y - y0, w, h))
+        return x0 + fx, y0 + fy, fw, fh
+    
+    @staticmethod
+    def _closest_face(faces, box):
+        """Pick the detected face whose centre is nearest the previous box."""
+        cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+        return min(faces, key=lambda f: (f[0] + f[2] / 2 - cx) ** 2 + (f[1] + f[3] / 2 - cy) ** 2)
+    
+    def locate_face(self, gray_frame, track: Optional[Dict] = None) -> Tuple[Optional[Tuple], Dict, str]:
+        """Find the face box, reusing the previous box where possible.
+
+        Returns (box, new_track, detection) where detection is "tracked" when
+        only the region around the previous box was searched and "full" when
+        the whole frame was scanned.
+        """
+        box = track.get("box") if track else None
+        age = track.get("age", 0) if track else 0
+        
+        # Cheap path: refine the previous box unless a periodic full re-detection is due
+        if box is not None and age < self.redetect_interval:
+            tracked = self._track_face(gray_frame, box)
+            if tracked is not None:
+                tracked = tuple(int(v) for v in tracked)
+                return tracked, {"box": tracked, "age": age + 1}, "tracked"
+        
+        # Tracking lost or stale: scan the whole frame
+        faces = self._detect(gray_frame)
+        if len(faces) == 0:
+            return None, {"box": None, "age": 0}, "full"
+        
+        found = self._closest_face(faces, box) if box is not None else faces[0]
+        found = tuple(int(v) for v in found)
+        return found, {"box": found, "age": 0}, "full"
+    
+    def extract_face(self, frame, track: Optional[Dict] = None) -> Tuple[Optional[np.ndarray], Dict, str]:
+        """Locate the face in a BGR or grayscale frame and return (grayscale ROI, new_track, detection)."""
+        # Convert frame to grayscale
+        gray_frame = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        box, track, detection = self.locate_face(gray_frame, track)
+        if box is None:
+            return None, track, detection
+        
+        # Extract the face ROI (Region of Interest)
+        x, y, w, h = box
+        return gray_frame[y:y + h, x:x + w], track, detection
+    
+    @staticmethod
+    def face_thumbnail(face_roi: np.ndarray) -> np.ndarray:
+        """Downsample a face ROI to a tiny, blur-tolerant fingerprint."""
+        return cv2.resize(face_roi, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    
+    @staticmethod
+    def thumbnail_distance(a: np.ndarray, b: np.ndarray) -> float:
+        """Mean absolute pixel difference between two thumbnails, scaled to [0, 1]."""
+        return float(np.mean(cv2.absdiff(a, b))) / 255.0
+    
+    def classify_faces(self, face_rois: List[np.ndarray]) -> List[Tuple[str, Dict]]:
+        """Classify a batch of grayscale face ROIs with a single model call."""
+        if not face_rois:
+            return []
+        
+        # Same preprocessing DeepFace.analyze applies: 48x48 grayscale scaled to [0, 1]
+        batch = np.stack([cv2.resize(roi, EMOTION_INPUT_SIZE) for roi in face_rois]).astype(np.float32) / 255.0
+        batch = np.expand_dims(batch, axis=-1)
+        
+        predictions = self._get_emotion_model().predict(batch, verbose=0)
+        
+        results = []
+        for prediction in predictions:
+            total = float(prediction.sum()) or 1.0
+            scores = {label: 100 * float(prediction[i]) / total for i, label in enumerate(EMOTION_LABELS)}
+            results.append((EMOTION_LABELS[int(np.argmax(prediction))], scores))
+        return results
+    
     def process_base64_image(self, base64_image: str) -> Tuple[Optional[str], Optional[Dict]]:
         """Process a base64 encoded image and return the dominant emotion."""
-        try:
-            # Remove data URL prefix if present
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
-            
-            # Decode base64 image
-            img_data = base64.b64decode(base64_image)
-            nparr = np.frombuffer(img_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
+        result = self.analyze_images([base64_image])[0]
+        return result["emotion"], result["scores"]
+    
+    def decode_images(self, images: List[Union[str, bytes]]) -> List:
+        """Decode several encoded images, using None for any that fail."""
+        frames = []
+        for image in images:
+            try:
+                frame = self.decode_image(image)
+                if frame is None:
+                    logger.error("Failed to decode image")
+                frames.append(frame)
+            except Exception as e:
+                logger.error(f"Error decoding image: {e}")
+                frames.append(None)
+        return frames
+    
+    def analyze_images(self, images: List[Union[str, bytes]], tracks: Optional[List[Optional[Dict]]] = None,
+                       multi_face: Optional[List[bool]] = None,
+                       timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """Decode and analyze several encoded images, classifying all their faces in one model call."""
+        started = time.perf_counter()
+        frames = self.decode_images(images)
+        if timings is not None:
+            timings["decode"] = time.perf_counter() - started
+        return self.analyze_frames(frames, tracks, multi_face, timings)
+    
+    def extract_all_faces(self, frame) -> List[Tuple[Tuple, np.ndarray]]:
+        """Detect every face in a frame and return (box, grayscale ROI) pairs."""
+        gray_frame = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        min_side = self.classroom_min_face
+        faces = self._detect(gray_frame, (min_side, min_side))
+        return [(tuple(int(v) for v in (x, y, w, h)), gray_frame[y:y + h, x:x + w]) for x, y, w, h in faces]
+    
+    @staticmethod
+    def summarize_faces(faces: List[Dict]) -> Tuple[str, Dict[str, float]]:
+        """Return the class-wide dominant emotion and the share of faces showing each emotion."""
+        if not faces:
+            return "neutral", {}
+        counts = {label: 0 for label in EMOTION_LABELS}
+        for face in faces:
+            counts[face["emotion"]] += 1
+        distribution = {label: count / len(faces) for label, count in counts.items()}
+        return max(EMOTION_LABELS, key=lambda label: counts[label]), distribution
+    
+    def analyze_frames(self, frames: List, tracks: Optional[List[Optional[Dict]]] = None,
+                       multi_face: Optional[List[bool]] = None,
+                       timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """Analyze several frames, classifying all located faces in one batched model call.
+
+        Each frame's optional track state lets face location reuse the
+        previous box, and skips classification entirely when the face is
+        nearly identical to the last classified one. Every result is a dict
+        with "emotion", "scores", "track" (to pass back in with the next
+        frame), "detection" and "reused"; a reused result carries no emotion
+        and the caller should repeat its previous one.
+
+        Frames flagged in ``multi_face`` are classroom shots: every detected
+        face is classified (no tracking or reuse) and the result also carries
+        "faces" (box, emotion and scores per face) and "distribution" (share
+        of faces per emotion), with "emotion" set to the class-wide dominant one.
+
+        If a ``timings`` dict is given, the seconds spent locating faces and
+        classifying them are stored in it under "detect" and "classify".
+        """
+        tracks = tracks or [None] * len(frames)
+        multi_face = multi_face or [False] * len(frames)
+        results = [{"emotion": None, "scores": None, "track": track, "detection": None, "reused": False}
+                   for track in tracks]
+        face_rois = []
+        # (frame index, box or thumbnail) for every ROI; single-face frames carry the face thumbnail
+        face_owners = []
+        started = time.perf_counter()
+        
+        for i, frame in enumerate(frames):
             if frame is None:
-                logger.error("Failed to decode image")
-                return None, None
-            
-            return self.process_frame(frame)
-            
+                continue
+            try:
+                if multi_face[i]:
+                    results[i].update(faces=[], detection="full")
+                    for box, face_roi in self.extract_all_faces(frame):
+                        face_rois.append(face_roi)
+                        face_owners.append((i, list(box)))
+                    continue
+                
+                face_roi, track, detection = self.extract_face(frame, tracks[i])
+                results[i].update(track=track, detection=detection)
+                if face_roi is None:
+                    logger.info("No faces detected")
+                    results[i]["emotion"] = "neutral"
+                    continue
+                
+                # Compare against the last classified face, so slow drift still triggers re-inference
+                thumb = self.face_thumbnail(face_roi)
+                previous = tracks[i].get("thumb") if tracks[i] else None
+                if (previous is not None and self.reuse_threshold > 0
+                        and previous.shape == thumb.shape
+                        and self.thumbnail_distance(thumb, previous) <= self.reuse_threshold):
+                    track["thumb"] = previous
+                    results[i]["reused"] = True
+                    continue
+                
+                # Only a successful classification may be repeated for similar faces
+                track["thumb"] = None
+                face_rois.append(face_roi)
+                face_owners.append((i, thumb))
+            except Exception as e:
+                logger.error(f"Error processing frame: {e}")
+                results[i]["emotion"] = "neutral"
+        
+        detected = time.perf_counter()
+        try:
+            for (i, owner), (emotion, emotion_scores) in zip(face_owners, self.classify_faces(face_rois)):
+                if isinstance(owner, list):
+                    results[i]["faces"].append({"box": owner, "emotion": emotion, "scores": emotion_scores})
+                else:
+                    logger.info(f"Detected emotion: {emotion}")
+                    results[i].update(emotion=emotion, scores=emotion_scores)
+                    results[i]["track"]["thumb"] = owner
         except Exception as e:
-            logger.error(f"Error processing base64 image: {e}")
-            return None, None
+            logger.error(f"Error classifying faces: {e}")
+            for i, _ in face_owners:
+                results[i]["emotion"] = "neutral"
+                results[i].pop("faces", None)
+        
+        if timings is not None:
+            timings["detect"] = detected - started
+            timings["classify"] = time.perf_counter() - detected
+        
+        for i, result in enumerate(results):
+            if "faces" in result:
+                result["emotion"], result["distribution"] = self.summarize_faces(result["faces"])
+                logger.info(f"Detected {len(result['faces'])} faces, class emotion: {result['emotion']}")
+        
+        return results
+    
+    def process_frames(self, frames: List) -> List[Tuple[Optional[str], Optional[Dict]]]:
+        """Process several frames, classifying all detected faces in one batched model call."""
+        return [(result["emotion"], result["scores"]) for result in self.analyze_frames(frames)]
     
     def process_frame(self, frame) -> Tuple[Optional[str], Optional[Dict]]:
         """Process a frame and return the dominant emotion."""
+        return self.process_frames([frame])[0]
+
+class EmotionQueueFull(Exception):
+    """Raised when the inference executor has no room for another frame."""
+
+
+# Processor owned by each pool worker, created once by the pool initializer
+_worker_processor: Optional[EmotionProcessor] = None
+
+def _init_worker():
+    """Pool initializer: load the cascade and warm the emotion model in this worker."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = EmotionProcessor()
+        _worker_processor.warmup()
+
+def _worker_ready() -> bool:
+    """Report whether this worker has finished its initializer."""
+    return _worker_processor is not None
+
+def _worker_process_batch(images: List[Union[str, bytes]], tracks: List[Optional[Dict]],
+                          multi_face: List[bool]) -> Tuple[List[Dict], Dict[str, float]]:
+    """Run a batch of frames through the worker's warm processor, timing each stage."""
+    timings = {}
+    results = _worker_processor.analyze_images(images, tracks, multi_face, timings)
+    return results, timings
+
+
+class EmotionInferenceExecutor:
+    """Runs emotion inference off the event loop in a pool of warm workers.
+
+    Frames from all clients are collected into micro-batches of up to
+    ``max_batch_size`` frames or ``max_batch_wait`` seconds, whichever comes
+    first, and each batch is classified with a single model call. Per-client
+    face tracking state is kept here and sent along with each frame, so the
+    workers stay stateless and any worker can serve any client. Submissions
+    beyond ``max_queue_size`` pending frames are rejected with EmotionQueueFull
+    instead of queueing up behind a slow model. If a worker dies the pool is
+    replaced and ``ready`` stays false until the new workers are warm.
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_workers: Optional[int] = None,
+                 max_queue_size: Optional[int] = None, max_batch_size: Optional[int] = None,
+                 max_batch_wait_ms: Optional[float] = None):
+        self.mode = (mode or os.getenv("EMOTION_EXECUTOR", "process")).lower()
+        self.max_workers = max_workers or int(os.getenv("EMOTION_WORKERS", "2"))
+        self.max_queue_size = max_queue_size or int(os.getenv("EMOTION_QUEUE_SIZE", "32"))
+        self.max_batch_size = max_batch_size or int(os.getenv("EMOTION_BATCH_SIZE", "16"))
+        if max_batch_wait_ms is None:
+            max_batch_wait_ms = float(os.getenv("EMOTION_BATCH_WAIT_MS", "30"))
+        self.max_batch_wait = max_batch_wait_ms / 1000.0
+        self._executor = None
+        self.ready = False
+        self._restart_task = None
+        self._pool_restarts = 0
+        self._pending = 0
+        self._batch: List[Tuple[Union[str, bytes], Optional[str], bool, float, asyncio.Future]] = []
+        self._clients: Dict[str, Dict] = {}
+        self._flush_handle = None
+        self._batch_tasks = set()
+        self._frames_processed = 0
+        self._batches_run = 0
+        self._detections = {"full": 0, "tracked": 0}
+        self._reuse_hits = 0
+        self._reuse_misses = 0
+        self._started_at = None
+
+    @property
+    def pending(self) -> int:
+        """Number of frames submitted and not yet finished."""
+        return self._pending
+
+    def start(self):
+        """Create the worker pool."""
+        if self._executor is not None:
+            return
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                thread_name_prefix="emotion")
+        else:
+            # Spawn so workers do not inherit a half-initialised TensorFlow runtime
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        self._started_at = time.monotonic()
+        logger.info(f"Emotion executor started ({self.mode}, {self.max_workers} workers, "
+                    f"queue size {self.max_queue_size}, batch {self.max_batch_size}/"
+                    f"{self.max_batch_wait * 1000:.0f} ms)")
+
+    async def warmup(self):
+        """Start every worker and wait until each has loaded and warmed the model."""
+        self.start()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        # One call per worker makes the pool spawn all of them now rather than on the first frames
+        ready = await asyncio.gather(*[loop.run_in_executor(self._executor, _worker_ready)
+                                       for _ in range(self.max_workers)])
+        self.ready = all(ready)
+        logger.info(f"Emotion workers warm in {time.monotonic() - started:.1f}s")
+
+    def shutdown(self):
+        """Stop the worker pool, dropping frames that have not started yet."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = None
+        for *_, future in self._batch:
+            if not future.done():
+                future.cancel()
+        self._batch = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.ready = False
+            logger.info("Emotion executor stopped")
+
+    def _restart(self, broken):
+        """Replace a pool whose worker died and warm the new one in the background."""
+        # Every batch in flight fails with the same pool; only the first replaces it
+        if self._executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.ready = False
+        self._pool_restarts += 1
+        self._restart_task = asyncio.ensure_future(self._rewarm())
+
+    async def _rewarm(self):
         try:
-            # Convert frame to grayscale
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Convert grayscale frame to RGB format
-            rgb_frame = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2RGB)
-            
-            # Detect faces in the frame
-            faces = self.face_cascade.detectMultiScale(gray_frame, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-            
-            if len(faces) == 0:
-                logger.info("No faces detected")
-                return "neutral", None
-            
-            # Process the first face
-            x, y, w, h = faces[0]
-            
-            # Extract the face ROI (Region of Interest)
-            face_roi = rgb_frame[y:y + h, x:x + w]
-            
-            # Perform emotion analysis on the face ROI
-            result = DeepFace.analyze(face_roi, actions=['emotion'], enforce_detection=False)
-            
-            # Determine the dominant emotion
-            emotion = result[0]['dominant_emotion']
-            emotion_scores = result[0]['emotion']
-            
-            logger.info(f"Detected emotion: {emotion}")
-            
-            return emotion, emotion_scores
-            
+            await self.warmup()
+        except Exception as e:
+            logger.error(f"Error warming replacement emotion workers: {e}")
+        finally:
+            self._restart_task = None
+
+    def stats(self) -> Dict:
+        """Return batching and throughput figures since the pool started."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "frames_processed": self._frames_processed,
+            "batches_run": self._batches_run,
+            "avg_batch_size": self._frames_processed / self._batches_run if self._batches_run else 0.0,
+            "frames_per_second": self._frames_processed / elapsed if elapsed else 0.0,
+            "pending": self._pending,
+            "pool_restarts": self._pool_restarts,
+            "full_detections": self._detections["full"],
+            "tracked_detections": self._detections["tracked"],
+            "reuse_hits": self._reuse_hits,
+            "reuse_misses": self._reuse_misses,
+            "reuse_hit_rate": self.reuse_hit_rate,
+        }
+
+    @property
+    def reuse_hit_rate(self) -> float:
+        """Fraction of classified faces answered from the previous result."""
+        total = self._reuse_hits + self._reuse_misses
+        return self._reuse_hits / total if total else 0.0
+
+    def release_client(self, client_id: str):
+        """Forget the tracking state and last result of a disconnected client."""
+        self._clients.pop(client_id, None)
+
+    async def process_image(self, image: Union[str, bytes], client_id: Optional[str] = None,
+                            multi_face: bool = False) -> Dict:
+        """Queue a base64 image or binary frame message for the next batch and return its analysis.
+
+        The result has "emotion" and "scores"; with ``multi_face`` every face
+        in the frame is classified and it also has "faces" and "distribution".
+        Passing the client_id lets consecutive frames from the same client
+        reuse its last face box instead of scanning the whole frame, and
+        repeat its last emotion when the face has not meaningfully changed.
+        """
+        if self._pending >= self.max_queue_size:
+            raise EmotionQueueFull(f"Emotion queue is full ({self.max_queue_size} pending)")
+        
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((image, client_id, multi_face, time.perf_counter(), future))
+        self._pending += 1
+        
+        if len(self._batch) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_batch_wait, self._flush)
+        
+        try:
+            return await future
+        finally:
+            self._pending -= 1
+
+    def _flush(self):
+        """Send the collected frames to the pool as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        # While every worker is busy keep collecting; the next finished batch flushes again
+        if not self._batch or len(self._batch_tasks) >= self.max_workers:
+            return
+        
+        batch = self._batch[:self.max_batch_size]
+        self._batch = self._batch[self.max_batch_size:]
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._batch_tasks.discard(task)
+        if self._batch:
+            self._flush()
+
+    async def _run_batch(self, batch: List[Tuple[Union[str, bytes], Optional[str], bool, float, asyncio.Future]]):
+        """Classify one batch in a worker and resolve each frame's future."""
+        images = [image for image, *_ in batch]
+        tracks = [self._clients.get(client_id, {}).get("track") if client_id else None
+                  for _, client_id, *_ in batch]
+        multi_face = [multi for _, _, multi, *_ in batch]
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for _, _, _, submitted, _ in batch:
+            STAGE_SECONDS.observe(started - submitted, stage="emotion_queue")
+        EMOTION_BATCH_SIZE.observe(len(batch))
+        executor = self._executor
+        try:
+            results, timings = await loop.run_in_executor(executor, _worker_process_batch,
+                                                          images, tracks, multi_face)
+        except BrokenExecutor as e:
+            logger.error(f"Emotion worker pool broke: {e}")
+            self._restart(executor)
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
         except Exception as e:
-            logger.error(f"Error processing frame: {e}")
-            return "neutral", None
+            logger.error(f"Error running emotion batch: {e}")
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="emotion_batch")
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=f"emotion_{stage}")
+        self._frames_processed += len(batch)
+        self._batches_run += 1
+        logger.debug(f"Emotion batch of {len(batch)} frames done")
+        
+        for (_, client_id, multi, _, future), result in zip(batch, results):
+            if result["detection"]:
+                self._detections[result["detection"]] += 1
+            # A cancelled future means the client went away; do not resurrect its state
+            if future.done():
+                continue
+            if multi or not client_id:
+                future.set_result({key: result[key] for key in ("emotion", "scores", "faces", "distribution")
+                                   if key in result})
+                continue
+            
+            state = self._clients.setdefault(client_id, {})
+            state["track"] = result["track"]
+            emotion, scores = result["emotion"], result["scores"]
+            if result["reused"] and "emotion" in state:
+                self._reuse_hits += 1
+                emotion, scores = state["emotion"], state["scores"]
+            elif result["reused"]:
+                # Nothing to repeat; classify the next frame properly
+                state["track"] = dict(result["track"], thumb=None)
+            elif scores is not None:
+                # Only classified faces are remembered; failed frames must not be repeated
+                self._reuse_misses += 1
+                state["emotion"], state["scores"] = emotion, scores
+            future.set_result({"emotion": emotion, "scores": scores})
 
 # For testing
 if __name__ == "__main__":
+    import sys
+    
+    # Compare per-face and batched classification throughput:
+    #   python -m backend.emotion_processor [batch_size] [rounds]
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    
     processor = EmotionProcessor()
-    # Test with a sample image if available
-    # result = processor.process_frame(cv2.imread('sample.jpg'))
-    # print(f"Detected emotion: {result}")
\ No newline at end of file
+    processor.warmup()
+    rois = [np.random.randint(0, 255, (120, 120), dtype=np.uint8) for _ in range(batch_size)]
+    
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for roi in rois:
+            processor.classify_faces([roi])
+    single = batch_size * rounds / (time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    for _ in range(rounds):
+        processor.classify_faces(rois)
+    batched = batch_size * rounds / (time.perf_counter() - started)
+    
+    print(f"One face per call: {single:.1f} faces/s")
+    print(f"Batches of {batch_size}: {batched:.1f} faces/s")
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("FileCache")
+
+# Temp files older than this were left by a crashed writer; younger ones may be another worker's
+STALE_TMP_SECONDS = 3600
+
+# Seconds between recounts of the directory, which pick up files written by other workers
+RESCAN_INTERVAL = 30
+
+class LRUFileDirectory:
+    """A directory of cached files bounded in total size, evicting the least recently used.
+
+    Files are named by their key plus ``extension``. Writers create them
+    under ``tmp_path`` and rename them into place with ``commit``, so
+    readers never see partial files. Reading a file should ``touch`` it so
+    eviction, which goes by modification time, treats it as recently used.
+
+    Several workers may share the directory. Each adds its own writes to
+    ``total_bytes`` and, once that passes ``max_bytes`` or RESCAN_INTERVAL
+    seconds after the last recount, recounts the whole directory and evicts
+    in a thread, so other workers' files count against the budget without
+    listing the directory on the event loop for every file.
+    """
+
+    def __init__(self, directory: str, extension: str, max_bytes: int, name: str):
+        self.directory = directory
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.name = name
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale_tmp()
+        self.total_bytes = 0
+        self._scanned_at = 0.0
+        self._evicting = False
+        self._scan()
+
+    def _remove_stale_tmp(self):
+        """Discard temp files left by a crash, leaving those other workers are still writing."""
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(self.directory):
+            if ".tmp" not in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _scan(self):
+        """Recount the directory and return its files as (mtime, size, path)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.extension) or ".tmp" in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Evicted by another worker meanwhile
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        self.total_bytes = sum(size for _, size, _ in entries)
+        self._scanned_at = time.monotonic()
+        return entries
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.extension)
+
+    def tmp_path(self, key: str) -> str:
+        """A unique temp file to write the file for key into before committing it."""
+        return os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp{self.extension}")
+
+    def touch(self, path: str):
+        os.utime(path)
+
+    async def commit(self, tmp_path: str, key: str) -> str:
+        """Move a finished temp file into place, evict if due, and return its path."""
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        self.total_bytes += os.path.getsize(path)
+        
+        due = self.total_bytes > self.max_bytes or time.monotonic() - self._scanned_at > RESCAN_INTERVAL
+        if due and not self._evicting:
+            self._evicting = True
+            try:
+                await asyncio.to_thread(self.evict)
+            finally:
+                self._evicting = False
+        return path
+
+    def evict(self):
+        """Recount the directory and remove least recently used files until it fits in max_bytes."""
+        entries = self._scan()
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by another worker
+                pass
+            except OSError as e:
+                logger.error(f"Error evicting {path}: {e}")
+                continue
+            self.total_bytes -= size
+        logger.info(f"{self.name} trimmed to {self.total_bytes / (1024 * 1024):.1f} MB")
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from PIL import Image, ImageOps
+
+from backend.file_cache import LRUFileDirectory
+from backend.metrics import STAGE_SECONDS
+from backend.signing import TokenSigner
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("ImageProxy")
+
+# Redirects followed when downloading a source image, each checked like the original URL
+MAX_REDIRECTS = 5
+
+class ImageTooLarge(Exception):
+    """Raised when a source image exceeds the download limit."""
+
+
+class ForbiddenAddress(Exception):
+    """Raised when a source image URL points at a private, loopback or link-local address."""
+
+
+def make_thumbnail(data: bytes, max_size: int, quality: int) -> bytes:
+    """Downscale an image to fit max_size x max_size and recompress it as JPEG."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", (max_size, max_size))  # cheap JPEG downscale while decoding
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+class ImageProxy:
+    """Fetches third-party images once and serves resized thumbnails from a local cache.
+
+    Clients get URLs carrying the source URL in a signed token from
+    ``register``, so any worker can serve them, and only URLs the server
+    handed out can be fetched, so the endpoint is not an open proxy. Search
+    results are third-party data, so every URL and redirect hop is also
+    resolved and refused if it leads to a non-public address, unless
+    IMAGE_PROXY_ALLOW_PRIVATE is set for local stand-ins.
+    Thumbnails are generated in a thread pool, written atomically under a
+    hash of the URL and thumbnail settings, and the least recently used
+    files are evicted once the cache grows past ``max_bytes``.
+    """
+
+    extension = ".jpg"
+
+    def __init__(self, get_client: Callable[[], httpx.AsyncClient], cache_dir: str, url_prefix: str,
+                 signer: TokenSigner):
+        self.get_client = get_client
+        self.signer = signer
+        self.cache_dir = cache_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.max_size = int(os.getenv("IMAGE_THUMB_SIZE", "480"))
+        self.quality = int(os.getenv("IMAGE_THUMB_QUALITY", "75"))
+        self.max_source_bytes = int(float(os.getenv("IMAGE_PROXY_MAX_SOURCE_MB", "10")) * 1024 * 1024)
+        self.max_bytes = int(float(os.getenv("IMAGE_PROXY_CACHE_MB", "100")) * 1024 * 1024)
+        self.allow_private = os.getenv("IMAGE_PROXY_ALLOW_PRIVATE", "false").lower() == "true"
+        self.files = LRUFileDirectory(cache_dir, self.extension, self.max_bytes, "Image cache")
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv("IMAGE_THUMB_WORKERS", "2")),
+                                        thread_name_prefix="thumbnail")
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def image_id(self, url: str) -> str:
+        """Name of the thumbnail file for url, also used as its ETag."""
+        raw = f"{url}\x00{self.max_size}\x00{self.quality}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def register(self, url: str) -> str:
+        """Allow url to be proxied and return the thumbnail URL to hand to clients."""
+        return f"{self.url_prefix}/{self.signer.dumps(url)}"
+
+    def original_url(self, token: str) -> Optional[str]:
+        """Source URL of a token from register, or None if it is not one of ours."""
+        url = self.signer.loads(token)
+        return url if isinstance(url, str) else None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "files_mb": self.files.total_bytes / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    async def get_thumbnail(self, url: str) -> Optional[str]:
+        """Return the path of the cached thumbnail of url, creating it if needed.
+
+        Returns None if the image could not be fetched or decoded.
+        """
+        image_id = self.image_id(url)
+        path = self.files.path(image_id)
+        if image_id in self._inflight:
+            self.coalesced += 1
+            return path if await asyncio.shield(self._inflight[image_id]) else None
+        if os.path.exists(path):
+            self.hits += 1
+            self.files.touch(path)
+            return path
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[image_id] = future
+        ok = False
+        try:
+            with STAGE_SECONDS.time(stage="image_fetch"):
+                data = await self._fetch(url)
+            with STAGE_SECONDS.time(stage="image_thumbnail"):
+                thumbnail = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, make_thumbnail, data, self.max_size, self.quality)
+
+            tmp_path = self.files.tmp_path(image_id)
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(thumbnail)
+                await self.files.commit(tmp_path, image_id)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            ok = True
+            return path
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Could not create thumbnail for {url}: {e}")
+            return None
+        finally:
+            del self._inflight[image_id]
+            future.set_result(ok)
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return [sockaddr[0] for *_, sockaddr in infos]
+
+    async def _check_url(self, url: httpx.URL):
+        """Refuse URLs that are not http(s) or whose host resolves to a non-public address."""
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ForbiddenAddress(f"Unsupported image URL {url}")
+        if self.allow_private:
+            return
+        
+        for address in await self._resolve(url.host, url.port or (443 if url.scheme == "https" else 80)):
+            ip = ipaddress.ip_address(address.split("%")[0])
+            if ip.version == 6 and ip.ipv4_mapped is not None:
+                ip = ip.ipv4_mapped
+            if not ip.is_global or ip.is_multicast:
+                raise ForbiddenAddress(f"{url.host} resolves to {ip}")
+
+    async def _fetch(self, url: str) -> bytes:
+        """Download url, refusing internal addresses and bodies larger than max_source_bytes."""
+        next_url = httpx.URL(url)
+        # Redirects are followed by hand so every hop is checked before it is requested
+        for _ in range(MAX_REDIRECTS + 1):
+            await self._check_url(next_url)
+            async with self.get_client().stream("GET", next_url, follow_redirects=False) as response:
+                if response.next_request is not None:
+                    next_url = response.next_request.url
+                    continue
+                response.raise_for_status()
+                if int(response.headers.get("content-length") or 0) > self.max_source_bytes:
+                    raise ImageTooLarge(f"{response.headers['content-length']} bytes")
+
+                data = bytearray()
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) > self.max_source_bytes:
+                        raise ImageTooLarge(f"more than {self.max_source_bytes} bytes")
+                return bytes(data)
+        raise httpx.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects from {url}")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -1,152 +1,616 @@
+import asyncio
 import httpx
 import json
+import logging
 import os
-from typing import List, Dict, Optional
+import re
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+from backend.admission import AdmissionLimiter, Overloaded
+from backend.cache import AsyncTTLCache
+from backend.conversation import ConversationBuffer
+from backend.image_proxy import ImageProxy
+from backend.metrics import AI_REQUESTS, STAGE_SECONDS
+from backend.semantic_cache import SemanticCache, create_embedder
+from backend.signing import default_signer
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("ImageAndAI")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_SEMANTIC_CACHE_PATH = os.path.join(DATA_DIR, "semantic_cache")
+
+class ResultFieldExtractor:
+    """Incrementally decodes the "result" string of a streamed JSON object.
+
+    The model answers with ``{"result": "...", "diagram": "..."}``. Fed the
+    raw content chunk by chunk, ``feed`` returns whatever new text of the
+    result value can be decoded so far. Content that is not a JSON object
+    is passed through unchanged, matching the non-streaming fallback.
+    """
+
+    _KEY = re.compile(r'"result"\s*:\s*"')
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = None
+        self._mode = None  # "json", "text" or "done"
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        
+        if self._mode is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return ""
+            self._mode = "json" if stripped.startswith("{") else "text"
+            if self._mode == "text":
+                return self._buffer
+        elif self._mode == "text":
+            return chunk
+        
+        if self._mode == "done":
+            return ""
+        
+        if self._pos is None:
+            match = self._KEY.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+        
+        out = []
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self._mode = "done"
+                pos += 1
+                break
+            if char != '\\':
+                out.append(char)
+                pos += 1
+                continue
+            
+            # Escape sequence; wait for more input if it is cut off
+            if pos + 1 >= len(buffer):
+                break
+            escape = buffer[pos + 1]
+            if escape == 'u':
+                decoded = self._decode_unicode(buffer, pos)
+                if decoded is None:
+                    break
+                text, pos = decoded
+                out.append(text)
+            else:
+                out.append(self._ESCAPES.get(escape, escape))
+                pos += 2
+        
+        self._pos = pos
+        return "".join(out)
+
+    @staticmethod
+    def _decode_unicode(buffer: str, pos: int) -> Optional[Tuple[str, int]]:
+        """Decode the \\u escape at pos into (text, end), or None if more input is needed.
+
+        Characters outside the BMP arrive as a surrogate pair of escapes,
+        which are combined; a lone surrogate cannot be encoded as UTF-8 and
+        becomes U+FFFD.
+        """
+        if pos + 6 > len(buffer):
+            return None
+        try:
+            code = int(buffer[pos + 2:pos + 6], 16)
+        except ValueError:
+            return "", pos + 6
+        if 0xDC00 <= code <= 0xDFFF:
+            return "\ufffd", pos + 6
+        if not 0xD800 <= code <= 0xDBFF:
+            return chr(code), pos + 6
+        
+        # High surrogate; the low one should follow as another escape
+        following = buffer[pos + 6:pos + 12]
+        if len(following) < 6 and "\\u".startswith(following[:2]):
+            return None
+        if following[:2] == "\\u":
+            try:
+                low = int(following[2:], 16)
+            except ValueError:
+                low = 0
+            if 0xDC00 <= low <= 0xDFFF:
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), pos + 12
+        return "\ufffd", pos + 6
+
+
 class ImageAndAIProcessor:
     def __init__(self):
         self.ai_model_url = os.getenv("AI_MODEL_URL", "http://localhost:12345/v1/chat/completions")
         self.rapidapi_key = os.getenv("RAPIDAPI_KEY", "")
         self.rapidapi_host = os.getenv("RAPIDAPI_HOST", "real-time-image-search.p.rapidapi.com")
+        self.image_search_url = os.getenv("RAPIDAPI_URL", f"https://{self.rapidapi_host}/search")
+        
+        # Connection pool and timeout settings shared by the long-lived backend clients
+        self.connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.0"))
+        self.ai_read_timeout = float(os.getenv("AI_READ_TIMEOUT", "10.0"))
+        self.image_read_timeout = float(os.getenv("IMAGE_SEARCH_TIMEOUT", "15.0"))
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+        self.keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0"))
+        self.http2 = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+        
+        # Stream completions when a caller wants partial text
+        self.ai_streaming = os.getenv("AI_STREAMING", "true").lower() == "true"
+        self._ttft_samples = deque(maxlen=1000)
+        
+        # Global cap on concurrent model requests, shared by every client
+        self.ai_limiter = AdmissionLimiter(
+            max_concurrent=int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("AI_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("AI_QUEUE_TIMEOUT", "5.0")))
+        
+        # Cache of recent answers keyed by normalized prompt and emotion
+        self.response_cache = AsyncTTLCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+            max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "16")) * 1024 * 1024),
+            sizeof=lambda r: len(r["result"]) + len(r["diagram"]))
+        
+        # Image search results keyed by normalized diagram query, optionally kept across restarts
+        self.image_cache = AsyncTTLCache(
+            max_entries=int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "500")),
+            ttl=float(os.getenv("IMAGE_CACHE_TTL", "86400")))
+        self.image_cache_path = os.getenv("IMAGE_CACHE_PATH", "")
+        if self.image_cache_path:
+            self._load_image_cache()
+        
+        # Thumbnails of found images served from /api/images instead of third-party hosts
+        self.image_proxy = None
+        if os.getenv("IMAGE_PROXY_ENABLED", "true").lower() == "true":
+            self.image_proxy = ImageProxy(lambda: self.image_client,
+                                          os.getenv("IMAGE_PROXY_CACHE_DIR", os.path.join(DATA_DIR, "image_cache")),
+                                          "/api/images", default_signer())
+        
+        # Optional cache of answers to reworded questions, matched by embedding similarity
+        self.semantic_cache = None
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true":
+            self.semantic_cache = SemanticCache(
+                create_embedder(os.getenv("SEMANTIC_CACHE_EMBEDDER", "hashing")),
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+                ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+                path=os.getenv("SEMANTIC_CACHE_PATH", DEFAULT_SEMANTIC_CACHE_PATH) or None)
+        
+        # One client per backend, created on first use and closed on shutdown
+        self._ai_client: Optional[httpx.AsyncClient] = None
+        self._image_client: Optional[httpx.AsyncClient] = None
+    
+    def _build_client(self, read_timeout: float) -> httpx.AsyncClient:
+        """Create a keep-alive client with pooled connections."""
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+        
+        return httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        )
+    
+    @property
+    def ai_client(self) -> httpx.AsyncClient:
+        """Long-lived client for the LLM backend."""
+        if self._ai_client is None:
+            self._ai_client = self._build_client(self.ai_read_timeout)
+        return self._ai_client
+    
+    @property
+    def image_client(self) -> httpx.AsyncClient:
+        """Long-lived client for the image search backend."""
+        if self._image_client is None:
+            self._image_client = self._build_client(self.image_read_timeout)
+        return self._image_client
+    
+    async def aclose(self):
+        """Close the backend clients and their pooled connections."""
+        for client in (self._ai_client, self._image_client):
+            if client is not None:
+                await client.aclose()
+        self._ai_client = None
+        self._image_client = None
+        
+        if self.image_proxy is not None:
+            self.image_proxy.shutdown()
+        if self.image_cache_path:
+            await asyncio.to_thread(self._save_image_cache)
+        if self.semantic_cache is not None:
+            await asyncio.to_thread(self.semantic_cache.save)
+    
+    @staticmethod
+    def _image_query_key(query: str) -> str:
+        """Normalize a diagram query so repeats across a lesson share a cache entry."""
+        return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
     
     async def get_images(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
-        """Get image URLs from RapidAPI real-time image search."""
+        """Get image URLs for the query, from the cache or RapidAPI real-time image search."""
         try:
-            async with httpx.AsyncClient() as client:
-                url = "https://real-time-image-search.p.rapidapi.com/search"
-                
-                params = {
-                    "query": query,
-                    "limit": max_results,
-                    "size": "any",
-                    "color": "any",
-                    "type": "any",
-                    "time": "any",
-                    "usage_rights": "any",
-                    "file_type": "any",
-                    "aspect_ratio": "any",
-                    "safe_search": "off",
-                    "region": "in"
-                }
-                
-                headers = {
-                    "x-rapidapi-host": self.rapidapi_host,
-                    "x-rapidapi-key": self.rapidapi_key
-                }
-                
-                print(f"Searching images for query: {query}")
-                response = await client.get(url, params=params, headers=headers, timeout=15.0)
-                
-                if response.status_code != 200:
-                    print(f"RapidAPI error: {response.status_code}, response: {response.text}")
-                    return []
+            return await self.image_cache.get_or_load(
+                (self._image_query_key(query), max_results),
+                lambda: self._search_images(query, max_results))
+        except Exception as e:
+            logger.error(f"Error getting images from RapidAPI: {e}")
+            return []
+    
+    async def _search_images(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        """Query RapidAPI; failures raise so they are not cached."""
+        client = self.image_client
+        
+        params = {
+            "query": query,
+            "limit": max_results,
+            "size": "any",
+            "color": "any",
+            "type": "any",
+            "time": "any",
+            "usage_rights": "any",
+            "file_type": "any",
+            "aspect_ratio": "any",
+            "safe_search": "off",
+            "region": "in"
+        }
+        
+        headers = {
+            "x-rapidapi-host": self.rapidapi_host,
+            "x-rapidapi-key": self.rapidapi_key
+        }
+        
+        logger.info(f"Searching images for query: {query}")
+        with STAGE_SECONDS.time(stage="image_search"):
+            response = await client.get(self.image_search_url, params=params, headers=headers)
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"status {response.status_code}, response: {response.text[:200]}")
+        
+        data = response.json()
+        
+        images = []
+        if "data" in data and isinstance(data["data"], list):
+            for item in data["data"][:max_results]:
+                image_url = item.get("url") or item.get("image")
+                source_url = item.get("source") or item.get("source_url") or image_url
+                if image_url:
+                    images.append({
+                        "image_url": image_url,
+                        "source_url": source_url
+                    })
+        
+        logger.info(f"Found {len(images)} images")
+        return images
+    
+    def _load_image_cache(self):
+        """Restore image search results saved by a previous run."""
+        try:
+            with open(self.image_cache_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable image cache {self.image_cache_path}: {e}")
+            return
+        
+        now = time.time()
+        for entry in saved:
+            if entry["expires_at"] > now:
+                self.image_cache.set((entry["query"], entry["max_results"]), entry["images"],
+                                     ttl=entry["expires_at"] - now)
+        logger.info(f"Loaded {len(self.image_cache)} cached image searches")
+    
+    def _save_image_cache(self):
+        """Write unexpired image search results to disk atomically."""
+        now = time.time()
+        saved = [{"query": query, "max_results": max_results, "expires_at": now + ttl, "images": images}
+                 for (query, max_results), ttl, images in self.image_cache.items()]
+        
+        os.makedirs(os.path.dirname(self.image_cache_path) or ".", exist_ok=True)
+        # Unique per process, so workers saving at once each rename a complete file into place
+        tmp_path = f"{self.image_cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, self.image_cache_path)
+    
+    def _request_body(self, prompt: str, emotion: str, stream: bool = False,
+                      history: Optional[List[Dict]] = None) -> Dict:
+        """Build the chat completion request for the teaching assistant model, after any earlier turns."""
+        body = {
+            "model": "ai_teaching_assistant",
+            "messages": list(history or []) + [
+                {"role": "user", "content": json.dumps({"prompt": prompt, "emotion": emotion})}]
+        }
+        if stream:
+            body["stream"] = True
+        return body
+    
+    @staticmethod
+    def _parse_content(msg_content: str) -> Dict[str, str]:
+        """Split the model's JSON message content into result text and diagram query."""
+        try:
+            parsed = json.loads(msg_content)
+            result = parsed.get("result", "")
+            diagram = parsed.get("diagram", "")
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            result = msg_content
+            diagram = ""
+        
+        return {"result": result, "diagram": diagram}
+    
+    @staticmethod
+    def _offline_response(prompt: str, emotion: str) -> Dict[str, str]:
+        """Fallback response when AI service is not available."""
+        emotion_responses = {
+            "happy": "I'm glad you're feeling happy! How can I assist you today?",
+            "sad": "I'm sorry you're feeling down. Is there anything I can do to help?",
+            "angry": "I understand you might be frustrated. Let's work through this together.",
+            "fear": "It's okay to feel anxious sometimes. I'm here to help.",
+            "surprise": "That's quite surprising! Let me help you with that.",
+            "disgust": "I understand your concern. Let me try to help.",
+            "neutral": "I'm here to assist you. What would you like to know?"
+        }
+        
+        # Generate a response based on the emotion and prompt
+        response = emotion_responses.get(emotion, emotion_responses["neutral"])
+        response += f"\n\nRegarding '{prompt}', I'm currently operating in offline mode as the AI service is unavailable. I can still help with basic tasks and information."
+        
+        return {"result": response, "diagram": "", "transient": True}
+    
+    @staticmethod
+    def _error_response(message: str) -> Dict[str, str]:
+        """Response shown when the AI service fails; never cached."""
+        return {"result": message, "diagram": "", "transient": True}
+    
+    @staticmethod
+    def _cache_key(prompt: str, emotion: str) -> Tuple[str, str]:
+        """Normalize a prompt so trivially different phrasings share a cache entry."""
+        normalized = " ".join(prompt.lower().split()).rstrip("?!. ")
+        return normalized, emotion
+    
+    def _record_ttft(self, seconds: float):
+        self._ttft_samples.append(seconds)
+        STAGE_SECONDS.observe(seconds, stage="ai_first_token")
+    
+    def stats(self) -> Dict:
+        """Return time-to-first-token figures and cache counters."""
+        samples = sorted(self._ttft_samples)
+        
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+        
+        return {
+            "ttft_count": len(samples),
+            "ttft_p50_ms": percentile(0.50) * 1000,
+            "ttft_p95_ms": percentile(0.95) * 1000,
+            "limiter": self.ai_limiter.stats(),
+            "response_cache": self.response_cache.stats(),
+            "image_cache": self.image_cache.stats(),
+            "image_proxy": self.image_proxy.stats() if self.image_proxy is not None else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache is not None else None,
+        }
+    
+    async def get_ai_response(self, prompt: str, emotion: str = "neutral",
+                              on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                              conversation: Optional[ConversationBuffer] = None) -> Dict[str, str]:
+        """Get AI response for the given prompt and emotion.
+
+        When ``on_delta`` is given and streaming is enabled, the completion is
+        requested as a stream and every new piece of the ``result`` text is
+        passed to it as soon as it arrives. Answers are cached per normalized
+        prompt and emotion, and identical concurrent prompts share one request.
+        With a ``conversation``, its turns are sent as history and the
+        answer is added to it. Answers given with history depend on that
+        student's conversation, so they bypass the caches.
+        """
+        streamed = False
+        outcome = "cache"
+        history = conversation.messages() if conversation is not None else []
+        
+        async def load() -> Dict[str, str]:
+            nonlocal streamed, outcome
+            vector = None
+            if self.semantic_cache is not None and not history:
+                vector = await self.semantic_cache.embed(prompt)
+                similar = self.semantic_cache.find(vector, emotion)
+                if similar is not None:
+                    outcome = "semantic_cache"
+                    return similar
+            
+            # Fail fast instead of queueing behind a saturated model backend
+            try:
+                async with self.ai_limiter.slot():
+                    streamed = True
+                    with STAGE_SECONDS.time(stage="ai_model"):
+                        response = await self._fetch_ai_response(prompt, emotion, on_delta, history)
+            except Overloaded as e:
+                logger.warning(f"AI backend overloaded, answering with fallback: {e}")
+                outcome = "overloaded"
+                return self._error_response("Lots of questions are coming in right now. "
+                                            "Please ask me again in a moment.")
+            
+            outcome = "fallback" if response.get("transient") else "model"
+            
+            if vector is not None and not response.get("transient"):
+                self.semantic_cache.add(vector, emotion, prompt, response)
+            return response
+        
+        if history:
+            response = await load()
+        else:
+            response = await self.response_cache.get_or_load(
+                self._cache_key(prompt, emotion), load,
+                cacheable=lambda r: not r.get("transient"))
+        AI_REQUESTS.inc(outcome=outcome)
+        
+        # Fallback answers say nothing about the topic; leave them out of the history
+        if conversation is not None and not response.get("transient"):
+            conversation.add(prompt, emotion, response)
+        
+        # Answers from the cache or another caller's request arrive in one piece
+        if on_delta is not None and not streamed and response["result"]:
+            await on_delta(response["result"])
+        
+        return {"result": response["result"], "diagram": response["diagram"]}
+    
+    async def _fetch_ai_response(self, prompt: str, emotion: str,
+                                 on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                                 history: Optional[List[Dict]] = None) -> Dict[str, str]:
+        """Request a completion from the AI model, streaming it if on_delta is given."""
+        if on_delta is not None and self.ai_streaming:
+            return await self.stream_ai_response(prompt, emotion, on_delta, history)
+        
+        try:
+            client = self.ai_client
+            try:
+                resp = await client.post(self.ai_model_url, json=self._request_body(prompt, emotion, history=history))
                 
-                data = response.json()
-                print(f"RapidAPI response: {data}")
+                if resp.status_code != 200:
+                    return self._error_response(f"AI model error: {resp.status_code}")
                 
-                images = []
-                if "data" in data and isinstance(data["data"], list):
-                    for item in data["data"][:max_results]:
-                        image_url = item.get("url") or item.get("image")
-                        source_url = item.get("source") or item.get("source_url") or image_url
-                        if image_url:
-                            images.append({
-                                "image_url": image_url,
-                                "source_url": source_url
-                            })
+                data = resp.json()
+                choices = data.get("choices", [])
+                msg_content = choices[0].get("message", {}).get("content", "") if choices else ""
                 
-                print(f"Found {len(images)} images")
-                return images
+                return self._parse_content(msg_content)
                 
+            except httpx.ConnectError:
+                return self._offline_response(prompt, emotion)
+            
         except Exception as e:
-            print(f"Error getting images from RapidAPI: {e}")
-            return []
+            logger.error(f"Error getting AI response: {e}")
+            return self._error_response("I'm currently experiencing some technical difficulties, but I'm still here to help. Could you please try again or rephrase your question?")
     
-    async def get_ai_response(self, prompt: str, emotion: str = "neutral") -> Dict[str, str]:
-        """Get AI response for the given prompt and emotion."""
+    async def stream_ai_response(self, prompt: str, emotion: str,
+                                 on_delta: Callable[[str], Awaitable[None]],
+                                 history: Optional[List[Dict]] = None) -> Dict[str, str]:
+        """Stream the AI response over SSE, forwarding result text as it is generated."""
         try:
-            async with httpx.AsyncClient() as client:
-                try:
-                    resp = await client.post(
-                        self.ai_model_url,
-                        json={
-                            "model": "ai_teaching_assistant",
-                            "messages": [{"role": "user", "content": json.dumps({"prompt": prompt, "emotion": emotion})}]
-                        },
-                        timeout=10.0  # Reduced timeout for faster fallback
-                    )
-                    
+            started = time.perf_counter()
+            first_token = True
+            content = []
+            extractor = ResultFieldExtractor()
+            
+            try:
+                body = self._request_body(prompt, emotion, stream=True, history=history)
+                async with self.ai_client.stream("POST", self.ai_model_url, json=body) as resp:
                     if resp.status_code != 200:
-                        return {"result": f"AI model error: {resp.status_code}", "diagram": ""}
+                        await resp.aread()
+                        return self._error_response(f"AI model error: {resp.status_code}")
                     
-                    data = resp.json()
-                    choices = data.get("choices", [])
-                    msg_content = choices[0].get("message", {}).get("content", "") if choices else ""
+                    # Backends without streaming support answer with a plain completion
+                    if "text/event-stream" not in resp.headers.get("content-type", ""):
+                        data = json.loads(await resp.aread())
+                        choices = data.get("choices", [])
+                        msg_content = choices[0].get("message", {}).get("content", "") if choices else ""
+                        response = self._parse_content(msg_content)
+                        if response["result"]:
+                            await on_delta(response["result"])
+                        return response
                     
-                    try:
-                        parsed = json.loads(msg_content)
-                        result = parsed.get("result", "")
-                        diagram = parsed.get("diagram", "")
-                    except (json.JSONDecodeError, TypeError):
-                        result = msg_content
-                        diagram = ""
-                    
-                    return {"result": result, "diagram": diagram}
-                    
-                except httpx.ConnectError:
-                    # Fallback response when AI service is not available
-                    emotion_responses = {
-                        "happy": "I'm glad you're feeling happy! How can I assist you today?",
-                        "sad": "I'm sorry you're feeling down. Is there anything I can do to help?",
-                        "angry": "I understand you might be frustrated. Let's work through this together.",
-                        "fear": "It's okay to feel anxious sometimes. I'm here to help.",
-                        "surprise": "That's quite surprising! Let me help you with that.",
-                        "disgust": "I understand your concern. Let me try to help.",
-                        "neutral": "I'm here to assist you. What would you like to know?"
-                    }
-                    
-                    # Generate a response based on the emotion and prompt
-                    response = emotion_responses.get(emotion, emotion_responses["neutral"])
-                    response += f"\n\nRegarding '{prompt}', I'm currently operating in offline mode as the AI service is unavailable. I can still help with basic tasks and information."
-                    
-                    return {"result": response, "diagram": ""}
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[5:].strip()
+                        if payload == "[DONE]":
+                            break
+                        
+                        chunk = json.loads(payload)
+                        choices = chunk.get("choices", [])
+                        token = (choices[0].get("delta", {}).get("content") or "") if choices else ""
+                        if not token:
+                            continue
+                        
+                        if first_token:
+                            first_token = False
+                            ttft = time.perf_counter() - started
+                            self._record_ttft(ttft)
+                            logger.info(f"AI time to first token: {ttft * 1000:.0f} ms")
+                        
+                        content.append(token)
+                        delta = extractor.feed(token)
+                        if delta:
+                            await on_delta(delta)
                 
+                return self._parse_content("".join(content))
+                
+            except httpx.ConnectError:
+                response = self._offline_response(prompt, emotion)
+                await on_delta(response["result"])
+                return response
+            
         except Exception as e:
-            print(f"Error getting AI response: {e}")
-            return {"result": f"I'm currently experiencing some technical difficulties, but I'm still here to help. Could you please try again or rephrase your question?", "diagram": ""}
+            logger.error(f"Error streaming AI response: {e}")
+            return self._error_response("I'm currently experiencing some technical difficulties, but I'm still here to help. Could you please try again or rephrase your question?")
+    
+    async def get_diagram_images(self, diagram: str) -> List[Dict[str, str]]:
+        """Find images for the AI's diagram query, as proxied thumbnails when the proxy is enabled."""
+        # Use only the diagram parameter from AI response as query
+        diagram = diagram.strip()
+        logger.info(f"AI diagram for image search: '{diagram}'")
+        if not diagram:  # Only search for images if diagram is provided
+            logger.info("No diagram provided by AI, skipping image search")
+            return []
+        
+        # Get image URLs using RapidAPI with AI diagram as query
+        images = await self.get_images(diagram, max_results=5)
+        
+        # Hand out proxied thumbnails; the original stays available for linking
+        if self.image_proxy is not None:
+            images = [{**image, "image_url": self.image_proxy.register(image["image_url"]),
+                       "original_url": image["image_url"]} for image in images]
+        return images
     
     async def process_request(self, prompt: str, emotion: str = "neutral") -> Dict:
         """Process complete request: get AI response and image URLs using AI diagram."""
         try:
             # Get AI response first
             ai_response = await self.get_ai_response(prompt, emotion)
-            print(f"AI response: {ai_response}")
-            
-            # Use only the diagram parameter from AI response as query
-            diagram = ai_response.get("diagram", "").strip()
-            print(f"AI diagram for image search: '{diagram}'")
-            
-            # Get image URLs using RapidAPI with AI diagram as query
-            images = []
-            if diagram:  # Only search for images if diagram is provided
-                images = await self.get_images(diagram, max_results=5)
-            else:
-                print("No diagram provided by AI, skipping image search")
+            logger.info(f"AI response: {ai_response}")
             
             return {
                 "result": ai_response.get("result", ""),
                 "diagram": ai_response.get("diagram", ""),
-                "images": images
+                "images": await self.get_diagram_images(ai_response.get("diagram", ""))
             }
             
         except Exception as e:
-            print(f"Error processing request: {e}")
+            logger.error(f"Error processing request: {e}")
             return {
                 "result": f"Error: {str(e)}",
                 "diagram": "",
                 "images": []
-            }
\ No newline at end of file
+            }
+    
+    async def stream_request(self, prompt: str, emotion: str = "neutral") -> AsyncIterator[Dict]:
+        """Yield the answer as soon as it is known, then its images once the search completes."""
+        try:
+            ai_response = await self.get_ai_response(prompt, emotion)
+        except Exception as e:
+            logger.error(f"Error processing request: {e}")
+            yield {"type": "ai_response", "result": f"Error: {str(e)}", "diagram": ""}
+            return
+        
+        yield {"type": "ai_response", **ai_response}
+        yield {"type": "images", "images": await self.get_diagram_images(ai_response.get("diagram", ""))}
@@ -1,24 +1,38 @@
+import time
+
+# Measure cold start from the first line of the app module
+_import_started = time.perf_counter()
+
 import asyncio
+import hmac
+import itertools
 import json
 import logging
 import os
 import sys
-import uuid
 from typing import Dict, List, Optional
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import (FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse,
+                               StreamingResponse)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 # Import the components
-from backend.emotion_processor import EmotionProcessor
-from backend.voice_processor import VoiceProcessor
+from backend.capture_control import CaptureController
+from backend.conversation import ConversationBuffer
+from backend.emotion_processor import EmotionInferenceExecutor, EmotionQueueFull
+from backend.metrics import (ACTIVE_CONNECTIONS, CACHE_REQUESTS, FRAMES_DROPPED, QUEUE_DEPTH, REGISTRY,
+                             STAGE_SECONDS)
+from backend.protocol import MIC_PCM, ProtocolError, pack_audio_chunk, parse_mic_chunk
+from backend.request_context import install_request_id_logging, new_request_id
+from backend.session_store import SessionStore, create_session_store
+from backend.signing import default_signer
 import sys
 import os
 
@@ -27,12 +41,16 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__f
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from backend.TextToVoice import EdgeTextToSpeech
+from backend.TextToVoice import create_tts_engine
 from backend.img_and_ai import ImageAndAIProcessor
+from backend.speech_pipeline import SentenceSplitter, SpeechPipeline
+from backend.speech_to_text import SpeechRecognitionExecutor, SpeechStream
+from backend.tts_cache import TTSCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("backend")
+install_request_id_logging()
 
 # Initialize FastAPI app
 app = FastAPI(title="AI Assistant", description="AI Assistant with emotion detection, voice-to-text, and text-to-voice capabilities")
@@ -52,6 +70,7 @@ PARENT_DIR = os.path.dirname(os.path.dirname(BASE_DIR))
 FRONTEND_DIR = os.path.join(os.path.dirname(BASE_DIR), "frontend")
 TEMPLATES_DIR = os.path.join(FRONTEND_DIR, "templates")
 STATIC_DIR = os.path.join(FRONTEND_DIR, "static")
+TTS_CACHE_DIR = os.path.join(STATIC_DIR, "tts_cache")
 
 # Mount static files directory
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -60,132 +79,410 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 # Initialize components
-emotion_processor = EmotionProcessor()
-voice_processor = VoiceProcessor()
-text_to_speech = EdgeTextToSpeech()
+emotion_executor = EmotionInferenceExecutor()
+text_to_speech = create_tts_engine()
+tts_cache = TTSCache(text_to_speech, TTS_CACHE_DIR)
 ai_processor = ImageAndAIProcessor()
+speech_executor = SpeechRecognitionExecutor()
+
+# Analysis modes: one student at a webcam, or one camera pointed at the whole class
+MODES = ("single", "classroom")
 
 # WebSocket connection manager
 class ConnectionManager:
-    def __init__(self):
+    """Owns this worker's WebSockets and keeps per-client state in the session store.
+
+    The sockets are local to the worker that accepted them; sticky routing
+    keeps each client on one worker, so reads come from a local copy and
+    changes are written through to the shared store. A client reconnecting
+    anywhere resumes its mode, emotion and last exchange. Conversation
+    history for follow-up questions stays in this worker and is released
+    when the client disconnects.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
         self.active_connections: Dict[str, WebSocket] = {}
         self.user_data: Dict[str, Dict] = {}
+        self.conversations: Dict[str, ConversationBuffer] = {}
+        # Token budget of each client's history; 0 sends every question on its own
+        self.conversation_max_tokens = int(os.getenv("CONVERSATION_MAX_TOKENS", "1500"))
 
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str, mode: str = "single"):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        
+        # Resume a previous session if the store has one; the requested mode always wins
+        try:
+            saved = await self.store.load(client_id)
+        except Exception as e:
+            logger.error(f"Could not load session for client {client_id}: {e}")
+            saved = {}
         self.user_data[client_id] = {
             "emotion": "neutral",
             "last_text": "",
-            "last_response": {}
+            "last_response": {},
+            **saved,
+            "mode": mode
         }
-        logger.info(f"Client {client_id} connected. Total connections: {len(self.active_connections)}")
+        await self._save(client_id, mode=mode)
+        logger.info(f"Client {client_id} connected{' (resumed)' if saved else ''}. "
+                    f"Total connections: {len(self.active_connections)}")
 
     def disconnect(self, client_id: str):
+        # The stored session is kept until it expires, for reconnects
         if client_id in self.active_connections:
             del self.active_connections[client_id]
         if client_id in self.user_data:
             del self.user_data[client_id]
+        self.conversations.pop(client_id, None)
         logger.info(f"Client {client_id} disconnected. Total connections: {len(self.active_connections)}")
 
+    async def _save(self, client_id: str, **fields):
+        if client_id not in self.user_data:
+            return
+        self.user_data[client_id].update(fields)
+        try:
+            await self.store.update(client_id, fields)
+        except Exception as e:
+            # Serving the client matters more than persisting its state
+            logger.error(f"Could not save session for client {client_id}: {e}")
+
     async def send_message(self, client_id: str, message: Dict):
         if client_id in self.active_connections:
             await self.active_connections[client_id].send_json(message)
 
+    async def send_bytes(self, client_id: str, data: bytes):
+        if client_id in self.active_connections:
+            await self.active_connections[client_id].send_bytes(data)
+
+    def get_mode(self, client_id: str) -> str:
+        return self.user_data.get(client_id, {}).get("mode", "single")
+
+    async def set_mode(self, client_id: str, mode: str):
+        await self._save(client_id, mode=mode)
+
     def get_emotion(self, client_id: str) -> str:
         return self.user_data.get(client_id, {}).get("emotion", "neutral")
 
-    def set_emotion(self, client_id: str, emotion: str):
-        if client_id in self.user_data:
-            self.user_data[client_id]["emotion"] = emotion
+    async def set_emotion(self, client_id: str, emotion: str):
+        # Emotion arrives with every frame; only changes reach the store
+        if self.get_emotion(client_id) != emotion:
+            await self._save(client_id, emotion=emotion)
 
-    def set_last_text(self, client_id: str, text: str):
-        if client_id in self.user_data:
-            self.user_data[client_id]["last_text"] = text
+    async def set_last_text(self, client_id: str, text: str):
+        await self._save(client_id, last_text=text)
 
     def get_last_text(self, client_id: str) -> str:
         return self.user_data.get(client_id, {}).get("last_text", "")
 
-    def set_last_response(self, client_id: str, response: Dict):
-        if client_id in self.user_data:
-            self.user_data[client_id]["last_response"] = response
+    async def set_last_response(self, client_id: str, response: Dict):
+        await self._save(client_id, last_response=response)
 
     def get_last_response(self, client_id: str) -> Dict:
         return self.user_data.get(client_id, {}).get("last_response", {})
 
+    def get_conversation(self, client_id: str) -> Optional[ConversationBuffer]:
+        """The client's conversation history, or None when history is disabled or the client is gone."""
+        if self.conversation_max_tokens <= 0 or client_id not in self.active_connections:
+            return None
+        if client_id not in self.conversations:
+            self.conversations[client_id] = ConversationBuffer(self.conversation_max_tokens)
+        return self.conversations[client_id]
+
+    def conversation_stats(self) -> Dict:
+        return {
+            "clients": len(self.conversations),
+            "turns": sum(len(c) for c in self.conversations.values()),
+            "tokens": sum(c.tokens for c in self.conversations.values()),
+        }
+
+
+# Per-client frame ingestion
+class LatestFrameSlot:
+    """Holds only the newest unprocessed frame for one client.
+
+    A frame that arrives while an older one is still waiting replaces it, so a
+    slow model never makes a client's emotion results lag behind reality.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        if self._frame is not None:
+            self.dropped += 1
+            FRAMES_DROPPED.inc(reason="superseded")
+        self._frame = frame
+        self.received += 1
+        self._ready.set()
+
+    async def get(self):
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
 
 # Initialize connection manager
-manager = ConnectionManager()
+manager = ConnectionManager(create_session_store())
+
+# Ids for speech streams sent as binary WebSocket audio messages
+audio_stream_ids = itertools.count(1)
+
+# Per-client camera capture rate and size, pushed to clients as capture_config messages
+capture_controller = CaptureController(
+    base_interval_ms=int(os.getenv("CAPTURE_BASE_INTERVAL_MS", "1000")),
+    max_interval_ms=int(os.getenv("CAPTURE_MAX_INTERVAL_MS", "8000")),
+    stable_frames=int(os.getenv("CAPTURE_STABLE_FRAMES", "10")),
+    max_width=int(os.getenv("CAPTURE_MAX_WIDTH", "640")),
+    reduced_width=int(os.getenv("CAPTURE_REDUCED_WIDTH", "320")),
+    reduce_width_load=float(os.getenv("CAPTURE_REDUCE_WIDTH_LOAD", "0.5")))
+
+# Seconds to wait for a superseded answer to unwind before starting the next one
+INTERACTION_CANCEL_TIMEOUT = 1.0
 
 # Define routes
 @app.get("/", response_class=HTMLResponse)
 async def get_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+async def update_capture(client_id: str):
+    """Send the client a new capture interval and width if its target has changed."""
+    load = emotion_executor.pending / emotion_executor.max_queue_size
+    message = capture_controller.update(client_id, load, manager.get_mode(client_id) == "classroom")
+    if message is not None:
+        await manager.send_message(client_id, message)
+
+async def handle_frame(client_id: str, image):
+    """Run one camera frame (base64 data URL or binary frame message) through emotion detection."""
+    try:
+        # In classroom mode every face in the frame is classified in the same batch
+        multi_face = manager.get_mode(client_id) == "classroom"
+        
+        # Process image for emotion detection in the inference pool
+        analysis = await emotion_executor.process_image(image, client_id, multi_face)
+        emotion = analysis["emotion"]
+        
+        if emotion:
+            # Update user's emotion
+            await manager.set_emotion(client_id, emotion)
+            capture_controller.observe(client_id, emotion)
+            
+            # Send emotion back to client
+            message = {"type": "emotion", "emotion": emotion}
+            if multi_face:
+                message["faces"] = analysis.get("faces", [])
+                message["distribution"] = analysis.get("distribution", {})
+            await manager.send_message(client_id, message)
+        
+        # Slow down clients whose emotion is stable or when the queue is filling up
+        await update_capture(client_id)
+        
+    except EmotionQueueFull:
+        # Drop the frame and tell the client to back off; it sends a fresh one later
+        FRAMES_DROPPED.inc(reason="queue_full")
+        logger.warning(f"Emotion queue full, dropping frame from client {client_id}")
+        await update_capture(client_id)
+    
+    except Exception as e:
+        logger.error(f"Error processing emotion: {e}")
+        await manager.send_message(client_id, {"type": "error", "message": str(e)})
+
+async def frame_consumer(client_id: str, slot: LatestFrameSlot):
+    """Process a client's frames one at a time, always taking the newest."""
+    while True:
+        image = await slot.get()
+        await handle_frame(client_id, image)
+
+async def handle_text(client_id: str, text: str):
+    """Answer a recognised utterance: AI response, images, then speech."""
+    # Speak the answer sentence by sentence while it is still being generated,
+    # streaming the audio as binary messages the moment the engine produces it
+    splitter = SentenceSplitter()
+    stream_id = next(audio_stream_ids)
+    stream_started = False
+    fed_deltas = False
+    started = time.perf_counter()
+    
+    # Every log line of this answer carries its id
+    new_request_id()
+    logger.info(f"Answering client {client_id}: {text[:80]!r}")
+    
+    async def send_audio_chunk(index: int, chunk: bytes):
+        nonlocal stream_started
+        if not stream_started:
+            stream_started = True
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="interaction_first_audio")
+            await manager.send_message(client_id, {
+                "type": "audio_stream_start",
+                "stream": stream_id,
+                "mime": text_to_speech.media_type
+            })
+        await manager.send_bytes(client_id, pack_audio_chunk(stream_id, chunk))
+    
+    async def end_audio_segment(index: int):
+        await manager.send_message(client_id, {"type": "audio_segment_end", "stream": stream_id, "index": index})
+    
+    speech = SpeechPipeline(tts_cache.stream, send_audio_chunk, end_audio_segment)
+    
+    try:
+        await manager.set_last_text(client_id, text)
+        
+        # Get current emotion
+        emotion = manager.get_emotion(client_id)
+        
+        # Stream partial answer text to the client while the model is still generating
+        async def send_delta(delta: str):
+            nonlocal fed_deltas
+            fed_deltas = True
+            await manager.send_message(client_id, {"type": "ai_delta", "delta": delta})
+            for sentence in splitter.feed(delta):
+                speech.add(sentence)
+        
+        # Send the text answer as soon as the model has finished it
+        response = await ai_processor.get_ai_response(text, emotion, on_delta=send_delta,
+                                                      conversation=manager.get_conversation(client_id))
+        await manager.send_message(client_id, {"type": "ai_response", "response": response})
+        await manager.set_last_response(client_id, response)
+        
+        # Image search and the rest of the speech are independent; run them side by side
+        async def send_images() -> List[Dict]:
+            images = await ai_processor.get_diagram_images(response.get("diagram", ""))
+            await manager.send_message(client_id, {"type": "images", "images": images})
+            return images
+        
+        async def finish_speech():
+            # Convert the rest of the AI response to speech; answers that never arrived as deltas
+            # (error answers, or streaming disabled) are spoken whole
+            sentences = [] if fed_deltas else splitter.feed(response.get("result", ""))
+            for sentence in sentences + splitter.flush():
+                speech.add(sentence)
+            
+            await speech.finish()
+            if stream_started:
+                await manager.send_message(client_id, {"type": "audio_stream_end", "stream": stream_id})
+        
+        images, _ = await asyncio.gather(send_images(), finish_speech())
+        await manager.set_last_response(client_id, {**response, "images": images})
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="interaction")
+    
+    except asyncio.CancelledError:
+        logger.info(f"Answer for client {client_id} cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Error processing text from client {client_id}: {e}")
+    finally:
+        # Nothing left to deliver after finish(); otherwise drop unsent audio
+        speech.cancel()
+
+async def cancel_interaction(task: Optional[asyncio.Task], client_id: str, reason: str) -> bool:
+    """Cancel a client's answer in progress and tell the client it was dropped."""
+    if task is None or task.done():
+        return False
+    
+    task.cancel()
+    # Let it unwind so none of its messages arrive after the cancellation notice
+    await asyncio.wait({task}, timeout=INTERACTION_CANCEL_TIMEOUT)
+    await manager.send_message(client_id, {"type": "interaction_cancelled", "reason": reason})
+    return True
+
 # WebSocket endpoint for emotion detection
 @app.websocket("/ws/emotion/{client_id}")
-async def websocket_emotion(websocket: WebSocket, client_id: str):
-    await manager.connect(websocket, client_id)
+async def websocket_emotion(websocket: WebSocket, client_id: str, mode: str = "single"):
+    # Log lines about this connection's frames carry the client id; answers get their own ids
+    new_request_id(f"ws-{client_id}")
+    
+    # mode=classroom treats the stream as one camera pointed at the whole class
+    if mode not in MODES:
+        logger.warning(f"Client {client_id} asked for unknown mode {mode!r}")
+        await websocket.close(code=1008, reason=f"Unknown mode: {mode}")
+        return
+    await manager.connect(websocket, client_id, mode)
+    await update_capture(client_id)
+    
+    # Frames go through a latest-wins slot so the receive loop never waits on inference
+    frame_slot = LatestFrameSlot()
+    consumer = asyncio.create_task(frame_consumer(client_id, frame_slot))
+    interaction: Optional[asyncio.Task] = None
+    answer_lock = asyncio.Lock()
+    
+    async def answer(text: str):
+        # A new utterance supersedes whatever the assistant was still answering
+        nonlocal interaction
+        async with answer_lock:
+            await cancel_interaction(interaction, client_id, "superseded")
+            interaction = asyncio.create_task(handle_text(client_id, text))
+    
+    # Microphone audio recognised on the server, for clients without browser speech recognition
+    speech_stream: Optional[SpeechStream] = None
+    mic_rejected = False
+    
+    async def on_transcript(text: str, final: bool):
+        await manager.send_message(client_id, {"type": "transcript", "text": text, "final": final})
+        if final:
+            logger.info(f"Recognised speech from client {client_id}: {text[:80]!r}")
+            await answer(text)
     
     try:
         while True:
-            # Receive data from client
-            data = await websocket.receive_text()
-            json_data = json.loads(data)
+            # Receive data from client: a binary frame or microphone chunk, or a JSON text message
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            if "image" in json_data:
+            data = message.get("bytes")
+            if data is not None:
+                if data[:1] != bytes([MIC_PCM]):
+                    frame_slot.put(data)
+                    continue
+                
+                if not speech_executor.enabled:
+                    # Say so once; the rest of the audio is ignored
+                    if not mic_rejected:
+                        mic_rejected = True
+                        await manager.send_message(client_id, {
+                            "type": "error", "message": "Server speech recognition is disabled"})
+                    continue
+                if speech_stream is None:
+                    speech_stream = SpeechStream(speech_executor, on_transcript)
                 try:
-                    # Process image for emotion detection
-                    emotion, _ = emotion_processor.process_base64_image(json_data["image"])
-                    
-                    if emotion:
-                        # Update user's emotion
-                        manager.set_emotion(client_id, emotion)
-                        
-                        # Send emotion back to client
-                        await manager.send_message(client_id, {"type": "emotion", "emotion": emotion})
-                    
-                except Exception as e:
-                    logger.error(f"Error processing emotion: {e}")
-                    await manager.send_message(client_id, {"type": "error", "message": str(e)})
+                    speech_stream.feed(*parse_mic_chunk(data))
+                except ProtocolError as e:
+                    logger.warning(f"Bad microphone message from client {client_id}: {e}")
+                continue
+            
+            json_data = json.loads(message["text"])
+            
+            if "image" in json_data:
+                # Legacy base64 data URL frame
+                frame_slot.put(json_data["image"])
             
             elif "text" in json_data:
-                # Process text from speech recognition
-                text = json_data["text"]
-                manager.set_last_text(client_id, text)
-                
-                # Get current emotion
-                emotion = manager.get_emotion(client_id)
-                
-                # Process request with AI and get images
-                response = await ai_processor.process_request(text, emotion)
-                manager.set_last_response(client_id, response)
-                
-                # Send AI response back to client
-                await manager.send_message(client_id, {"type": "ai_response", "response": response})
-                
-                # Convert AI response to speech
-                result_text = response.get("result", "")
-                if result_text:
-                    # Generate a unique filename for the audio
-                    audio_filename = f"temp_audio_{uuid.uuid4()}.mp3"
-                    audio_path = os.path.join(STATIC_DIR, audio_filename)
-                    
-                    # Save audio file
-                    await text_to_speech.save_audio_async(result_text, audio_path)
-                    
-                    # Send audio URL back to client
-                    audio_url = f"/static/{audio_filename}"
-                    await manager.send_message(client_id, {"type": "audio", "url": audio_url})
+                await answer(json_data["text"])
+            
+            elif "mode" in json_data:
+                # Switch between single-student and classroom analysis
+                if json_data["mode"] not in MODES:
+                    await manager.send_message(client_id, {
+                        "type": "error", "message": f"Unknown mode: {json_data['mode']}"})
+                    continue
+                await manager.set_mode(client_id, json_data["mode"])
+                emotion_executor.release_client(client_id)
+                await update_capture(client_id)
             
             elif "stop" in json_data and json_data["stop"]:
-                # Simply log that we received a stop message but won't process it
-                logger.info(f"Received stop message from client {client_id} - no final response will be processed")
+                # Abandon the answer in progress: model request, image search and speech
+                cancelled = await cancel_interaction(interaction, client_id, "stopped")
+                logger.info(f"Received stop message from client {client_id}; cancelled in-flight answer: {cancelled}")
                 
-                # We're not processing final responses anymore, just acknowledge receipt
                 await manager.send_message(client_id, {
                     "type": "stop_acknowledged",
-                    "message": "Stop command received"
+                    "message": "Stop command received",
+                    "cancelled": cancelled
                 })
     
     except WebSocketDisconnect:
@@ -193,6 +490,16 @@ async def websocket_emotion(websocket: WebSocket, client_id: str):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         manager.disconnect(client_id)
+    finally:
+        consumer.cancel()
+        emotion_executor.release_client(client_id)
+        capture_controller.release(client_id)
+        if interaction is not None:
+            interaction.cancel()
+        if speech_stream is not None:
+            await speech_stream.close()
+        if frame_slot.dropped:
+            logger.info(f"Client {client_id} superseded {frame_slot.dropped} of {frame_slot.received} frames")
 
 # API endpoint for text-to-speech
 @app.post("/api/text-to-speech")
@@ -201,26 +508,57 @@ async def text_to_speech_api(request: Request):
         data = await request.json()
         text = data.get("text", "")
         voice = data.get("voice", None)
+        rate = data.get("rate", "+0%")
+        pitch = data.get("pitch", "+0Hz")
         
         if not text:
             raise HTTPException(status_code=400, detail="Text is required")
         
-        # Generate a unique filename for the audio
-        audio_filename = f"temp_audio_{uuid.uuid4()}.mp3"
-        audio_path = os.path.join(STATIC_DIR, audio_filename)
+        # Reuse cached audio for identical text and voice settings
+        path = await tts_cache.get_or_synthesize(text, voice, rate, pitch)
         
-        # Save audio file
-        success = await text_to_speech.save_audio_async(text, audio_path, voice)
-        
-        if success:
-            return JSONResponse({"url": f"/static/{audio_filename}"})
+        if path:
+            # The URL carries the request, so any worker or node can serve it, resynthesizing if needed
+            token = default_signer().dumps({"text": text, "voice": voice, "rate": rate, "pitch": pitch})
+            return JSONResponse({"url": f"/api/tts/{token}"})
         else:
             raise HTTPException(status_code=500, detail="Failed to generate speech")
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Text-to-speech API error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Audio handed out by /api/text-to-speech
+@app.get("/api/tts/{token}")
+async def tts_audio_api(token: str):
+    params = default_signer().loads(token)
+    if not isinstance(params, dict) or not params.get("text"):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    path = await tts_cache.get_or_synthesize(params["text"], params.get("voice"),
+                                             params.get("rate", "+0%"), params.get("pitch", "+0Hz"))
+    if path is None:
+        raise HTTPException(status_code=500, detail="Failed to generate speech")
+    return FileResponse(path, media_type=text_to_speech.media_type,
+                        headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+# API endpoint for streaming text-to-speech; GET works directly as an <audio> source
+@app.api_route("/api/text-to-speech/stream", methods=["GET", "POST"])
+async def text_to_speech_stream_api(request: Request):
+    data = dict(request.query_params)
+    if request.method == "POST":
+        data.update(await request.json())
+    
+    text = data.get("text", "")
+    if not text:
+        raise HTTPException(status_code=400, detail="Text is required")
+    
+    # Audio is sent chunk by chunk as it is synthesized, or read from the cache
+    chunks = tts_cache.stream(text, data.get("voice"), data.get("rate", "+0%"), data.get("pitch", "+0Hz"))
+    return StreamingResponse(chunks, media_type=text_to_speech.media_type)
+
 # API endpoint for AI processing
 @app.post("/api/process")
 async def process_api(request: Request):
@@ -232,6 +570,11 @@ async def process_api(request: Request):
         if not prompt:
             raise HTTPException(status_code=400, detail="Prompt is required")
         
+        # Optionally send the answer first and the images as a second NDJSON line once found
+        if data.get("stream_images"):
+            lines = (json.dumps(part) + "\n" async for part in ai_processor.stream_request(prompt, emotion))
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+        
         # Process request with AI and get images
         response = await ai_processor.process_request(prompt, emotion)
         
@@ -253,15 +596,134 @@ async def final_response_api(request: Request):
         "status": "feature_disabled"
     })
 
+# Tag each HTTP request with an id, taken from X-Request-ID when the caller sends one
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = new_request_id(request.headers.get("x-request-id", ""))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def cache_request_counts() -> Dict:
+    """Hit, miss and coalesced lookup counts of every cache, for /metrics."""
+    caches = {
+        "ai_response": ai_processor.response_cache.stats(),
+        "image_search": ai_processor.image_cache.stats(),
+        "tts": tts_cache.stats(),
+    }
+    if ai_processor.semantic_cache is not None:
+        caches["ai_semantic"] = ai_processor.semantic_cache.stats()
+    if ai_processor.image_proxy is not None:
+        caches["image_proxy"] = ai_processor.image_proxy.stats()
+    # Faces answered with the client's previous emotion instead of running the classifier
+    emotion = emotion_executor.stats()
+    caches["emotion_reuse"] = {"hits": emotion["reuse_hits"], "misses": emotion["reuse_misses"]}
+    
+    counts = {}
+    for cache, stats in caches.items():
+        for result in ("hits", "misses", "coalesced"):
+            if result in stats:
+                counts[(cache, result)] = stats[result]
+    return counts
+
+ACTIVE_CONNECTIONS.set_function(lambda: len(manager.active_connections))
+QUEUE_DEPTH.set_function(lambda: {
+    ("emotion_inference",): emotion_executor.pending,
+    ("ai_active",): ai_processor.ai_limiter.active,
+    ("ai_waiting",): ai_processor.ai_limiter.waiting,
+    ("speech_recognition",): speech_executor.pending,
+})
+CACHE_REQUESTS.set_function(cache_request_counts)
+
+# Prometheus metrics: per-stage latency histograms, queue depths, cache and drop counters
+@app.get("/metrics")
+async def metrics_api():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Pipeline statistics
+@app.get("/api/stats")
+async def stats_api():
+    return JSONResponse({
+        "emotion": emotion_executor.stats(),
+        "ai": ai_processor.stats(),
+        "tts_cache": tts_cache.stats(),
+        "speech_recognition": speech_executor.stats(),
+        "conversations": manager.conversation_stats(),
+        "capture": capture_controller.stats(),
+    })
+
+# Thumbnails of images found for AI answers; the signed token carries the source URL
+@app.get("/api/images/{token}")
+async def image_proxy_api(token: str, request: Request):
+    proxy = ai_processor.image_proxy
+    original_url = proxy.original_url(token) if proxy is not None else None
+    if original_url is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # Ids hash the source URL and thumbnail settings, so a thumbnail never changes
+    headers = {"ETag": f'"{proxy.image_id(original_url)}"', "Cache-Control": "public, max-age=86400, immutable"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    path = await proxy.get_thumbnail(original_url)
+    if path is None:
+        # Let the browser try the original host rather than show nothing
+        return RedirectResponse(original_url, status_code=302)
+    
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+# Drop cached AI answers, e.g. after changing the model or its prompt
+@app.post("/api/admin/cache/clear")
+async def clear_cache_api(request: Request):
+    # Disabled unless a token is configured; compare in constant time
+    admin_token = os.getenv("ADMIN_TOKEN", "")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    cleared = len(ai_processor.response_cache)
+    ai_processor.response_cache.clear()
+    if ai_processor.semantic_cache is not None:
+        cleared += len(ai_processor.semantic_cache)
+        ai_processor.semantic_cache.clear()
+    logger.info(f"Cleared {cleared} cached AI responses")
+    return JSONResponse({"cleared": cleared})
+
+# Readiness probe
+@app.get("/api/ready")
+async def ready_api():
+    components = {
+        "emotion_model": emotion_executor.ready,
+    }
+    if speech_executor.enabled:
+        components["speech_model"] = speech_executor.ready
+    ready = all(components.values())
+    return JSONResponse({"ready": ready, "components": components}, status_code=200 if ready else 503)
+
+async def warmup_models():
+    """Load heavy models in the background so the server accepts connections immediately."""
+    try:
+        await asyncio.gather(emotion_executor.warmup(), speech_executor.warmup())
+        logger.info(f"All models warm {time.perf_counter() - _import_started:.1f}s after import")
+    except Exception as e:
+        logger.error(f"Error warming up models: {e}")
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Starting up the server...")
+    logger.info(f"Starting up the server ({time.perf_counter() - _import_started:.2f}s after import)...")
+    app.state.warmup_task = asyncio.create_task(warmup_models())
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down the server...")
+    app.state.warmup_task.cancel()
+    await ai_processor.aclose()
+    await manager.store.close()
+    emotion_executor.shutdown()
+    speech_executor.shutdown()
 
 # Run the FastAPI app with uvicorn
 if __name__ == "__main__":
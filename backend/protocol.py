@@ -0,0 +1,71 @@
+import struct
+from typing import Tuple
+
+# Binary WebSocket messages start with a one-byte message kind.
+#
+# Frame messages (client -> server) carry a camera frame:
+#   kind (uint8) | width (uint16) | height (uint16) | payload
+# where payload is JPEG bytes for FRAME_JPEG or width * height raw 8-bit
+# grayscale pixels for FRAME_GRAY. All integers are big endian.
+FRAME_JPEG = 0x01
+FRAME_GRAY = 0x02
+
+FRAME_HEADER = struct.Struct("!BHH")
+
+# Audio messages (server -> client) carry synthesized speech:
+#   kind (uint8) | stream id (uint32) | encoded audio bytes
+# The stream's format and boundaries are announced by JSON control messages.
+AUDIO_CHUNK = 0x10
+
+AUDIO_HEADER = struct.Struct("!BI")
+
+# Microphone messages (client -> server) carry speech for server-side recognition:
+#   kind (uint8) | sample rate (uint32) | payload
+# where payload is mono 16-bit signed PCM samples in little-endian order, the
+# layout of an Int16Array in the browser.
+MIC_PCM = 0x20
+
+MIC_HEADER = struct.Struct("!BI")
+
+
+class ProtocolError(ValueError):
+    """Raised when a binary message does not follow the wire format."""
+
+
+def parse_frame_header(data: bytes) -> Tuple[int, int, int, memoryview]:
+    """Split a binary frame message into (kind, width, height, payload) without copying the payload."""
+    if len(data) < FRAME_HEADER.size:
+        raise ProtocolError("Binary frame is shorter than its header")
+    
+    kind, width, height = FRAME_HEADER.unpack_from(data)
+    if kind not in (FRAME_JPEG, FRAME_GRAY):
+        raise ProtocolError(f"Unknown binary frame kind: {kind}")
+    
+    payload = memoryview(data)[FRAME_HEADER.size:]
+    if kind == FRAME_GRAY and len(payload) != width * height:
+        raise ProtocolError(f"Grayscale frame has {len(payload)} bytes, expected {width * height}")
+    
+    return kind, width, height, payload
+
+
+def parse_mic_chunk(data: bytes) -> Tuple[int, memoryview]:
+    """Split a binary microphone message into (sample rate, PCM payload) without copying the payload."""
+    if len(data) < MIC_HEADER.size:
+        raise ProtocolError("Microphone message is shorter than its header")
+    
+    kind, sample_rate = MIC_HEADER.unpack_from(data)
+    if kind != MIC_PCM:
+        raise ProtocolError(f"Unknown microphone message kind: {kind}")
+    if not 8000 <= sample_rate <= 96000:
+        raise ProtocolError(f"Unsupported microphone sample rate: {sample_rate}")
+    
+    payload = memoryview(data)[MIC_HEADER.size:]
+    if len(payload) % 2:
+        raise ProtocolError("Microphone payload is not a whole number of 16-bit samples")
+    
+    return sample_rate, payload
+
+
+def pack_audio_chunk(stream_id: int, data: bytes) -> bytes:
+    """Build a binary audio message for one chunk of a speech stream."""
+    return AUDIO_HEADER.pack(AUDIO_CHUNK, stream_id) + data
@@ -0,0 +1,30 @@
+import contextvars
+import logging
+import uuid
+
+# Id of the interaction or HTTP request being handled; asyncio tasks inherit it
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+def new_request_id(request_id: str = "") -> str:
+    """Set the request id for the current context, generating one if none is given."""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    request_id_var.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request id to every log record as ``request_id``."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def install_request_id_logging():
+    """Make the root log handlers tag each line with the current request id."""
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("SemanticCache")
+
+class HashingEmbedder:
+    """Dependency-free embedder hashing words, character n-grams and word order into a fixed vector.
+
+    It catches prompts that differ in filler words, contractions, endings or
+    punctuation, e.g. "What's the process of photosynthesis?" and "what is
+    photosynthesis process". Ordered pairs of nearby words keep questions
+    with the same words in another order apart ("does ice float on water"
+    and "does water float on ice"), and negations count heavily. For real
+    paraphrases configure a sentence-transformers model instead.
+    """
+
+    _STOPWORDS = {
+        "a", "an", "the", "is", "are", "was", "were", "be", "what", "how", "why", "when", "where",
+        "which", "who", "does", "do", "did", "can", "could", "would", "you", "me", "i", "it",
+        "this", "that", "of", "please", "tell", "explain", "about",
+    }
+    _NEGATIONS = {"not", "no", "never", "without"}
+    # Later words paired with each word, so word order changes the vector
+    _PAIR_WINDOW = 3
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        # Versioned so indexes saved with older features are not reused
+        self.name = f"hashing-v2-{dim}"
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        text = text.lower().replace("n't", " not").replace("'s", " is")
+        words = [w for w in re.findall(r"[a-z0-9]+", text) if w not in self._STOPWORDS]
+        # Whole words weigh as much as all their character n-grams together
+        features = [(f"w:{w}", 3.0) for w in words]
+        for word in words:
+            padded = f"<{word}>"
+            features.extend((f"c:{padded[i:i + 4]}", 1.0) for i in range(max(1, len(padded) - 3)))
+        for i, word in enumerate(words):
+            features.extend((f"p:{word}>{later}", 2.0) for later in words[i + 1:i + 1 + self._PAIR_WINDOW])
+        features.extend(("negation", 3.0) for word in words if word in self._NEGATIONS)
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a small sentence-transformers model running on the CPU."""
+
+    def __init__(self, model_name: str):
+        # Lazy import: sentence-transformers is an optional dependency
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def create_embedder(name: str):
+    """Create the configured embedder, falling back to hashing if the model cannot load."""
+    if name and name != "hashing":
+        try:
+            return SentenceTransformerEmbedder(name)
+        except Exception as e:
+            logger.warning(f"Could not load embedding model {name!r} ({e}); using the hashing embedder")
+    return HashingEmbedder()
+
+
+class SemanticCache:
+    """Near-duplicate question cache backed by an in-memory cosine index.
+
+    Prompt embeddings are kept in a preallocated NumPy matrix, so a lookup is
+    one matrix-vector product over at most ``max_entries`` rows. Only answers
+    given for the same emotion are considered. Once full, the least recently
+    used entry is overwritten. The index is saved to ``path`` plus ``.npz``
+    (the matrix with its entries as JSON) and reloaded on start if the
+    embedder matches.
+    """
+
+    def __init__(self, embedder, threshold: float, max_entries: int,
+                 ttl: float = 0.0, path: Optional[str] = None):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._vectors = np.zeros((max_entries, embedder.dim), dtype=np.float32)
+        self._entries: List[Optional[Dict]] = [None] * max_entries
+        self._emotions = np.empty(max_entries, dtype=object)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    async def embed(self, prompt: str) -> np.ndarray:
+        """Embed a prompt off the event loop."""
+        vectors = await asyncio.to_thread(self.embedder.embed, [prompt])
+        return vectors[0]
+
+    def find(self, vector: np.ndarray, emotion: str) -> Optional[Dict[str, str]]:
+        """Return the cached answer closest to vector if it is similar enough."""
+        if self._size == 0:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        scores = self._vectors[:self._size] @ vector
+        scores[self._emotions[:self._size] != emotion] = -1.0
+        if self.ttl:
+            scores[now - self._created[:self._size] > self.ttl] = -1.0
+
+        slot = int(np.argmax(scores))
+        if scores[slot] < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._last_used[slot] = now
+        entry = self._entries[slot]
+        return {"result": entry["result"], "diagram": entry["diagram"]}
+
+    def add(self, vector: np.ndarray, emotion: str, prompt: str, response: Dict[str, str]):
+        """Store an answer, overwriting the least recently used entry when full."""
+        if self._size < self.max_entries:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+            self.evictions += 1
+
+        now = time.time()
+        self._vectors[slot] = vector
+        self._emotions[slot] = emotion
+        self._created[slot] = now
+        self._last_used[slot] = now
+        self._entries[slot] = {
+            "prompt": prompt,
+            "emotion": emotion,
+            "result": response["result"],
+            "diagram": response["diagram"],
+            "created": now,
+        }
+
+    def clear(self):
+        self._entries = [None] * self.max_entries
+        self._last_used[:] = 0
+        self._size = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "embedder": self.embedder.name,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self):
+        """Write the index to disk atomically."""
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        meta = {
+            "embedder": self.embedder.name,
+            "entries": self._entries[:self._size],
+            "last_used": self._last_used[:self._size].tolist(),
+        }
+        # One file under a name unique to this process, so workers saving at once never mix their parts
+        tmp_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex}.tmp.npz"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=self._vectors[:self._size], meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, self.path + ".npz")
+        logger.info(f"Saved {self._size} semantic cache entries to {self.path}")
+
+    def load(self):
+        """Load a saved index, ignoring it if missing, corrupt or from another embedder."""
+        try:
+            with np.load(self.path + ".npz") as data:
+                vectors = data["vectors"]
+                meta = json.loads(str(data["meta"]))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable semantic cache at {self.path}: {e}")
+            return
+
+        if meta.get("embedder") != self.embedder.name or vectors.shape[1:] != (self.embedder.dim,) \
+                or len(vectors) != len(meta["entries"]):
+            logger.info("Saved semantic cache was built with another embedder; starting empty")
+            return
+
+        # Keep the most recently used entries if the cap has shrunk
+        order = np.argsort(meta["last_used"])[::-1][:self.max_entries]
+        for slot, index in enumerate(order):
+            self._vectors[slot] = vectors[index]
+            entry = meta["entries"][index]
+            self._entries[slot] = entry
+            self._emotions[slot] = entry["emotion"]
+            self._created[slot] = entry["created"]
+            self._last_used[slot] = meta["last_used"][index]
+        self._size = len(order)
+        logger.info(f"Loaded {self._size} semantic cache entries from {self.path}")
@@ -0,0 +1,110 @@
+import abc
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("SessionStore")
+
+class SessionStore(abc.ABC):
+    """Per-client session state shared by every worker serving the app.
+
+    State is a flat dict of JSON-serializable fields (mode, emotion,
+    last_text, last_response, ...). Sessions outlive their WebSocket for
+    ``ttl`` seconds so a client that reconnects, possibly to another worker
+    or node, picks up where it left off.
+    """
+
+    @abc.abstractmethod
+    async def load(self, client_id: str) -> Dict:
+        """Return the stored fields for client_id, or an empty dict."""
+
+    @abc.abstractmethod
+    async def update(self, client_id: str, fields: Dict):
+        """Merge fields into the stored session and refresh its expiry."""
+
+    @abc.abstractmethod
+    async def delete(self, client_id: str):
+        """Forget the session for client_id."""
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; sessions are only shared within one worker."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._sessions: Dict[str, Dict] = {}
+        self._expires: Dict[str, float] = {}
+
+    async def load(self, client_id: str) -> Dict:
+        if self._expires.get(client_id, 0) < time.monotonic():
+            self._sessions.pop(client_id, None)
+            self._expires.pop(client_id, None)
+            return {}
+        return dict(self._sessions[client_id])
+
+    async def update(self, client_id: str, fields: Dict):
+        self._sessions.setdefault(client_id, {}).update(fields)
+        self._expires[client_id] = time.monotonic() + self.ttl
+        self._purge()
+
+    async def delete(self, client_id: str):
+        self._sessions.pop(client_id, None)
+        self._expires.pop(client_id, None)
+
+    def _purge(self):
+        """Drop expired sessions once the dict has grown, so it cannot leak."""
+        if len(self._sessions) < 1024:
+            return
+        now = time.monotonic()
+        for client_id in [c for c, expires in self._expires.items() if expires < now]:
+            self._sessions.pop(client_id, None)
+            self._expires.pop(client_id, None)
+
+
+class RedisSessionStore(SessionStore):
+    """Networked store keeping each session in a Redis hash with one JSON value per field.
+
+    Updates write only the changed fields (HSET plus EXPIRE in one
+    pipeline), so concurrent writers never overwrite each other's fields.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "session:"):
+        # Lazy import: redis is only needed when this store is configured
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, decode_responses=True)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def load(self, client_id: str) -> Dict:
+        fields = await self.client.hgetall(self.prefix + client_id)
+        return {name: json.loads(value) for name, value in fields.items()}
+
+    async def update(self, client_id: str, fields: Dict):
+        key = self.prefix + client_id
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def delete(self, client_id: str):
+        await self.client.delete(self.prefix + client_id)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_session_store(url: Optional[str] = None) -> SessionStore:
+    """Build the store named by SESSION_STORE: "memory" or a redis:// URL."""
+    url = url or os.getenv("SESSION_STORE", "memory")
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info(f"Using Redis session store at {url.split('@')[-1]}")
+        return RedisSessionStore(url, ttl)
+    return MemorySessionStore(ttl)
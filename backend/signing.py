@@ -0,0 +1,79 @@
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import zlib
+from typing import Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("Signing")
+
+DEFAULT_SECRET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data",
+                                   "url_signing_secret")
+
+class TokenSigner:
+    """Packs small JSON payloads into URL-safe tokens signed with a shared secret.
+
+    URLs handed to clients carry everything needed to serve them (an image
+    source URL, the text and voice of some speech), so any worker or node
+    can answer them without a shared registry, while the signature keeps
+    the endpoints from fetching or synthesizing arbitrary input.
+    """
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+
+    def _sign(self, body: str) -> str:
+        return hmac.new(self.secret, body.encode("ascii"), hashlib.sha256).hexdigest()[:32]
+
+    def dumps(self, payload: Any) -> str:
+        data = zlib.compress(json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        body = base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+        return f"{body}.{self._sign(body)}"
+
+    def loads(self, token: str) -> Optional[Any]:
+        """Return the payload of a token, or None if it is malformed or not signed by us."""
+        body, _, signature = token.rpartition(".")
+        if not body or not hmac.compare_digest(signature, self._sign(body)):
+            return None
+        try:
+            data = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+            return json.loads(zlib.decompress(data))
+        except (binascii.Error, zlib.error, ValueError):
+            return None
+
+
+def load_secret(path: str = DEFAULT_SECRET_PATH) -> bytes:
+    """Read URL_SIGNING_SECRET, or a secret generated once in path and shared by this node's workers."""
+    secret = os.getenv("URL_SIGNING_SECRET", "")
+    if secret:
+        return secret.encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        # Link a complete temp file into place, so concurrent workers agree on one secret
+        tmp_path = f"{path}.{secrets.token_hex(8)}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(secrets.token_hex(32))
+        os.chmod(tmp_path, 0o600)
+        try:
+            os.link(tmp_path, path)
+            logger.info(f"Generated URL signing secret in {path}; set URL_SIGNING_SECRET when running several nodes")
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip().encode("utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def default_signer() -> TokenSigner:
+    """The signer shared by every endpoint of this process."""
+    return TokenSigner(load_secret())
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("SpeechPipeline")
+
+class SentenceSplitter:
+    """Accumulates streamed answer text and hands out complete sentences.
+
+    Very short sentences are held back and joined with the next one, so the
+    synthesizer is not called for fragments like "Yes." on their own.
+    """
+
+    _BOUNDARY = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n+')
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any sentences it completed."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in self._BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text is left once the answer is complete."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class SpeechPipeline:
+    """Synthesizes sentences concurrently and streams their audio in order.
+
+    Up to ``max_in_flight`` sentences are synthesized at once. Audio chunks
+    of the earliest unfinished sentence go to ``deliver`` as the engine
+    produces them, while chunks of later sentences are buffered until their
+    turn, so the first sentence can play while later ones are still being
+    generated or synthesized. ``end_segment`` is called after the last chunk
+    of each sentence.
+    """
+
+    def __init__(self, synthesize: Callable[[str], AsyncIterator[bytes]],
+                 deliver: Callable[[int, bytes], Awaitable[None]],
+                 end_segment: Callable[[int], Awaitable[None]], max_in_flight: Optional[int] = None):
+        self.synthesize = synthesize
+        self.deliver = deliver
+        self.end_segment = end_segment
+        self.max_in_flight = max_in_flight or int(os.getenv("TTS_MAX_IN_FLIGHT", "3"))
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._segments: asyncio.Queue = asyncio.Queue()
+        self._workers = []
+        self._sender: Optional[asyncio.Task] = None
+        self.count = 0
+
+    def add(self, sentence: str):
+        """Start synthesizing the next sentence."""
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._send_in_order())
+        chunks: asyncio.Queue = asyncio.Queue()
+        self._workers.append(asyncio.create_task(self._synthesize(sentence, chunks)))
+        self._segments.put_nowait(chunks)
+        self.count += 1
+
+    async def _synthesize(self, sentence: str, chunks: asyncio.Queue):
+        async with self._slots:
+            try:
+                async for chunk in self.synthesize(sentence):
+                    chunks.put_nowait(chunk)
+            except Exception as e:
+                logger.error(f"Error synthesizing sentence: {e}")
+            finally:
+                chunks.put_nowait(None)
+
+    async def _send_in_order(self):
+        index = 0
+        while True:
+            chunks = await self._segments.get()
+            if chunks is None:
+                break
+            delivered = False
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                await self.deliver(index, chunk)
+                delivered = True
+            if delivered:
+                await self.end_segment(index)
+                index += 1
+
+    async def finish(self):
+        """Wait until every added sentence has been delivered."""
+        if self._sender is None:
+            return
+        self._segments.put_nowait(None)
+        await self._sender
+
+    def cancel(self):
+        """Abandon synthesis and delivery of anything not yet sent."""
+        if self._sender is not None:
+            self._sender.cancel()
+        for worker in self._workers:
+            worker.cancel()
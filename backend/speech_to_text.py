@@ -0,0 +1,376 @@
+import abc
+import asyncio
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from backend.metrics import STAGE_SECONDS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("SpeechToText")
+
+# Sample rate every recognizer and the voice activity detector work at
+ASR_SAMPLE_RATE = 16000
+
+def pcm_to_samples(payload: memoryview, sample_rate: int) -> np.ndarray:
+    """Decode little-endian 16-bit PCM and resample it to ASR_SAMPLE_RATE as int16."""
+    samples = np.frombuffer(payload, dtype="<i2")
+    if sample_rate == ASR_SAMPLE_RATE or len(samples) == 0:
+        return samples.astype(np.int16)
+
+    # Linear interpolation is enough for speech; browsers send 16 kHz already
+    length = int(len(samples) * ASR_SAMPLE_RATE / sample_rate)
+    positions = np.arange(length) * (sample_rate / ASR_SAMPLE_RATE)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+
+
+class VoiceActivityDetector:
+    """Cuts a stream of 16 kHz int16 samples into utterances by frame energy.
+
+    A frame counts as speech when it is ``threshold_db`` louder than the
+    tracked background noise (and above ``min_dbfs``). An utterance starts
+    after ``start_ms`` of speech, keeps ``pre_roll_ms`` of audio from before
+    that so the first syllable is not clipped, and ends after ``hangover_ms``
+    of silence or once it reaches ``max_segment_s``. Utterances with less
+    than ``min_speech_ms`` of speech are dropped as clicks and coughs.
+    """
+
+    def __init__(self, frame_ms: int = 20, threshold_db: Optional[float] = None,
+                 min_dbfs: Optional[float] = None, start_ms: int = 60, hangover_ms: Optional[int] = None,
+                 pre_roll_ms: int = 300, min_speech_ms: Optional[int] = None,
+                 max_segment_s: Optional[float] = None):
+        self.frame_size = ASR_SAMPLE_RATE * frame_ms // 1000
+        self.threshold_db = threshold_db if threshold_db is not None else float(os.getenv("VAD_THRESHOLD_DB", "12"))
+        self.min_dbfs = min_dbfs if min_dbfs is not None else float(os.getenv("VAD_MIN_DBFS", "-50"))
+        hangover_ms = hangover_ms if hangover_ms is not None else int(os.getenv("VAD_HANGOVER_MS", "600"))
+        min_speech_ms = min_speech_ms if min_speech_ms is not None else int(os.getenv("VAD_MIN_SPEECH_MS", "250"))
+        max_segment_s = max_segment_s or float(os.getenv("VAD_MAX_SEGMENT_S", "15"))
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_segment_frames = int(max_segment_s * 1000 // frame_ms)
+
+        self.noise_db = self.min_dbfs - self.threshold_db
+        self.in_speech = False
+        self.segments_started = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+        # Holds the voiced frames that start an utterance as well as the pre-roll before them
+        self._pre_roll: Deque[np.ndarray] = collections.deque(maxlen=pre_roll_ms // frame_ms + self.start_frames)
+        self._segment: List[np.ndarray] = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        rms = np.sqrt(np.mean(np.square(frame.astype(np.float32) / 32768.0)))
+        level = 20 * np.log10(rms + 1e-10)
+        speech = level > max(self.noise_db + self.threshold_db, self.min_dbfs)
+        if not speech:
+            # Follow the background level slowly, faster when it gets quieter
+            rate = 0.2 if level < self.noise_db else 0.02
+            self.noise_db += rate * (level - self.noise_db)
+        return speech
+
+    def feed(self, samples: np.ndarray) -> List[np.ndarray]:
+        """Consume samples and return the utterances they completed."""
+        samples = np.concatenate([self._remainder, samples]) if len(self._remainder) else samples
+        usable = len(samples) - len(samples) % self.frame_size
+        self._remainder = samples[usable:].copy()
+
+        completed = []
+        for start in range(0, usable, self.frame_size):
+            frame = samples[start:start + self.frame_size]
+            speech = self._is_speech(frame)
+
+            if not self.in_speech:
+                self._pre_roll.append(frame)
+                self._voiced_run = self._voiced_run + 1 if speech else 0
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self.segments_started += 1
+                    self._segment = list(self._pre_roll)
+                    self._pre_roll.clear()
+                    self._speech_frames = self._voiced_run
+                    self._silent_run = 0
+                continue
+
+            self._segment.append(frame)
+            if speech:
+                self._speech_frames += 1
+                self._silent_run = 0
+            else:
+                self._silent_run += 1
+
+            if self._silent_run >= self.hangover_frames or len(self._segment) >= self.max_segment_frames:
+                segment = self._end_segment()
+                if segment is not None:
+                    completed.append(segment)
+        return completed
+
+    def _end_segment(self) -> Optional[np.ndarray]:
+        segment, speech_frames = self._segment, self._speech_frames
+        self.in_speech = False
+        self._segment = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._speech_frames = 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        return np.concatenate(segment)
+
+    def current(self) -> Optional[np.ndarray]:
+        """Audio of the utterance in progress, or None until it has enough speech to keep."""
+        if not self.in_speech or self._speech_frames < self.min_speech_frames:
+            return None
+        return np.concatenate(self._segment)
+
+
+# Offline recognizers, run inside the worker pool
+class Recognizer(abc.ABC):
+    """Turns one utterance of 16 kHz float32 samples in [-1, 1] into text."""
+
+    @abc.abstractmethod
+    def transcribe(self, audio: np.ndarray) -> str:
+        """Return the text spoken in audio, or "" if nothing was recognized."""
+
+
+class VoskRecognizer(Recognizer):
+    """Kaldi recognizer from the vosk package; small models run in real time on one core."""
+
+    def __init__(self, model_path: str):
+        # Lazy import: vosk is only needed when this engine is configured
+        import vosk
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        recognizer = self._vosk.KaldiRecognizer(self.model, ASR_SAMPLE_RATE)
+        recognizer.AcceptWaveform((audio * 32767).astype("<i2").tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class WhisperRecognizer(Recognizer):
+    """Whisper through faster-whisper with int8 weights on the CPU."""
+
+    def __init__(self, model: str, language: str):
+        # Lazy import: faster-whisper is only needed when this engine is configured
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model, device="cpu", compute_type="int8",
+                                  cpu_threads=int(os.getenv("ASR_THREADS_PER_WORKER", "1")))
+        self.language = language or None
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        segments, _ = self.model.transcribe(audio, language=self.language, beam_size=1,
+                                            condition_on_previous_text=False)
+        return "".join(segment.text for segment in segments).strip()
+
+
+def create_recognizer(engine: str, model: str, language: str) -> Recognizer:
+    """Build the recognizer named by ASR_ENGINE."""
+    if engine == "vosk":
+        return VoskRecognizer(model)
+    if engine == "whisper":
+        return WhisperRecognizer(model or "base.en", language)
+    raise ValueError(f"Unknown ASR engine: {engine}")
+
+
+# Per-worker recognizer, loaded once by the pool initializer
+_worker_recognizer: Optional[Recognizer] = None
+
+def _init_worker(engine: str, model: str, language: str):
+    """Pool initializer: load the recognition model in this worker."""
+    global _worker_recognizer
+    if _worker_recognizer is None:
+        _worker_recognizer = create_recognizer(engine, model, language)
+
+def _worker_ready() -> bool:
+    """Report whether this worker has finished its initializer."""
+    return _worker_recognizer is not None
+
+def _worker_transcribe(pcm: bytes) -> str:
+    """Transcribe int16 PCM bytes with the worker's recognizer."""
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    return _worker_recognizer.transcribe(audio).strip()
+
+
+class SpeechRecognitionExecutor:
+    """Runs the offline speech recognizer named by ASR_ENGINE in a pool of warm workers.
+
+    ASR_ENGINE is "vosk" (ASR_MODEL is the model directory), "whisper"
+    (ASR_MODEL is a faster-whisper model name or path) or "none", which
+    disables server-side recognition so clients keep using the browser's.
+    """
+
+    def __init__(self, engine: Optional[str] = None, mode: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        self.engine = (engine or os.getenv("ASR_ENGINE", "none")).lower()
+        self.model = os.getenv("ASR_MODEL", "")
+        self.language = os.getenv("ASR_LANGUAGE", "en")
+        self.mode = (mode or os.getenv("ASR_EXECUTOR", "process")).lower()
+        self.max_workers = max_workers or int(os.getenv("ASR_WORKERS", "2"))
+        self._executor = None
+        self.ready = False
+        self._pending = 0
+        self._transcribed = {"interim": 0, "final": 0}
+        self._audio_seconds = 0.0
+        self._busy_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine != "none"
+
+    @property
+    def pending(self) -> int:
+        """Number of utterances submitted and not yet transcribed."""
+        return self._pending
+
+    def start(self):
+        """Create the worker pool."""
+        if self._executor is not None or not self.enabled:
+            return
+        initargs = (self.engine, self.model, self.language)
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                initargs=initargs, thread_name_prefix="asr")
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 initargs=initargs, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Speech recognition started ({self.engine}, {self.mode}, {self.max_workers} workers)")
+
+    async def warmup(self):
+        """Start every worker and wait until each has loaded the model."""
+        if not self.enabled:
+            return
+        self.start()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        ready = await asyncio.gather(*[loop.run_in_executor(self._executor, _worker_ready)
+                                       for _ in range(self.max_workers)])
+        self.ready = all(ready)
+        logger.info(f"Speech recognition workers warm in {time.monotonic() - started:.1f}s")
+
+    def shutdown(self):
+        """Stop the worker pool, dropping utterances that have not started yet."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.ready = False
+            logger.info("Speech recognition stopped")
+
+    async def transcribe(self, samples: np.ndarray, final: bool = True) -> str:
+        """Transcribe one utterance of ASR_SAMPLE_RATE int16 samples."""
+        self.start()
+        kind = "final" if final else "interim"
+        started = time.perf_counter()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(self._executor, _worker_transcribe, samples.tobytes())
+        finally:
+            self._pending -= 1
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=f"asr_{kind}")
+        self._transcribed[kind] += 1
+        self._audio_seconds += len(samples) / ASR_SAMPLE_RATE
+        self._busy_seconds += elapsed
+        return text
+
+    def stats(self) -> Dict:
+        return {
+            "engine": self.engine,
+            "pending": self._pending,
+            "interim_transcriptions": self._transcribed["interim"],
+            "final_transcriptions": self._transcribed["final"],
+            "audio_seconds": self._audio_seconds,
+            # Below 1.0 means utterances are transcribed faster than they are spoken
+            "real_time_factor": self._busy_seconds / self._audio_seconds if self._audio_seconds else 0.0,
+        }
+
+
+class SpeechStream:
+    """Server-side recognition for one client's microphone.
+
+    Incoming PCM is segmented by voice activity on the event loop, which is
+    cheap; only whole utterances go to the worker pool. Each client has at
+    most one utterance in the pool at a time: finished utterances are
+    transcribed in order, and while the client is still talking the
+    utterance so far is re-transcribed every ``interim_interval`` seconds
+    for an interim result, skipped whenever the previous one is still
+    running so a slow recognizer never falls behind.
+    """
+
+    def __init__(self, executor: SpeechRecognitionExecutor,
+                 on_transcript: Callable[[str, bool], Awaitable[None]],
+                 interim_interval: Optional[float] = None):
+        self.executor = executor
+        self.on_transcript = on_transcript
+        if interim_interval is None:
+            interim_interval = float(os.getenv("ASR_INTERIM_INTERVAL_MS", "800")) / 1000
+        self.interim_interval = interim_interval
+        self.vad = VoiceActivityDetector()
+        self._finals: Deque[np.ndarray] = collections.deque()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._segment = 0
+        self._last_interim = 0.0
+
+    def feed(self, sample_rate: int, payload: memoryview):
+        """Add a chunk of microphone audio."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        self._finals.extend(self.vad.feed(pcm_to_samples(payload, sample_rate)))
+        if self.vad.in_speech and self.vad.segments_started != self._segment:
+            # First interim result one interval after the utterance started
+            self._segment = self.vad.segments_started
+            self._last_interim = time.monotonic()
+        if self._finals or self._interim_due():
+            self._wake.set()
+
+    def _interim_due(self) -> bool:
+        return (self.interim_interval > 0 and self.vad.in_speech
+                and time.monotonic() - self._last_interim >= self.interim_interval)
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+
+            while self._finals:
+                segment = self._finals.popleft()
+                try:
+                    text = await self.executor.transcribe(segment, final=True)
+                except Exception as e:
+                    logger.error(f"Speech recognition failed: {e}")
+                    continue
+                if text:
+                    await self.on_transcript(text, True)
+
+            audio = self.vad.current() if self._interim_due() else None
+            if audio is not None:
+                segment = self._segment
+                self._last_interim = time.monotonic()
+                try:
+                    text = await self.executor.transcribe(audio, final=False)
+                except Exception as e:
+                    logger.error(f"Speech recognition failed: {e}")
+                    continue
+                # Stale once the utterance has ended; its final result follows
+                if text and self.vad.in_speech and self._segment == segment and not self._finals:
+                    await self.on_transcript(text, False)
+
+    async def close(self):
+        """Stop recognition, dropping audio not transcribed yet."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from typing import AsyncIterator, Dict, Optional
+
+from backend.file_cache import LRUFileDirectory
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("TTSCache")
+
+class _SynthesisAbandoned(Exception):
+    """Tells waiters that the caller synthesizing the audio was cancelled."""
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized speech files.
+
+    Audio is stored under a hash of (normalized text, voice, rate, pitch), so
+    repeated answers and fallback messages are synthesized once. Files are
+    written atomically, concurrent requests for the same key share a single
+    synthesis, and the least recently used files are evicted once the
+    directory grows past ``max_bytes``. Audio can be fetched as a file or
+    streamed chunk by chunk while it is still being synthesized.
+    """
+
+    read_chunk_size = 16384
+
+    def __init__(self, tts, cache_dir: str, max_bytes: Optional[int] = None):
+        self.tts = tts
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or int(float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        self.files = LRUFileDirectory(cache_dir, tts.extension, self.max_bytes, "TTS cache")
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip()
+
+    def key(self, text: str, voice: str, rate: str, pitch: str) -> str:
+        raw = "\x00".join([self.normalize(text), voice, rate, pitch])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "bytes": self.files.total_bytes,
+        }
+
+    async def get_or_synthesize(self, text: str, voice: Optional[str] = None,
+                                rate: str = "+0%", pitch: str = "+0Hz") -> Optional[str]:
+        """Return the path of the audio file for text, synthesizing it only if it is not cached."""
+        voice = voice or self.tts.current_voice
+        key = self.key(text, voice, rate, pitch)
+        path = self.files.path(key)
+        
+        while True:
+            if os.path.exists(path):
+                self.hits += 1
+                # Touch the file so eviction treats it as recently used
+                self.files.touch(path)
+                return path
+            
+            if key not in self._inflight:
+                break
+            self.coalesced += 1
+            try:
+                ok = await asyncio.shield(self._inflight[key])
+            except _SynthesisAbandoned:
+                # The caller synthesizing it went away; check again and take over if needed
+                continue
+            return path if ok else None
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        ok = False
+        abandoned = False
+        # Write to a unique temp file and rename, so readers never see partial audio
+        tmp_path = self.files.tmp_path(key)
+        try:
+            ok = await self.tts.save_audio_async(self.normalize(text), tmp_path, voice, rate, pitch)
+            if ok:
+                await self.files.commit(tmp_path, key)
+        except asyncio.CancelledError:
+            abandoned = True
+            raise
+        finally:
+            # Left over after a failure or cancellation; committed audio has been renamed
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            del self._inflight[key]
+            self._finish(future, ok, abandoned)
+        
+        return path if ok else None
+
+    @staticmethod
+    def _finish(future: asyncio.Future, ok: bool, abandoned: bool):
+        if abandoned:
+            future.set_exception(_SynthesisAbandoned())
+            # Waiters re-raise it; mark it retrieved so a future nobody awaited does not warn
+            future.exception()
+        else:
+            future.set_result(ok)
+
+    async def _read_file(self, path: str) -> AsyncIterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, self.read_chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def stream(self, text: str, voice: Optional[str] = None,
+                     rate: str = "+0%", pitch: str = "+0Hz") -> AsyncIterator[bytes]:
+        """Yield the audio for text chunk by chunk.
+
+        Cached audio is read from disk. Otherwise chunks are passed on as the
+        engine produces them while also being written to the cache, so the
+        first bytes reach the caller before synthesis has finished.
+        """
+        voice = voice or self.tts.current_voice
+        key = self.key(text, voice, rate, pitch)
+        path = self.files.path(key)
+        
+        while True:
+            if key in self._inflight:
+                # Someone else is synthesizing this exact audio; read it once it is stored
+                self.coalesced += 1
+                try:
+                    if not await asyncio.shield(self._inflight[key]):
+                        return
+                except _SynthesisAbandoned:
+                    continue
+            elif os.path.exists(path):
+                self.hits += 1
+                self.files.touch(path)
+            else:
+                self.misses += 1
+                async for chunk in self._synthesize_streaming(key, text, voice, rate, pitch):
+                    yield chunk
+                return
+            break
+        
+        try:
+            async for chunk in self._read_file(path):
+                yield chunk
+        except FileNotFoundError:
+            # Evicted between the check and the read
+            logger.warning(f"Cached audio disappeared: {path}")
+
+    async def _synthesize_streaming(self, key: str, text: str, voice: str, rate: str,
+                                    pitch: str) -> AsyncIterator[bytes]:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        tmp_path = self.files.tmp_path(key)
+        ok = False
+        abandoned = False
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in self.tts.stream_audio(self.normalize(text), voice, rate, pitch):
+                    f.write(chunk)
+                    yield chunk
+                ok = f.tell() > 0
+            if ok:
+                await self.files.commit(tmp_path, key)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled, or the listener stopped reading
+            ok = False
+            abandoned = True
+            raise
+        except Exception as e:
+            ok = False
+            logger.error(f"Error streaming speech: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            del self._inflight[key]
+            self._finish(future, ok, abandoned)
@@ -0,0 +1,375 @@
+"""Load test the assistant with simulated students.
+
+Starts the stub services and a production-mode server wired to them (unless
+--url points at a running server), connects N WebSocket clients that stream
+camera frames at a fixed rate and ask a question every few seconds, and
+writes per-message-type latency percentiles, throughput and server CPU and
+memory use as JSON. Compare two runs with --baseline.
+
+    python -m bench.load_test --clients 20 --duration 60 --output results.json
+    python -m bench.load_test --clients 20 --duration 60 --baseline results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import httpx
+import numpy as np
+import websockets
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.protocol import AUDIO_CHUNK, FRAME_HEADER, FRAME_JPEG  # noqa: E402
+
+TOPICS = ["photosynthesis", "gravity", "the water cycle", "fractions", "plate tectonics",
+          "the french revolution", "electric circuits", "cell division", "volcanoes", "the solar system"]
+
+class Recorder:
+    """Collects latency samples per message type."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, kind: str, seconds: float):
+        self.samples.setdefault(kind, []).append(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self, duration: float) -> Dict:
+        messages = {}
+        for kind, values in sorted(self.samples.items()):
+            values = np.array(values) * 1000
+            messages[kind] = {
+                "count": len(values),
+                "per_second": round(len(values) / duration, 3),
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+                "p99_ms": round(float(np.percentile(values, 99)), 2),
+                "max_ms": round(float(values.max()), 2),
+            }
+        return {"messages": messages, "counters": dict(sorted(self.counters.items()))}
+
+
+class ProcessSampler:
+    """Samples CPU time and resident memory of a process and its children from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self.cpu_percent: List[float] = []
+        self.rss_mb: List[float] = []
+
+    def _tree(self) -> List[int]:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                    children.setdefault(ppid, []).append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        tree, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children.get(pid, []))
+        return tree
+
+    def _read(self):
+        cpu_seconds, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu_seconds += (int(fields[11]) + int(fields[12])) / self.ticks
+                with open(f"/proc/{pid}/statm") as f:
+                    rss += int(f.read().split()[1]) * self.page_size
+            except (OSError, IndexError, ValueError):
+                continue
+        return cpu_seconds, rss
+
+    async def run(self):
+        previous_cpu, _ = self._read()
+        previous_time = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, rss = self._read()
+            now = time.perf_counter()
+            self.cpu_percent.append(100 * (cpu - previous_cpu) / (now - previous_time))
+            self.rss_mb.append(rss / (1024 * 1024))
+            previous_cpu, previous_time = cpu, now
+
+    def summary(self) -> Dict:
+        if not self.cpu_percent:
+            return {}
+        return {
+            "cpu_percent_avg": round(float(np.mean(self.cpu_percent)), 1),
+            "cpu_percent_max": round(float(np.max(self.cpu_percent)), 1),
+            "rss_mb_avg": round(float(np.mean(self.rss_mb)), 1),
+            "rss_mb_max": round(float(np.max(self.rss_mb)), 1),
+        }
+
+
+def make_frame(image_path: Optional[str], width: int) -> bytes:
+    """Encode the binary frame message every client sends."""
+    if image_path:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise SystemExit(f"Cannot read {image_path}")
+        scale = width / image.shape[1]
+        image = cv2.resize(image, (width, int(image.shape[0] * scale)))
+    else:
+        # A drawn face; the Haar cascade may not find it, so pass --image for realistic detection load
+        height = width * 3 // 4
+        image = np.full((height, width, 3), 180, np.uint8)
+        center = (width // 2, height // 2)
+        cv2.ellipse(image, center, (width // 6, height // 4), 0, 0, 360, (140, 170, 210), -1)
+        for dx in (-width // 16, width // 16):
+            cv2.circle(image, (center[0] + dx, center[1] - height // 16), width // 60, (40, 40, 40), -1)
+        cv2.ellipse(image, (center[0], center[1] + height // 10), (width // 20, height // 40), 0, 0, 180, (60, 60, 120), 3)
+    ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return FRAME_HEADER.pack(FRAME_JPEG, image.shape[1], image.shape[0]) + jpeg.tobytes()
+
+
+async def run_client(index: int, args, url: str, frame: bytes, recorder: Recorder, deadline: float):
+    """One simulated student: frames at a fixed rate and a question every prompt interval.
+
+    With --adaptive the frame rate follows the server's capture_config messages instead.
+    """
+    pending_frames: List[float] = []
+    capture = {"period": 1.0 / args.fps}
+    interaction: Dict = {}
+    done = asyncio.Event()
+    done.set()
+    prompt_ids = itertools.count()
+
+    async def send_frames(ws):
+        next_at = time.perf_counter() + random.random() * capture["period"]
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            next_at += capture["period"]
+            pending_frames.append(time.perf_counter())
+            await ws.send(frame)
+            recorder.count("frames_sent")
+
+    async def send_prompts(ws):
+        await asyncio.sleep(random.random() * args.prompt_interval)
+        while time.perf_counter() < deadline:
+            if not done.is_set():
+                recorder.count("prompts_skipped_busy")
+            else:
+                topic = random.choice(TOPICS)
+                prompt = f"explain {topic}" + (f" ({index}-{next(prompt_ids)})" if args.unique_prompts else "")
+                interaction.clear()
+                interaction["sent"] = time.perf_counter()
+                done.clear()
+                await ws.send(json.dumps({"text": prompt}))
+                recorder.count("prompts_sent")
+            await asyncio.sleep(args.prompt_interval * random.uniform(0.8, 1.2))
+
+    def mark(kind: str):
+        if "sent" in interaction and kind not in interaction:
+            interaction[kind] = True
+            recorder.observe(kind, time.perf_counter() - interaction["sent"])
+
+    async def receive(ws):
+        async for message in ws:
+            now = time.perf_counter()
+            if isinstance(message, bytes):
+                if message[:1] == bytes([AUDIO_CHUNK]):
+                    mark("audio_first_chunk")
+                continue
+            data = json.loads(message)
+            kind = data.get("type")
+            if kind == "emotion":
+                # Frames are superseded server side, so time from the oldest unanswered one (upper bound)
+                if pending_frames:
+                    recorder.observe("emotion", now - pending_frames[0])
+                    recorder.count("frames_superseded", len(pending_frames) - 1)
+                    pending_frames.clear()
+            elif kind == "ai_delta":
+                mark("ai_first_delta")
+            elif kind == "ai_response":
+                mark("ai_response")
+            elif kind == "images":
+                mark("images")
+            elif kind == "audio_stream_end":
+                mark("audio_complete")
+                done.set()
+            elif kind == "interaction_cancelled":
+                recorder.count("interactions_cancelled")
+                done.set()
+            elif kind == "capture_config":
+                recorder.count("capture_configs")
+                if args.adaptive:
+                    capture["period"] = data["interval_ms"] / 1000
+            elif kind == "error":
+                recorder.count("server_errors")
+
+    try:
+        async with websockets.connect(f"{url}/ws/emotion/bench-{index}?mode={args.mode}", max_size=None) as ws:
+            receiver = asyncio.create_task(receive(ws))
+            await asyncio.gather(send_frames(ws), send_prompts(ws))
+            # Let the last answer finish before disconnecting
+            try:
+                await asyncio.wait_for(done.wait(), args.drain)
+            except asyncio.TimeoutError:
+                recorder.count("interactions_unfinished")
+            receiver.cancel()
+    except (OSError, websockets.WebSocketException) as e:
+        recorder.count("client_errors")
+        print(f"Client {index} failed: {e}", file=sys.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_until_ready(url: str, timeout: float):
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() - started < timeout:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise SystemExit(f"{url} not ready after {timeout:.0f}s")
+
+def start_services(args) -> Dict:
+    """Start the stubs and a server wired to them; returns the processes and server URL."""
+    stub_port, server_port = free_port(), free_port()
+    stubs = subprocess.Popen([sys.executable, "-m", "bench.stubs", "--port", str(stub_port)], cwd=ROOT_DIR)
+    env = dict(os.environ,
+               AI_MODEL_URL=f"http://127.0.0.1:{stub_port}/v1/chat/completions",
+               RAPIDAPI_URL=f"http://127.0.0.1:{stub_port}/search",
+               TTS_ENGINE="tone",
+               # The stub serves its images from loopback, which the image proxy refuses by default
+               IMAGE_PROXY_ALLOW_PRIVATE="true",
+               SERVER_MODE="production")
+    server = subprocess.Popen([sys.executable, "server.py", "--prod", "--host", "127.0.0.1",
+                               "--port", str(server_port)], cwd=ROOT_DIR, env=env,
+                              stdout=subprocess.DEVNULL if not args.server_logs else None,
+                              stderr=subprocess.DEVNULL if not args.server_logs else None)
+    return {"stubs": stubs, "server": server, "stub_url": f"http://127.0.0.1:{stub_port}",
+            "http_url": f"http://127.0.0.1:{server_port}"}
+
+def compare(result: Dict, baseline: Dict):
+    """Print p50/p95 changes per message type against a previous run."""
+    print(f"\n{'message':<20}{'p50 ms':>18}{'p95 ms':>18}{'per second':>18}")
+    for kind, now in result["messages"].items():
+        before = baseline.get("messages", {}).get(kind)
+        if not before:
+            print(f"{kind:<20}{'(new)':>18}")
+            continue
+        cells = [f"{before[key]:.0f} -> {now[key]:.0f}" if key != "per_second" else
+                 f"{before[key]:.1f} -> {now[key]:.1f}" for key in ("p50_ms", "p95_ms", "per_second")]
+        print(f"{kind:<20}" + "".join(f"{cell:>18}" for cell in cells))
+
+async def run(args) -> Dict:
+    processes = None
+    http_url = args.url
+    if not http_url:
+        processes = start_services(args)
+        http_url = processes["http_url"]
+        await wait_until_ready(processes["stub_url"] + "/docs", 30)
+    try:
+        startup_seconds = await wait_until_ready(http_url + "/api/ready", args.ready_timeout)
+        ws_url = http_url.replace("http", "ws", 1)
+
+        server_pid = processes["server"].pid if processes else args.server_pid
+        sampler = ProcessSampler(server_pid) if server_pid and os.path.isdir("/proc") else None
+        sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+
+        recorder = Recorder()
+        frame = make_frame(args.image, args.frame_width)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        clients = []
+        for index in range(args.clients):
+            clients.append(asyncio.create_task(run_client(index, args, ws_url, frame, recorder, deadline)))
+            await asyncio.sleep(args.ramp_up / max(1, args.clients))
+        await asyncio.gather(*clients)
+        duration = time.perf_counter() - started
+
+        if sampler_task:
+            sampler_task.cancel()
+        async with httpx.AsyncClient() as client:
+            server_stats = (await client.get(http_url + "/api/stats")).json()
+
+        result = {
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "server_logs")},
+            "environment": {"python": platform.python_version(), "cpus": os.cpu_count(),
+                            "platform": platform.platform()},
+            "duration_s": round(duration, 2),
+            "startup_to_ready_s": round(startup_seconds, 2),
+            "server": sampler.summary() if sampler else {},
+            "server_stats": server_stats,
+        }
+        result.update(recorder.summary(duration))
+        return result
+    finally:
+        if processes:
+            for name in ("server", "stubs"):
+                processes[name].terminate()
+                try:
+                    processes[name].wait(10)
+                except subprocess.TimeoutExpired:
+                    processes[name].kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the assistant with simulated students.")
+    parser.add_argument("--clients", type=int, default=10, help="simulated students")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which clients connect")
+    parser.add_argument("--fps", type=float, default=5, help="camera frames per second per client")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="follow the server's capture_config frame interval instead of --fps")
+    parser.add_argument("--frame-width", type=int, default=320, help="frame width in pixels")
+    parser.add_argument("--image", help="JPEG/PNG sent as every frame (default: a drawn face)")
+    parser.add_argument("--prompt-interval", type=float, default=15, help="seconds between questions per client")
+    parser.add_argument("--unique-prompts", action="store_true", help="make every question unique to bypass caches")
+    parser.add_argument("--mode", choices=["single", "classroom"], default="single")
+    parser.add_argument("--drain", type=float, default=15, help="seconds to wait for the last answer")
+    parser.add_argument("--url", help="test a running server (e.g. http://127.0.0.1:8000) instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, to sample its CPU and memory")
+    parser.add_argument("--ready-timeout", type=float, default=180, help="seconds to wait for /api/ready")
+    parser.add_argument("--server-logs", action="store_true", help="show the started server's output")
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
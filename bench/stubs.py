@@ -0,0 +1,99 @@
+"""Local stand-ins for the external services used by the assistant.
+
+One FastAPI app serves an OpenAI-compatible chat completions endpoint (plain
+and SSE streaming), a RapidAPI-style image search and the images it returns,
+so the server can be load tested without network access or API keys. Speech
+comes from the offline tone engine (TTS_ENGINE=tone) and needs no stub.
+
+    python -m bench.stubs --port 9100
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from PIL import Image, ImageDraw
+
+# Simulated backend latency, overridable through the environment
+LLM_FIRST_TOKEN_MS = float(os.getenv("STUB_LLM_FIRST_TOKEN_MS", "300"))
+LLM_TOKEN_MS = float(os.getenv("STUB_LLM_TOKEN_MS", "20"))
+LLM_TOKEN_CHARS = int(os.getenv("STUB_LLM_TOKEN_CHARS", "4"))
+IMAGE_SEARCH_MS = float(os.getenv("STUB_IMAGE_SEARCH_MS", "250"))
+IMAGE_SIZE = (1280, 960)
+
+app = FastAPI(title="Assistant benchmark stubs")
+_image_cache = {}
+
+# Queries received by the image search, and a switch to make it fail, for tests running the stubs in-process
+app.state.search_queries = []
+app.state.fail_searches = False
+
+def answer_for(prompt: str) -> dict:
+    """Build a deterministic answer of realistic length for a prompt."""
+    topic = re.sub(r"[^\w\s]", "", prompt).strip() or "that"
+    result = (f"Great question about {topic}. Let's start with the basic idea and build up from there. "
+              f"The key point is that {topic} follows a few simple rules. "
+              f"Once you see those rules, the rest follows naturally. Does that make sense so far?")
+    return {"result": result, "diagram": f"{topic} diagram"}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    try:
+        prompt = json.loads(body["messages"][-1]["content"]).get("prompt", "")
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError):
+        prompt = ""
+    content = json.dumps(answer_for(prompt))
+
+    await asyncio.sleep(LLM_FIRST_TOKEN_MS / 1000)
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_TOKEN_MS / 1000 * len(content) / LLM_TOKEN_CHARS)
+        return JSONResponse({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    async def events():
+        for start in range(0, len(content), LLM_TOKEN_CHARS):
+            chunk = {"choices": [{"delta": {"content": content[start:start + LLM_TOKEN_CHARS]}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(LLM_TOKEN_MS / 1000)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/search")
+async def image_search(request: Request, query: str = "", limit: int = 5):
+    app.state.search_queries.append(query)
+    await asyncio.sleep(IMAGE_SEARCH_MS / 1000)
+    if app.state.fail_searches:
+        return JSONResponse({"message": "Service unavailable"}, status_code=503)
+    base = str(request.base_url).rstrip("/")
+    slug = re.sub(r"\W+", "-", query.lower()).strip("-") or "image"
+    return JSONResponse({"data": [{"url": f"{base}/images/{slug}-{i}.png", "source": f"https://example.com/{slug}/{i}"}
+                                  for i in range(limit)]})
+
+@app.get("/images/{name}")
+async def image(name: str):
+    # Full-size PNGs, so the server's image proxy has real resizing work to do
+    if name not in _image_cache:
+        picture = Image.new("RGB", IMAGE_SIZE, (30 + hash(name) % 200, 120, 160))
+        draw = ImageDraw.Draw(picture)
+        for i in range(0, IMAGE_SIZE[0], 80):
+            draw.line([(i, 0), (IMAGE_SIZE[0] - i, IMAGE_SIZE[1])], fill=(255, 255, 255), width=3)
+        out = io.BytesIO()
+        picture.save(out, "PNG")
+        _image_cache[name] = out.getvalue()
+    return Response(_image_cache[name], media_type="image/png")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local stand-ins for the LLM and image search.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -26,14 +26,38 @@ let stream = null;
 let websocket = null;
 let isRunning = false;
 let captureInterval = null;
+
+// Frame interval and width, adjusted by the server's capture_config messages
+let captureIntervalMs = 1000;
+let captureMaxWidth = 640;
 let recognitionActive = false;
 let clientId = generateClientId();
 let currentEmotion = 'neutral';
+let streamingAnswer = false;
+
+// Sentence audio clips waiting to be played in order
+let audioQueue = [];
+let audioQueuePlaying = false;
+
+// Answer audio currently streaming in over the WebSocket
+let audioStream = null;
+
+// Open the page with ?mode=classroom to analyse every face seen by one classroom camera
+const analysisMode = new URLSearchParams(window.location.search).get('mode') === 'classroom' ? 'classroom' : 'single';
 
 // Speech recognition
 let recognition = null;
 let recognitionTimeout = null;
 
+// Open the page with ?asr=server to have the server recognise speech from streamed microphone audio;
+// browsers without the Web Speech API use it automatically
+const serverSpeechRequested = new URLSearchParams(window.location.search).get('asr') === 'server';
+let micStream = null;
+let micContext = null;
+let micNode = null;
+let micBuffer = [];
+let micBuffered = 0;
+
 // Initialize speech recognition
 function initSpeechRecognition() {
     if ('webkitSpeechRecognition' in window) {
@@ -121,6 +145,12 @@ function init() {
     });
     
     audioPlayer.addEventListener('ended', () => {
+        // Continue with the next sentence of the answer, if any
+        if (audioQueue.length > 0) {
+            playNextAudio();
+            return;
+        }
+        audioQueuePlaying = false;
         updateStatus('active', 'Connected');
         playBtn.classList.remove('hidden');
         pauseBtn.classList.add('hidden');
@@ -205,7 +235,15 @@ async function startAssistant() {
         connectWebSocket();
         
         // Start speech recognition
-        if (recognition) {
+        if (serverSpeechRequested || !recognition) {
+            try {
+                await startServerSpeech();
+                console.log('Server speech recognition started');
+            } catch (micError) {
+                console.error('Microphone error:', micError);
+                updateStatus('error', `Microphone error: ${micError.message}`);
+            }
+        } else if (recognition) {
             try {
                 recognitionActive = true;
                 recognition.start();
@@ -256,7 +294,7 @@ function stopAssistant() {
     
     // Stop capturing frames
     if (captureInterval) {
-        clearInterval(captureInterval);
+        clearTimeout(captureInterval);
         captureInterval = null;
     }
     
@@ -276,6 +314,9 @@ function stopAssistant() {
         }
     }
     
+    // Stop streaming microphone audio
+    stopServerSpeech();
+    
     // Close WebSocket if it's open
     if (websocket && websocket.readyState === WebSocket.OPEN) {
         try {
@@ -310,7 +351,8 @@ function connectWebSocket() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
 
     // Create WebSocket connection
-    websocket = new WebSocket(`${protocol}//${host}/ws/emotion/${clientId}`);
+    websocket = new WebSocket(`${protocol}//${host}/ws/emotion/${clientId}?mode=${analysisMode}`);
+    websocket.binaryType = 'arraybuffer';
 
     // WebSocket event handlers
     websocket.onopen = () => {
@@ -341,27 +383,61 @@ function connectWebSocket() {
 
 // Start capturing frames
 function startCapturing() {
-    captureInterval = setInterval(() => {
+    scheduleCapture();
+}
+
+// Capture the next frame after the current interval, which the server may change at any time
+function scheduleCapture() {
+    clearTimeout(captureInterval);
+    captureInterval = setTimeout(() => {
         if (isRunning && video.readyState === 4) {
             captureFrame();
         }
-    }, 1000); // Capture every second
+        if (isRunning) {
+            scheduleCapture();
+        }
+    }, captureIntervalMs);
+}
+
+// Apply a new capture interval and width from the server
+function updateCaptureConfig(intervalMs, maxWidth) {
+    captureIntervalMs = intervalMs;
+    captureMaxWidth = maxWidth;
+    if (captureInterval) {
+        // Restart the wait so a shorter interval takes effect now
+        scheduleCapture();
+    }
 }
 
+// Binary frame message kinds (see backend/protocol.py)
+const FRAME_JPEG = 0x01;
+const FRAME_HEADER_SIZE = 5;
+
 // Capture a frame from the video
 function captureFrame() {
+    // Downscale to the width the server asked for; smaller frames are cheaper to send and analyse
+    const scale = Math.min(1, captureMaxWidth / video.videoWidth);
     const ctx = canvas.getContext('2d');
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
     ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-    // Convert canvas to base64 image
-    const imageData = canvas.toDataURL('image/jpeg', 0.7);
+    // Encode the canvas as JPEG and send it as a binary frame message
+    canvas.toBlob(async (blob) => {
+        if (!blob || !websocket || websocket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+
+        const jpeg = new Uint8Array(await blob.arrayBuffer());
+        const message = new Uint8Array(FRAME_HEADER_SIZE + jpeg.length);
+        const header = new DataView(message.buffer);
+        header.setUint8(0, FRAME_JPEG);
+        header.setUint16(1, canvas.width);
+        header.setUint16(3, canvas.height);
+        message.set(jpeg, FRAME_HEADER_SIZE);
 
-    // Send image to server via WebSocket
-    if (websocket && websocket.readyState === WebSocket.OPEN) {
-        websocket.send(JSON.stringify({ image: imageData }));
-    }
+        websocket.send(message.buffer);
+    }, 'image/jpeg', 0.7);
 }
 
 // Handle speech recognition results
@@ -393,6 +469,7 @@ function handleSpeechResult(event) {
         if (websocket && websocket.readyState === WebSocket.OPEN) {
             websocket.send(JSON.stringify({ text: finalTranscript }));
             updateStatus('processing', 'Processing...');
+            stopSpeaking();
         
             // Add user message to conversation
             addMessage('user', finalTranscript);
@@ -400,15 +477,160 @@ function handleSpeechResult(event) {
     }
 }
 
+// Microphone audio for server-side recognition (see backend/protocol.py):
+// 16 kHz mono 16-bit PCM, sent in 100 ms chunks
+const MIC_PCM = 0x20;
+const MIC_HEADER_SIZE = 5;
+const MIC_SAMPLE_RATE = 16000;
+const MIC_CHUNK_MS = 100;
+
+// Audio worklet that hands each block of microphone samples to the page
+const MIC_WORKLET = `
+class MicCapture extends AudioWorkletProcessor {
+    process(inputs) {
+        if (inputs[0].length) {
+            this.port.postMessage(inputs[0][0].slice());
+        }
+        return true;
+    }
+}
+registerProcessor('mic-capture', MicCapture);
+`;
+
+// Stream the microphone to the server for speech recognition
+async function startServerSpeech() {
+    micStream = await navigator.mediaDevices.getUserMedia({
+        audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+    });
+    micContext = new AudioContext();
+    
+    const workletUrl = URL.createObjectURL(new Blob([MIC_WORKLET], { type: 'application/javascript' }));
+    await micContext.audioWorklet.addModule(workletUrl);
+    URL.revokeObjectURL(workletUrl);
+    
+    micNode = new AudioWorkletNode(micContext, 'mic-capture', { numberOfOutputs: 0 });
+    micNode.port.onmessage = (event) => bufferMicSamples(event.data);
+    micContext.createMediaStreamSource(micStream).connect(micNode);
+}
+
+function stopServerSpeech() {
+    if (!micContext) {
+        return;
+    }
+    
+    micNode.port.onmessage = null;
+    micStream.getTracks().forEach(track => track.stop());
+    micContext.close();
+    micStream = null;
+    micContext = null;
+    micNode = null;
+    micBuffer = [];
+    micBuffered = 0;
+}
+
+// Collect worklet blocks into chunks, so each WebSocket message carries 100 ms of audio
+function bufferMicSamples(samples) {
+    micBuffer.push(samples);
+    micBuffered += samples.length;
+    if (micBuffered < micContext.sampleRate * MIC_CHUNK_MS / 1000) {
+        return;
+    }
+    
+    const chunk = new Float32Array(micBuffered);
+    let offset = 0;
+    for (const part of micBuffer) {
+        chunk.set(part, offset);
+        offset += part.length;
+    }
+    micBuffer = [];
+    micBuffered = 0;
+    
+    sendMicChunk(chunk, micContext.sampleRate);
+}
+
+// Downsample to 16 kHz by averaging, convert to 16-bit PCM and send as a binary microphone message
+function sendMicChunk(samples, sampleRate) {
+    if (!websocket || websocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+    
+    const outputRate = Math.min(sampleRate, MIC_SAMPLE_RATE);
+    const ratio = sampleRate / outputRate;
+    const length = Math.floor(samples.length / ratio);
+    const message = new ArrayBuffer(MIC_HEADER_SIZE + length * 2);
+    const view = new DataView(message);
+    view.setUint8(0, MIC_PCM);
+    view.setUint32(1, outputRate);
+    
+    for (let i = 0; i < length; i++) {
+        const start = Math.floor(i * ratio);
+        const end = Math.max(start + 1, Math.floor((i + 1) * ratio));
+        let sum = 0;
+        for (let j = start; j < end; j++) {
+            sum += samples[j];
+        }
+        const sample = Math.max(-1, Math.min(1, sum / (end - start)));
+        view.setInt16(MIC_HEADER_SIZE + i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7fff, true);
+    }
+    
+    websocket.send(message);
+}
+
+// Show a transcript recognised by the server; final ones are answered by the server directly
+function handleServerTranscript(text, final) {
+    if (!final) {
+        const interim = document.createElement('em');
+        interim.textContent = text;
+        voiceText.replaceChildren(interim);
+        return;
+    }
+    
+    voiceText.textContent = text;
+    updateStatus('processing', 'Processing...');
+    stopSpeaking();
+    addMessage('user', text);
+}
+
+// Binary message kinds sent by the server (see backend/protocol.py)
+const AUDIO_CHUNK = 0x10;
+const AUDIO_HEADER_SIZE = 5;
+
+// Handle binary WebSocket messages
+function handleBinaryMessage(buffer) {
+    const header = new DataView(buffer);
+    if (buffer.byteLength < AUDIO_HEADER_SIZE || header.getUint8(0) !== AUDIO_CHUNK) {
+        console.log('Unknown binary message');
+        return;
+    }
+    appendAudioChunk(header.getUint32(1), buffer.slice(AUDIO_HEADER_SIZE));
+}
+
 // Handle WebSocket messages
 function handleWebSocketMessage(event) {
+    if (event.data instanceof ArrayBuffer) {
+        handleBinaryMessage(event.data);
+        return;
+    }
+    
     try {
         const data = JSON.parse(event.data);
         console.log('Received message:', data);
     
         switch (data.type) {
             case 'emotion':
-                updateEmotion(data.emotion);
+                updateEmotion(data.emotion, data.faces);
+                break;
+            
+            case 'capture_config':
+                updateCaptureConfig(data.interval_ms, data.max_width);
+                break;
+            
+            case 'transcript':
+                handleServerTranscript(data.text, data.final);
+                break;
+            
+            case 'ai_delta':
+                appendAIDelta(data.delta);
                 break;
             
             case 'ai_response':
@@ -416,9 +638,25 @@ function handleWebSocketMessage(event) {
                 updateStatus('active', 'Connected');
                 break;
             
+            case 'images':
+                displayImages(data.images || []);
+                break;
+            
             case 'audio':
                 playAudio(data.url);
                 break;
+            
+            case 'audio_stream_start':
+                startAudioStream(data.stream, data.mime);
+                break;
+            
+            case 'audio_segment_end':
+                endAudioSegment(data.stream);
+                break;
+            
+            case 'audio_stream_end':
+                endAudioStream(data.stream);
+                break;
                 
             case 'final_response':
                 // Ignore final responses as we've disabled this feature
@@ -426,6 +664,12 @@ function handleWebSocketMessage(event) {
                 updateStatus('ready', 'Ready');
                 break;
                 
+            case 'interaction_cancelled':
+                // The server dropped the answer in progress; silence what is left of it
+                streamingAnswer = false;
+                stopSpeaking();
+                break;
+                
             case 'stop_acknowledged':
                 // Server acknowledged stop request
                 console.log('Server acknowledged stop request');
@@ -446,9 +690,13 @@ function handleWebSocketMessage(event) {
 }
 
 // Update emotion display
-function updateEmotion(emotion) {
+function updateEmotion(emotion, faces) {
     currentEmotion = emotion;
     emotionText.textContent = emotion.charAt(0).toUpperCase() + emotion.slice(1);
+    if (faces) {
+        // Classroom mode: show the class-wide emotion and how many faces it covers
+        emotionText.textContent += ` (${faces.length} ${faces.length === 1 ? 'face' : 'faces'})`;
+    }
     emotionEmoji.textContent = emotionEmojis[emotion] || '😐';
 
     // Update emotion classes
@@ -458,16 +706,33 @@ function updateEmotion(emotion) {
     emotionText.classList.add(`emotion-${emotion}`);
 }
 
+// Append streamed answer text as it is generated
+function appendAIDelta(delta) {
+    if (!streamingAnswer) {
+        streamingAnswer = true;
+        aiResponse.textContent = '';
+    }
+    aiResponse.textContent += delta;
+}
+
 // Handle AI response
 function handleAIResponse(response) {
+    streamingAnswer = false;
+
     // Display AI response text
     aiResponse.textContent = response.result || 'No response';
 
     // Add AI message to conversation
     addMessage('ai', response.result);
 
-    // Display images
-    displayImages(response.images || []);
+    // Display images; the server sends them in a separate message when the search finishes
+    if (response.images) {
+        displayImages(response.images);
+    } else if (response.diagram) {
+        imageGallery.innerHTML = '<p class="text-gray-500 text-center p-4">Finding images...</p>';
+    } else {
+        displayImages([]);
+    }
 }
 
 // Display images in the gallery
@@ -505,9 +770,115 @@ function playAudio(url) {
     audioPlayer.src = url;
     audioPlayer.play().catch(error => {
         console.error('Error playing audio:', error);
+        if (audioQueuePlaying) {
+            playNextAudio();
+        }
     });
 }
 
+// Queue a sentence of the answer; it plays once the previous one ends
+function enqueueAudio(url) {
+    audioQueue.push(url);
+    if (!audioQueuePlaying) {
+        playNextAudio();
+    }
+}
+
+function playNextAudio() {
+    const url = audioQueue.shift();
+    if (!url) {
+        audioQueuePlaying = false;
+        return;
+    }
+    audioQueuePlaying = true;
+    playAudio(url);
+}
+
+// Drop audio of a previous answer
+function clearAudioQueue() {
+    audioQueue = [];
+    audioQueuePlaying = false;
+    audioStream = null;
+}
+
+// Cut off the answer currently being spoken
+function stopSpeaking() {
+    clearAudioQueue();
+    audioPlayer.pause();
+}
+
+// Begin playing a streamed answer; MediaSource lets playback start on the first chunk
+function startAudioStream(id, mime) {
+    clearAudioQueue();
+    const stream = {
+        id: id,
+        mime: mime,
+        useMediaSource: 'MediaSource' in window && MediaSource.isTypeSupported(mime),
+        pending: [],
+        segment: [],
+        ended: false,
+        sourceBuffer: null
+    };
+    audioStream = stream;
+    
+    if (!stream.useMediaSource) {
+        return;
+    }
+    
+    stream.mediaSource = new MediaSource();
+    stream.mediaSource.addEventListener('sourceopen', () => {
+        stream.sourceBuffer = stream.mediaSource.addSourceBuffer(mime);
+        stream.sourceBuffer.mode = 'sequence';
+        stream.sourceBuffer.addEventListener('updateend', () => flushAudioStream(stream));
+        flushAudioStream(stream);
+    }, { once: true });
+    playAudio(URL.createObjectURL(stream.mediaSource));
+}
+
+function appendAudioChunk(id, chunk) {
+    if (!audioStream || audioStream.id !== id) {
+        return;
+    }
+    if (audioStream.useMediaSource) {
+        audioStream.pending.push(chunk);
+        flushAudioStream(audioStream);
+    } else {
+        audioStream.segment.push(chunk);
+    }
+}
+
+// Feed queued chunks to the source buffer one append at a time
+function flushAudioStream(stream) {
+    if (!stream.sourceBuffer || stream.sourceBuffer.updating) {
+        return;
+    }
+    if (stream.pending.length > 0) {
+        stream.sourceBuffer.appendBuffer(stream.pending.shift());
+    } else if (stream.ended && stream.mediaSource.readyState === 'open') {
+        stream.mediaSource.endOfStream();
+    }
+}
+
+// Without MediaSource support for the format, play each sentence once it is complete
+function endAudioSegment(id) {
+    if (!audioStream || audioStream.id !== id || audioStream.useMediaSource) {
+        return;
+    }
+    const blob = new Blob(audioStream.segment, { type: audioStream.mime });
+    audioStream.segment = [];
+    enqueueAudio(URL.createObjectURL(blob));
+}
+
+function endAudioStream(id) {
+    if (!audioStream || audioStream.id !== id) {
+        return;
+    }
+    audioStream.ended = true;
+    if (audioStream.useMediaSource) {
+        flushAudioStream(audioStream);
+    }
+}
+
 // Add a message to the conversation
 function addMessage(type, text) {
     const messageDiv = document.createElement('div');
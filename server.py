@@ -1,25 +1,47 @@
+import argparse
 import os
 import sys
 import uvicorn
+from dotenv import load_dotenv
 from pathlib import Path
 
 SERVER_DIR = Path(__file__).resolve().parent
 sys.path.append(str(SERVER_DIR))
-
-from backend.main import app
+load_dotenv(SERVER_DIR / ".env")
 
 def main():
     """Run the FastAPI server."""
-    print("Starting AI Assistant server...")
+    parser = argparse.ArgumentParser(description="Run the AI Assistant server.")
+    parser.add_argument("--prod", action="store_true",
+                        default=os.getenv("SERVER_MODE", "development") == "production",
+                        help="production mode: no auto-reloader (also set by SERVER_MODE=production)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"), help="interface to bind")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")), help="port to bind")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "1")),
+                        help="worker processes sharing the port (production mode only)")
+    args = parser.parse_args()
+
+    workers = args.workers if args.prod else 1
+    if args.workers > 1 and not args.prod:
+        print("--workers needs --prod; the reloader runs a single worker")
+    if workers > 1 and os.getenv("SESSION_STORE", "memory") == "memory":
+        print("Note: with SESSION_STORE=memory a reconnecting client may land on a worker without its session")
+
+    print(f"Starting AI Assistant server ({'production' if args.prod else 'development'} mode, "
+          f"{workers} worker{'s' if workers > 1 else ''})...")
     print("Press Ctrl+C to stop the server")
-    
+
+    # The app is imported by uvicorn itself, so the reloader parent never loads the models.
+    # Each worker is a separate process with its own event loop and emotion worker pool;
+    # a WebSocket stays on the worker that accepted it for its whole lifetime.
     uvicorn.run(
         "backend.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        reload=not args.prod,
+        workers=workers,
         log_level="info"
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,108 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Run the app against offline stand-ins: no model downloads, network speech or shared state
+_data_dir = tempfile.mkdtemp(prefix="assistant-tests-")
+os.environ.setdefault("EMOTION_EXECUTOR", "thread")
+os.environ.setdefault("TTS_ENGINE", "tone")
+os.environ.setdefault("SESSION_STORE", "memory")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("IMAGE_CACHE_PATH", "")
+os.environ.setdefault("IMAGE_PROXY_CACHE_DIR", os.path.join(_data_dir, "image_cache"))
+os.environ.setdefault("ASR_ENGINE", "none")
+os.environ.setdefault("URL_SIGNING_SECRET", "test-secret")
+os.environ.setdefault("STUB_IMAGE_SEARCH_MS", "20")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def stub_processor():
+    """An EmotionProcessor that needs neither the face cascade's accuracy nor the emotion model.
+
+    Every non-black rectangle in a grayscale frame is a face, and a face is
+    "happy" when bright and "sad" when dim. Set ``fail_classify`` to make
+    the next model call raise.
+    """
+    from backend.emotion_processor import EMOTION_LABELS, EmotionProcessor
+
+    class StubProcessor(EmotionProcessor):
+        def __init__(self):
+            super().__init__()
+            self.detect_calls = []
+            self.classify_calls = []
+            self.fail_classify = False
+
+        def _detect(self, gray_image, min_size=(30, 30), max_size=None):
+            self.detect_calls.append(gray_image.shape)
+            count, _, stats, _ = cv2.connectedComponentsWithStats((gray_image > 0).astype(np.uint8))
+            return [tuple(int(v) for v in stats[label][:4]) for label in range(1, count)]
+
+        def classify_faces(self, face_rois):
+            self.classify_calls.append(len(face_rois))
+            if self.fail_classify:
+                self.fail_classify = False
+                raise RuntimeError("model failed")
+            results = []
+            for roi in face_rois:
+                emotion = "happy" if roi.mean() > 128 else "sad"
+                results.append((emotion, {label: 100.0 if label == emotion else 0.0 for label in EMOTION_LABELS}))
+            return results
+
+    return StubProcessor()
+
+
+@pytest.fixture
+def stub_worker(monkeypatch, stub_processor):
+    """Make the inference executor's workers use stub_processor."""
+    from backend import emotion_processor
+
+    monkeypatch.setattr(emotion_processor, "_worker_processor", stub_processor)
+    return stub_processor
+
+
+def face_frame(faces, size=(240, 320)) -> np.ndarray:
+    """A black grayscale frame with a filled rectangle per (x, y, w, h, brightness) face."""
+    frame = np.zeros(size, dtype=np.uint8)
+    for x, y, w, h, brightness in faces:
+        frame[y:y + h, x:x + w] = brightness
+    return frame
+
+
+def gray_message(frame: np.ndarray) -> bytes:
+    """Encode a grayscale frame as a binary frame message."""
+    from backend.protocol import FRAME_GRAY, FRAME_HEADER
+
+    height, width = frame.shape
+    return FRAME_HEADER.pack(FRAME_GRAY, width, height) + frame.tobytes()
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    """Run the benchmark stand-ins for the LLM and image search on a local port; yields (app, base URL)."""
+    import uvicorn
+
+    from bench.stubs import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Stub server did not start")
+        time.sleep(0.01)
+    yield app, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(5)
@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient
+
+from backend import main
+
+
+def test_cache_clear_is_disabled_without_an_admin_token(monkeypatch):
+    client = TestClient(main.app)
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/cache/clear").status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/admin/cache/clear", headers={"x-admin-token": "wrong"}).status_code == 403
+    assert client.post("/api/admin/cache/clear", headers={"x-admin-token": "s3cret"}).json() == {"cleared": 0}
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from backend.admission import AdmissionLimiter, Overloaded
+
+
+async def hold(limiter: AdmissionLimiter, release: asyncio.Event):
+    async with limiter.slot():
+        await release.wait()
+
+
+def test_waits_for_a_slot_then_rejects_beyond_the_queue():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=1, queue_timeout=1.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, release))
+        waiter = asyncio.create_task(hold(limiter, release))
+        await asyncio.sleep(0)
+        assert (limiter.active, limiter.waiting) == (1, 1)
+
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return limiter.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["admitted"], stats["rejected"], stats["active"], stats["waiting"]) == (2, 1, 0, 0)
+
+
+def test_queued_callers_give_up_after_the_timeout():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.01)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(limiter, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await holder
+        # The slot is free again once the holder leaves
+        async with limiter.slot():
+            pass
+        return limiter.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["timed_out"], stats["waiting"], stats["admitted"]) == (1, 0, 2)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.cache import AsyncTTLCache
+
+
+def test_concurrent_loads_of_one_key_share_a_call():
+    cache = AsyncTTLCache(max_entries=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+    assert asyncio.run(cache.get_or_load("key", loader)) == "value"
+    assert cache.hits == 1
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = AsyncTTLCache(max_entries=10, ttl=60)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("backend down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", failing) for _ in range(3)),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert len(cache) == 0
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_load("key", failing))
+    assert len(calls) == 2
+
+
+def test_uncacheable_results_are_returned_but_not_stored():
+    cache = AsyncTTLCache(max_entries=10, ttl=60)
+
+    async def loader():
+        return {"transient": True}
+
+    value = asyncio.run(cache.get_or_load("key", loader, cacheable=lambda v: not v["transient"]))
+
+    assert value == {"transient": True}
+    assert cache.get("key") is None
+
+
+def test_waiters_reload_when_the_loading_caller_is_cancelled():
+    cache = AsyncTTLCache(max_entries=10, ttl=60)
+    started = []
+
+    async def loader():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return len(started)
+
+    async def run():
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 2
+
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    cache = AsyncTTLCache(max_entries=2, ttl=60, max_bytes=10, sizeof=len)
+    cache.set("a", "xxx")
+    cache.set("b", "xxx")
+    cache.get("a")
+    cache.set("c", "xxx")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "xxx"
+
+    cache.set("big", "x" * 8)
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats()["bytes"] == 8
+
+    cache.set("short", "x", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert [key for key, _, _ in cache.items()] == ["big"]
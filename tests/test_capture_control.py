@@ -0,0 +1,66 @@
+import pytest
+
+from backend.capture_control import CaptureController
+
+
+def make_controller(**overrides):
+    options = dict(base_interval_ms=200, max_interval_ms=2000, stable_frames=5,
+                   max_width=640, reduced_width=320, reduce_width_load=0.75)
+    options.update(overrides)
+    return CaptureController(**options)
+
+
+def test_interval_doubles_while_the_emotion_holds_and_resets_on_change():
+    controller = make_controller()
+    intervals = []
+    for _ in range(10):
+        controller.observe("a", "happy")
+        intervals.append(controller.target("a", load=0.0)[0])
+
+    assert intervals == [200] * 4 + [400] * 5 + [800]
+
+    controller.observe("a", "sad")
+    assert controller.target("a", load=0.0) == (200, 640)
+
+
+def test_interval_is_capped():
+    controller = make_controller()
+    for _ in range(100):
+        controller.observe("a", "happy")
+
+    assert controller.target("a", load=1.0)[0] == 2000
+
+
+@pytest.mark.parametrize("load, interval", [(0.0, 200), (0.25, 200), (0.625, 600), (1.0, 1000), (3.0, 1000)])
+def test_interval_stretches_with_queue_load(load, interval):
+    assert make_controller().target("a", load)[0] == interval
+
+
+def test_width_drops_under_load_except_in_classroom_mode():
+    controller = make_controller()
+
+    assert controller.target("a", load=0.5)[1] == 640
+    assert controller.target("a", load=0.8)[1] == 320
+    assert controller.target("a", load=0.8, multi_face=True)[1] == 640
+
+
+def test_only_noticeable_changes_are_sent():
+    controller = make_controller()
+
+    assert controller.update("a", load=0.0) == {"type": "capture_config", "interval_ms": 200, "max_width": 640}
+    assert controller.update("a", load=0.27) is None
+    assert controller.update("a", load=0.5)["interval_ms"] == 466
+    assert controller.update("a", load=0.8)["max_width"] == 320
+
+
+def test_released_clients_start_over():
+    controller = make_controller()
+    for _ in range(5):
+        controller.observe("a", "happy")
+    controller.update("a", load=0.0)
+    assert controller.stats() == {"clients": 1, "avg_interval_ms": 400.0, "max_interval_ms": 400}
+
+    controller.release("a")
+
+    assert controller.stats()["clients"] == 0
+    assert controller.update("a", load=0.0)["interval_ms"] == 200
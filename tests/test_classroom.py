@@ -0,0 +1,77 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend import main
+from backend.emotion_processor import EmotionProcessor
+from conftest import face_frame
+
+CLASS = [(20, 20, 40, 40, 200), (120, 20, 40, 40, 220), (220, 20, 40, 40, 60)]
+
+
+def test_summary_is_the_most_common_emotion_and_its_share():
+    faces = [{"emotion": "happy"}, {"emotion": "sad"}, {"emotion": "happy"}, {"emotion": "neutral"}]
+
+    emotion, distribution = EmotionProcessor.summarize_faces(faces)
+
+    assert emotion == "happy"
+    assert distribution["happy"] == 0.5 and distribution["sad"] == 0.25 and distribution["neutral"] == 0.25
+    assert sum(distribution.values()) == pytest.approx(1.0)
+    assert EmotionProcessor.summarize_faces([]) == ("neutral", {})
+
+
+def test_classroom_frame_classifies_every_face(stub_processor):
+    result = stub_processor.analyze_frames([face_frame(CLASS)], multi_face=[True])[0]
+
+    assert [face["box"] for face in result["faces"]] == [[x, y, w, h] for x, y, w, h, _ in CLASS]
+    assert [face["emotion"] for face in result["faces"]] == ["happy", "happy", "sad"]
+    assert result["emotion"] == "happy"
+    assert result["distribution"]["happy"] == pytest.approx(2 / 3)
+    assert result["detection"] == "full"
+
+
+def test_classroom_and_single_frames_share_one_model_call(stub_processor):
+    frames = [face_frame(CLASS), face_frame([(100, 60, 80, 80, 60)]), face_frame([])]
+
+    results = stub_processor.analyze_frames(frames, multi_face=[True, False, True])
+
+    assert stub_processor.classify_calls == [4]
+    assert [result["emotion"] for result in results] == ["happy", "sad", "neutral"]
+    assert "faces" not in results[1]
+    assert results[2]["faces"] == [] and results[2]["distribution"] == {}
+
+
+def test_failed_classification_drops_the_class_results(stub_processor):
+    stub_processor.fail_classify = True
+
+    result = stub_processor.analyze_frames([face_frame(CLASS)], multi_face=[True])[0]
+
+    assert result["emotion"] == "neutral"
+    assert "faces" not in result and "distribution" not in result
+
+
+def test_unknown_mode_is_refused_on_connect():
+    client = TestClient(main.app)
+
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/ws/emotion/student?mode=lecture"):
+            pass
+    assert refused.value.code == 1008
+
+
+def test_unknown_mode_message_keeps_the_current_mode():
+    client = TestClient(main.app)
+
+    with client.websocket_connect("/ws/emotion/student?mode=classroom") as websocket:
+        websocket.send_json({"mode": "lecture"})
+        message = websocket.receive_json()
+        while message["type"] != "error":
+            message = websocket.receive_json()
+        assert "lecture" in message["message"]
+        assert main.manager.get_mode("student") == "classroom"
+
+        websocket.send_json({"mode": "single"})
+        websocket.send_json({"stop": True})
+        while websocket.receive_json()["type"] != "stop_acknowledged":
+            pass
+        assert main.manager.get_mode("student") == "single"
@@ -0,0 +1,59 @@
+import asyncio
+
+from backend.conversation import ConversationBuffer, estimate_tokens
+
+
+def answer(text: str):
+    return {"result": text, "diagram": ""}
+
+
+def test_history_keeps_its_prefix_until_the_budget_is_exceeded():
+    buffer = ConversationBuffer(max_tokens=200, trim_to=0.5, summary_tokens=50)
+    assert buffer.messages() == []
+
+    buffer.add("What is a cell?", "neutral", answer("The basic unit of life."))
+    first = buffer.messages()
+    buffer.add("What is a nucleus?", "happy", answer("The control centre of the cell."))
+
+    assert buffer.messages()[:2] == first
+    assert len(buffer.messages()) == 4
+
+
+def test_trims_old_turns_in_one_chunk_and_remembers_their_topics():
+    buffer = ConversationBuffer(max_tokens=200, trim_to=0.5, summary_tokens=50)
+    for i in range(10):
+        buffer.add(f"Question number {i}?", "neutral", answer("An answer of moderate length. " * 2))
+        assert buffer.tokens <= 200
+
+    messages = buffer.messages()
+    assert messages[0]["role"] == "system"
+    assert "Question number 0?" in messages[0]["content"]
+    assert len(buffer) < 10
+    assert estimate_tokens("abcd" * 10) == 11
+
+    buffer.clear()
+    assert buffer.messages() == [] and buffer.tokens == 0
+
+
+def test_history_is_always_sent_and_only_answers_without_it_are_shared(monkeypatch):
+    from backend.img_and_ai import ImageAndAIProcessor
+
+    processor = ImageAndAIProcessor()
+    sent_histories = []
+
+    async def fetch(prompt, emotion, on_delta=None, history=None):
+        sent_histories.append(history)
+        return answer(f"Answer to {prompt}")
+
+    monkeypatch.setattr(processor, "_fetch_ai_response", fetch)
+    students = [ConversationBuffer(max_tokens=500) for _ in range(3)]
+    students[0].add("What is photosynthesis?", "neutral", answer("How plants make food from light."))
+
+    async def run():
+        for student in students:
+            await processor.get_ai_response("Explain the dark phase", "neutral", conversation=student)
+
+    asyncio.run(run())
+    # The follow-up carries its history; the two students without one share a single answer
+    assert [len(history) for history in sent_histories] == [2, 0]
+    assert all(len(student) >= 1 for student in students)
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from backend import emotion_processor
+from backend.emotion_processor import EmotionInferenceExecutor
+from conftest import face_frame, gray_message
+
+
+def test_replaces_a_broken_pool_and_reports_not_ready_until_warm(monkeypatch):
+    def broken_batch(*args):
+        raise BrokenProcessPool("a worker died")
+
+    monkeypatch.setattr(emotion_processor, "_worker_ready", lambda: True)
+    monkeypatch.setattr(emotion_processor, "_worker_process_batch", broken_batch)
+
+    async def run():
+        executor = EmotionInferenceExecutor(mode="thread", max_workers=1, max_batch_wait_ms=1)
+        await executor.warmup()
+        broken = executor._executor
+        # Hold the replacement workers in warmup until the not-ready state has been checked
+        warm = threading.Event()
+        monkeypatch.setattr(emotion_processor, "_worker_ready", warm.wait)
+
+        with pytest.raises(BrokenProcessPool):
+            await executor.process_image("frame")
+        assert not executor.ready
+        assert executor._executor is not broken
+
+        warm.set()
+        await executor._restart_task
+        assert executor.ready
+        assert executor.stats()["pool_restarts"] == 1
+        executor.shutdown()
+
+    asyncio.run(run())
+
+
+def run_frames(messages, fail_before=()):
+    """Send frames from one client in turn and return the emotions and the executor stats."""
+    async def run():
+        executor = EmotionInferenceExecutor(mode="thread", max_workers=1, max_batch_wait_ms=1)
+        emotions = []
+        for i, message in enumerate(messages):
+            if i in fail_before:
+                emotion_processor._worker_processor.fail_classify = True
+            emotions.append((await executor.process_image(message, client_id="student"))["emotion"])
+        executor.shutdown()
+        return emotions, executor.stats()
+
+    return asyncio.run(run())
+
+
+def test_repeats_the_last_emotion_while_the_face_is_unchanged(stub_worker):
+    face = gray_message(face_frame([(100, 60, 80, 80, 200)]))
+    changed = gray_message(face_frame([(100, 60, 80, 80, 60)]))
+
+    emotions, stats = run_frames([face, face, face, changed])
+
+    assert emotions == ["happy", "happy", "happy", "sad"]
+    assert (stats["reuse_hits"], stats["reuse_misses"]) == (2, 2)
+    assert sum(stub_worker.classify_calls) == 2
+
+
+def test_an_undecodable_frame_is_not_repeated(stub_worker):
+    face = gray_message(face_frame([(100, 60, 80, 80, 200)]))
+
+    emotions, stats = run_frames([face, b"\x02garbage", face, face])
+
+    assert emotions == ["happy", None, "happy", "happy"]
+    assert (stats["reuse_hits"], stats["reuse_misses"]) == (2, 1)
+
+
+def test_a_failed_classification_is_not_repeated(stub_worker):
+    face = gray_message(face_frame([(100, 60, 80, 80, 200)]))
+
+    emotions, stats = run_frames([face, face, face], fail_before={0})
+
+    assert emotions == ["neutral", "happy", "happy"]
+    assert (stats["reuse_hits"], stats["reuse_misses"]) == (1, 1)
+
+
+def submit_together(messages, **options):
+    """Send one frame per client at the same time and return the results and executor stats."""
+    async def run():
+        executor = EmotionInferenceExecutor(mode="thread", max_workers=1, **options)
+        results = await asyncio.gather(*(executor.process_image(message, client_id=f"student-{i}")
+                                         for i, message in enumerate(messages)))
+        executor.shutdown()
+        return results, executor.stats()
+
+    return asyncio.run(run())
+
+
+def test_frames_queued_together_share_one_model_call(stub_worker):
+    messages = [gray_message(face_frame([(100, 60, 80, 80, brightness)])) for brightness in (200, 60, 0, 220)]
+
+    results, stats = submit_together(messages, max_batch_size=4, max_batch_wait_ms=10000)
+
+    assert [result["emotion"] for result in results] == ["happy", "sad", "neutral", "happy"]
+    assert results[0]["scores"]["happy"] == 100.0 and results[1]["scores"]["sad"] == 100.0
+    assert stub_worker.classify_calls == [3]
+    assert (stats["batches_run"], stats["frames_processed"]) == (1, 4)
+
+
+def test_a_partial_batch_is_sent_after_the_wait(stub_worker):
+    messages = [gray_message(face_frame([(100, 60, 80, 80, brightness)])) for brightness in (200, 60)]
+
+    results, stats = submit_together(messages, max_batch_size=16, max_batch_wait_ms=20)
+
+    assert [result["emotion"] for result in results] == ["happy", "sad"]
+    assert stub_worker.classify_calls == [2]
+    assert stats["batches_run"] == 1
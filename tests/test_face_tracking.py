@@ -0,0 +1,59 @@
+from conftest import face_frame
+
+FULL = (240, 320)
+
+
+def track_frames(processor, frames):
+    """Feed frames from one client in turn, passing each track on; return detections and boxes."""
+    track = None
+    detections, boxes = [], []
+    for frame in frames:
+        result = processor.analyze_frames([frame], [track])[0]
+        track = result["track"]
+        detections.append(result["detection"])
+        boxes.append(track["box"])
+    return detections, boxes
+
+
+def test_tracks_near_the_last_box_until_redetection_is_due(stub_processor):
+    stub_processor.redetect_interval = 3
+    frames = [face_frame([(100 + 4 * i, 60, 80, 80, 200)]) for i in range(6)]
+
+    detections, boxes = track_frames(stub_processor, frames)
+
+    assert detections == ["full", "tracked", "tracked", "tracked", "full", "tracked"]
+    assert boxes[3] == (112, 60, 80, 80)
+    # Tracking searches only the padded region around the previous box
+    assert stub_processor.detect_calls[0] == FULL
+    assert all(shape[0] < FULL[0] and shape[1] < FULL[1] for shape in stub_processor.detect_calls[1:4])
+    assert stub_processor.detect_calls[4] == FULL
+
+
+def test_scans_the_whole_frame_when_the_face_leaves_the_tracked_region(stub_processor):
+    frames = [face_frame([(20, 20, 60, 60, 200)]), face_frame([(240, 160, 60, 60, 200)])]
+
+    detections, boxes = track_frames(stub_processor, frames)
+
+    assert detections == ["full", "full"]
+    assert boxes[1] == (240, 160, 60, 60)
+    assert len(stub_processor.detect_calls) == 3
+
+
+def test_redetection_keeps_the_face_nearest_the_tracked_one(stub_processor):
+    stub_processor.redetect_interval = 0
+    first = face_frame([(200, 100, 60, 60, 200)])
+    second = face_frame([(20, 20, 60, 60, 60), (204, 100, 60, 60, 200)])
+
+    detections, boxes = track_frames(stub_processor, [first, second])
+
+    assert detections == ["full", "full"]
+    assert boxes[1] == (204, 100, 60, 60)
+
+
+def test_frame_without_a_face_resets_the_track(stub_processor):
+    frames = [face_frame([(100, 60, 80, 80, 200)]), face_frame([]), face_frame([(100, 60, 80, 80, 200)])]
+
+    detections, boxes = track_frames(stub_processor, frames)
+
+    assert detections == ["full", "full", "full"]
+    assert boxes == [(100, 60, 80, 80), None, (100, 60, 80, 80)]
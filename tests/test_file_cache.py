@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+
+from backend import file_cache
+from backend.file_cache import LRUFileDirectory
+
+
+def write(files: LRUFileDirectory, key: str, size: int) -> str:
+    tmp_path = files.tmp_path(key)
+    with open(tmp_path, "wb") as f:
+        f.write(b"x" * size)
+    return asyncio.run(files.commit(tmp_path, key))
+
+
+def test_evicts_least_recently_used_files(tmp_path):
+    files = LRUFileDirectory(str(tmp_path), ".bin", max_bytes=250, name="Test cache")
+    first = write(files, "a", 100)
+    second = write(files, "b", 100)
+    # Reading the older file makes the other one the eviction candidate
+    past = time.time() - 60
+    os.utime(second, (past, past))
+    files.touch(first)
+
+    write(files, "c", 100)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert files.total_bytes == 200
+
+
+def test_scan_counts_existing_files(tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"x" * 10)
+    (tmp_path / "other.txt").write_bytes(b"x" * 10)
+    assert LRUFileDirectory(str(tmp_path), ".bin", max_bytes=100, name="Test cache").total_bytes == 10
+
+
+def test_recent_temp_files_of_other_workers_survive_startup(tmp_path):
+    stale = tmp_path / "a.1234.tmp.bin"
+    stale.write_bytes(b"x")
+    past = time.time() - 2 * 3600
+    os.utime(stale, (past, past))
+    in_progress = tmp_path / "b.5678.tmp.bin"
+    in_progress.write_bytes(b"x")
+
+    LRUFileDirectory(str(tmp_path), ".bin", max_bytes=100, name="Test cache")
+
+    assert not stale.exists()
+    assert in_progress.exists()
+
+
+def test_recounts_only_when_over_budget_or_due(tmp_path, monkeypatch):
+    files = LRUFileDirectory(str(tmp_path), ".bin", max_bytes=250, name="Test cache")
+    recounts = []
+    evict = files.evict
+    monkeypatch.setattr(files, "evict", lambda: recounts.append(1) or evict())
+
+    write(files, "a", 100)
+    write(files, "b", 100)
+    assert recounts == []
+
+    write(files, "c", 100)
+    assert recounts == [1]
+    assert files.total_bytes == 200
+
+
+def test_workers_sharing_a_directory_respect_one_budget(tmp_path, monkeypatch):
+    # Recount on every write, as each worker does once RESCAN_INTERVAL has passed
+    monkeypatch.setattr(file_cache, "RESCAN_INTERVAL", 0)
+    workers = [LRUFileDirectory(str(tmp_path), ".bin", max_bytes=300, name="Test cache") for _ in range(3)]
+    for i in range(3):
+        for worker in workers:
+            write(worker, f"{id(worker)}-{i}", 60)
+
+    on_disk = sum(path.stat().st_size for path in tmp_path.glob("*.bin"))
+    assert on_disk <= 300
@@ -0,0 +1,49 @@
+import asyncio
+
+from backend.main import LatestFrameSlot
+from backend.metrics import FRAMES_DROPPED
+
+
+def superseded_count() -> float:
+    return FRAMES_DROPPED._values().get(("superseded",), 0.0)
+
+
+def test_newest_waiting_frame_replaces_older_ones():
+    slot = LatestFrameSlot()
+    before = superseded_count()
+
+    async def run():
+        for frame in ("first", "second", "third"):
+            slot.put(frame)
+        return await slot.get()
+
+    assert asyncio.run(run()) == "third"
+    assert (slot.received, slot.dropped) == (3, 2)
+    assert superseded_count() - before == 2
+
+
+def test_frames_taken_in_time_are_not_dropped():
+    slot = LatestFrameSlot()
+
+    async def run():
+        taken = []
+        for frame in ("first", "second"):
+            slot.put(frame)
+            taken.append(await slot.get())
+        return taken
+
+    assert asyncio.run(run()) == ["first", "second"]
+    assert (slot.received, slot.dropped) == (2, 0)
+
+
+def test_consumer_waits_for_the_next_frame():
+    slot = LatestFrameSlot()
+
+    async def run():
+        consumer = asyncio.create_task(slot.get())
+        await asyncio.sleep(0.01)
+        assert not consumer.done()
+        slot.put("frame")
+        return await consumer
+
+    assert asyncio.run(run()) == "frame"
@@ -0,0 +1,49 @@
+import asyncio
+
+from backend import main
+
+
+def run_answer(monkeypatch, deltas, result):
+    """Answer one question with a fake model and return the sentences sent to speech synthesis."""
+    spoken = []
+
+    async def fake_get_ai_response(prompt, emotion, on_delta=None, conversation=None):
+        for delta in deltas:
+            await on_delta(delta)
+        return {"result": result, "diagram": ""}
+
+    async def fake_images(diagram):
+        return []
+
+    async def fake_stream(text, *args):
+        spoken.append(text)
+        yield b"audio"
+
+    monkeypatch.setattr(main.ai_processor, "get_ai_response", fake_get_ai_response)
+    monkeypatch.setattr(main.ai_processor, "get_diagram_images", fake_images)
+    monkeypatch.setattr(main.tts_cache, "stream", fake_stream)
+    asyncio.run(main.handle_text("test-client", "what is gravity"))
+    return spoken
+
+
+def test_single_sentence_answer_is_spoken_once(monkeypatch):
+    spoken = run_answer(monkeypatch, ["Gravity pulls ", "things down."], "Gravity pulls things down.")
+    assert spoken == ["Gravity pulls things down."]
+
+
+def test_streamed_sentences_are_spoken_in_order_once(monkeypatch):
+    result = "Gravity pulls things down. It keeps the Moon in orbit around the Earth."
+    spoken = run_answer(monkeypatch, [result[:30], result[30:]], result)
+    assert spoken == ["Gravity pulls things down.", "It keeps the Moon in orbit around the Earth."]
+
+
+def test_answer_without_deltas_is_spoken_whole(monkeypatch):
+    spoken = run_answer(monkeypatch, [], "The AI service is unavailable right now.")
+    assert spoken == ["The AI service is unavailable right now."]
+
+
+def test_multi_sentence_answer_without_deltas_is_spoken_in_full(monkeypatch):
+    result = "I'm here to assist you. What would you like to know?\n\nRegarding 'x', let's look at it together."
+    spoken = run_answer(monkeypatch, [], result)
+    assert spoken == ["I'm here to assist you.", "What would you like to know?",
+                      "Regarding 'x', let's look at it together."]
@@ -0,0 +1,107 @@
+import asyncio
+import io
+
+import httpx
+from PIL import Image
+
+from backend.image_proxy import ImageProxy
+from backend.signing import TokenSigner
+
+
+def png() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(out, "PNG")
+    return out.getvalue()
+
+
+# Stand-in DNS: one public host and one that resolves to a private address
+ADDRESSES = {"example.com": "93.184.216.34", "intranet.example.com": "10.0.0.5"}
+
+
+def make_proxy(cache_dir: str, requests: list) -> ImageProxy:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        if request.url.path == "/bad.png":
+            return httpx.Response(404)
+        if request.url.path == "/moved":
+            return httpx.Response(302, headers={"location": request.url.params["to"]})
+        return httpx.Response(200, content=png(), headers={"content-type": "image/png"})
+
+    async def resolve(host, port):
+        return [ADDRESSES.get(host, host)]
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    proxy = ImageProxy(lambda: client, cache_dir, "/api/images", TokenSigner(b"secret"))
+    proxy._resolve = resolve
+    return proxy
+
+
+def test_tokens_from_one_worker_are_served_by_another(tmp_path):
+    requests = []
+    first = make_proxy(str(tmp_path), requests)
+    second = make_proxy(str(tmp_path), requests)
+    token = first.register("https://example.com/cell.png").rsplit("/", 1)[1]
+
+    url = second.original_url(token)
+    path = asyncio.run(second.get_thumbnail(url))
+    again = asyncio.run(first.get_thumbnail(first.original_url(token)))
+
+    assert url == "https://example.com/cell.png"
+    assert path == again
+    assert requests == [url]
+    assert first.hits == 1
+    assert second.original_url(token[:-1] + ("1" if token.endswith("0") else "0")) is None
+
+
+def test_concurrent_requests_fetch_once_and_failures_are_retried(tmp_path):
+    requests = []
+    proxy = make_proxy(str(tmp_path), requests)
+
+    async def run():
+        paths = await asyncio.gather(*(proxy.get_thumbnail("https://example.com/a.png") for _ in range(3)))
+        failed = await proxy.get_thumbnail("https://example.com/bad.png")
+        retried = await proxy.get_thumbnail("https://example.com/bad.png")
+        return paths, failed, retried
+
+    paths, failed, retried = asyncio.run(run())
+
+    assert len(set(paths)) == 1 and paths[0] is not None
+    assert proxy.coalesced == 2
+    assert failed is None and retried is None
+    assert requests.count("https://example.com/bad.png") == 2
+
+
+def test_refuses_internal_addresses_including_after_redirects(tmp_path):
+    requests = []
+    proxy = make_proxy(str(tmp_path), requests)
+
+    async def run():
+        return [await proxy.get_thumbnail(url) for url in [
+            "http://127.0.0.1/admin.png",
+            "http://169.254.169.254/latest/meta-data",
+            "http://[::ffff:10.0.0.1]/a.png",
+            "http://intranet.example.com/a.png",
+            "https://example.com/moved?to=http://192.168.1.1/router.png",
+            "file:///etc/passwd",
+        ]]
+
+    assert asyncio.run(run()) == [None] * 6
+    # Only the public redirecting URL was requested; its private target was refused before any request
+    assert requests == ["https://example.com/moved?to=http://192.168.1.1/router.png"]
+
+
+def test_follows_redirects_between_public_hosts(tmp_path):
+    requests = []
+    proxy = make_proxy(str(tmp_path), requests)
+
+    path = asyncio.run(proxy.get_thumbnail("https://example.com/moved?to=https://example.com/cell.png"))
+
+    assert path is not None
+    assert requests[-1] == "https://example.com/cell.png"
+
+
+def test_private_addresses_can_be_allowed_for_local_stand_ins(tmp_path, monkeypatch):
+    monkeypatch.setenv("IMAGE_PROXY_ALLOW_PRIVATE", "true")
+    proxy = make_proxy(str(tmp_path), [])
+
+    assert asyncio.run(proxy.get_thumbnail("http://127.0.0.1/cell.png")) is not None
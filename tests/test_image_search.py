@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.img_and_ai import ImageAndAIProcessor
+
+
+@pytest.fixture
+def stubs(stub_server):
+    app, url = stub_server
+    app.state.search_queries.clear()
+    app.state.fail_searches = False
+    yield app, url
+    app.state.fail_searches = False
+
+
+def make_processor(monkeypatch, url: str, cache_path: str = "") -> ImageAndAIProcessor:
+    monkeypatch.setenv("RAPIDAPI_URL", f"{url}/search")
+    monkeypatch.setenv("IMAGE_CACHE_PATH", cache_path)
+    monkeypatch.setenv("IMAGE_PROXY_ENABLED", "false")
+    return ImageAndAIProcessor()
+
+
+def run(processor: ImageAndAIProcessor, coroutine):
+    """Run a coroutine, closing the processor's HTTP clients on the same loop."""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await processor.aclose()
+    return asyncio.run(main())
+
+
+def test_concurrent_identical_queries_search_once(monkeypatch, stubs):
+    app, url = stubs
+    processor = make_processor(monkeypatch, url)
+
+    async def ask():
+        return await asyncio.gather(*(processor.get_diagram_images("plant cell") for _ in range(4)))
+
+    results = run(processor, ask())
+
+    assert app.state.search_queries == ["plant cell"]
+    assert all(images == results[0] for images in results)
+    assert len(results[0]) == 5
+    assert processor.image_cache.coalesced == 3
+
+
+def test_queries_differing_in_case_and_punctuation_share_an_entry(monkeypatch, stubs):
+    app, url = stubs
+    processor = make_processor(monkeypatch, url)
+
+    async def ask():
+        for query in ["Plant cell", "plant  cell!", " PLANT, cell "]:
+            await processor.get_diagram_images(query)
+
+    run(processor, ask())
+    assert app.state.search_queries == ["Plant cell"]
+    assert processor._image_query_key(" PLANT, cell ") == "plant cell"
+
+
+def test_failed_searches_are_not_cached(monkeypatch, stubs):
+    app, url = stubs
+    app.state.fail_searches = True
+    processor = make_processor(monkeypatch, url)
+
+    async def ask():
+        return [await processor.get_diagram_images("plant cell") for _ in range(2)]
+
+    assert run(processor, ask()) == [[], []]
+    assert len(app.state.search_queries) == 2
+    assert len(processor.image_cache) == 0
+
+
+def test_results_survive_a_restart(monkeypatch, stubs, tmp_path):
+    app, url = stubs
+    path = str(tmp_path / "image_cache.json")
+    processor = make_processor(monkeypatch, url, cache_path=path)
+    images = run(processor, processor.get_images("plant cell"))
+    with open(path) as f:
+        assert json.load(f)[0]["query"] == "plant cell"
+
+    restarted = make_processor(monkeypatch, url, cache_path=path)
+
+    assert run(restarted, restarted.get_images("Plant cell.")) == images
+    assert app.state.search_queries == ["plant cell"]
@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+from backend import main
+
+
+def test_cache_counts_include_emotion_result_reuse(monkeypatch):
+    monkeypatch.setattr(main.emotion_executor, "_reuse_hits", 7)
+    monkeypatch.setattr(main.emotion_executor, "_reuse_misses", 3)
+
+    counts = main.cache_request_counts()
+
+    assert counts[("emotion_reuse", "hits")] == 7
+    assert counts[("emotion_reuse", "misses")] == 3
+    body = TestClient(main.app).get("/metrics").text
+    assert 'cache="emotion_reuse"' in body
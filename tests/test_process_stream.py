@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from backend import main
+
+IMAGES = [{"image_url": "http://example.com/cell.jpg", "title": "Plant cell"}]
+
+
+def fake_answers(monkeypatch, searches, fail=False):
+    """Answer every prompt with a fixed response and record the diagram searches."""
+    async def fake_get_ai_response(prompt, emotion, on_delta=None, conversation=None):
+        if fail:
+            raise RuntimeError("model down")
+        return {"result": f"About {prompt}.", "diagram": "plant cell"}
+
+    async def fake_images(diagram):
+        searches.append(diagram)
+        return IMAGES
+
+    monkeypatch.setattr(main.ai_processor, "get_ai_response", fake_get_ai_response)
+    monkeypatch.setattr(main.ai_processor, "get_diagram_images", fake_images)
+
+
+def test_answer_is_yielded_before_the_image_search_starts(monkeypatch):
+    searches = []
+    fake_answers(monkeypatch, searches)
+
+    async def run():
+        parts = main.ai_processor.stream_request("cells", "happy")
+        first = await parts.__anext__()
+        searched_before_answer = list(searches)
+        rest = [part async for part in parts]
+        return first, searched_before_answer, rest
+
+    first, searched_before_answer, rest = asyncio.run(run())
+    assert first == {"type": "ai_response", "result": "About cells.", "diagram": "plant cell"}
+    assert searched_before_answer == []
+    assert rest == [{"type": "images", "images": IMAGES}]
+
+
+def test_process_streams_ndjson_lines(monkeypatch):
+    fake_answers(monkeypatch, [])
+    client = TestClient(main.app)
+
+    response = client.post("/api/process", json={"prompt": "cells", "stream_images": True})
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["ai_response", "images"]
+    assert lines[0]["result"] == "About cells." and lines[1]["images"] == IMAGES
+
+
+def test_failed_answer_streams_one_error_line(monkeypatch):
+    searches = []
+    fake_answers(monkeypatch, searches, fail=True)
+    client = TestClient(main.app)
+
+    response = client.post("/api/process", json={"prompt": "cells", "stream_images": True})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{"type": "ai_response", "result": "Error: model down", "diagram": ""}]
+    assert searches == []
+
+
+def test_process_without_streaming_returns_one_json_body(monkeypatch):
+    fake_answers(monkeypatch, [])
+    client = TestClient(main.app)
+
+    response = client.post("/api/process", json={"prompt": "cells"})
+
+    assert response.json() == {"result": "About cells.", "diagram": "plant cell", "images": IMAGES}
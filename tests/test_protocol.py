@@ -0,0 +1,57 @@
+import struct
+
+import pytest
+
+from backend.protocol import (AUDIO_CHUNK, FRAME_GRAY, FRAME_HEADER, FRAME_JPEG, MIC_HEADER, MIC_PCM,
+                              ProtocolError, pack_audio_chunk, parse_frame_header, parse_mic_chunk)
+
+
+def test_frame_header_is_kind_then_big_endian_width_and_height():
+    message = bytes([FRAME_GRAY, 0x01, 0x40, 0x00, 0xF0]) + bytes(320 * 240)
+
+    kind, width, height, payload = parse_frame_header(message)
+
+    assert (kind, width, height) == (FRAME_GRAY, 320, 240)
+    assert isinstance(payload, memoryview) and len(payload) == 320 * 240
+
+
+def test_jpeg_payload_length_is_not_checked_against_the_size():
+    kind, width, height, payload = parse_frame_header(FRAME_HEADER.pack(FRAME_JPEG, 640, 480) + b"\xff\xd8jpeg")
+
+    assert (kind, width, height) == (FRAME_JPEG, 640, 480)
+    assert bytes(payload) == b"\xff\xd8jpeg"
+
+
+@pytest.mark.parametrize("message", [
+    b"\x02\x00",
+    FRAME_HEADER.pack(0x07, 2, 2) + bytes(4),
+    FRAME_HEADER.pack(FRAME_GRAY, 4, 4) + bytes(15),
+    FRAME_HEADER.pack(FRAME_GRAY, 4, 4) + bytes(17),
+])
+def test_malformed_frames_are_rejected(message):
+    with pytest.raises(ProtocolError):
+        parse_frame_header(message)
+
+
+def test_mic_chunk_is_kind_then_sample_rate_and_pcm():
+    samples = struct.pack("<3h", 0, 1000, -1000)
+
+    sample_rate, payload = parse_mic_chunk(MIC_HEADER.pack(MIC_PCM, 48000) + samples)
+
+    assert sample_rate == 48000
+    assert bytes(payload) == samples
+
+
+@pytest.mark.parametrize("message", [
+    b"\x20\x00\x00",
+    MIC_HEADER.pack(FRAME_GRAY, 16000) + bytes(4),
+    MIC_HEADER.pack(MIC_PCM, 4000) + bytes(4),
+    MIC_HEADER.pack(MIC_PCM, 16000) + bytes(3),
+])
+def test_malformed_mic_chunks_are_rejected(message):
+    with pytest.raises(ProtocolError):
+        parse_mic_chunk(message)
+
+
+def test_audio_chunk_carries_kind_and_stream_id():
+    assert pack_audio_chunk(258, b"mp3") == bytes([AUDIO_CHUNK, 0, 0, 1, 2]) + b"mp3"
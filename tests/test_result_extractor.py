@@ -0,0 +1,56 @@
+import json
+import random
+
+import pytest
+
+from backend.img_and_ai import ResultFieldExtractor
+
+
+def extract(content: str, sizes) -> str:
+    extractor = ResultFieldExtractor()
+    out, pos = [], 0
+    for size in sizes:
+        out.append(extractor.feed(content[pos:pos + size]))
+        pos += size
+    out.append(extractor.feed(content[pos:]))
+    return "".join(out)
+
+
+@pytest.mark.parametrize("result", [
+    "smile 😀",
+    'quotes " and \\ backslashes\nnew line\ttab',
+    "accents é ü and math ∑ 𝜋",
+])
+def test_chunked_round_trip_matches_json_loads(result):
+    content = json.dumps({"result": result, "diagram": "emoji chart"})
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 4) for _ in range(len(content))]
+        assert extract(content, sizes) == json.loads(content)["result"]
+
+
+def test_surrogate_pair_split_across_chunks_is_combined():
+    content = json.dumps({"result": "😀"})
+    split = content.index("\\ude00")
+
+    assert extract(content, [split, 1, 1]) == "😀"
+
+
+def test_lone_surrogate_becomes_replacement_character():
+    text = extract('{"result": "a\\ud83d b \\ude00"}', [len('{"result": "a\\ud83d b')])
+
+    assert text == "a� b �"
+    text.encode("utf-8")
+
+
+def test_key_split_across_chunks_and_trailing_fields_ignored():
+    extractor = ResultFieldExtractor()
+    parts = ['{"diagram": "x", "res', 'ult"', ': "Hel', 'lo"', ', "more": "ignored"}']
+
+    assert [extractor.feed(part) for part in parts] == ["", "", "Hel", "lo", ""]
+
+
+def test_plain_text_is_passed_through():
+    extractor = ResultFieldExtractor()
+
+    assert [extractor.feed(part) for part in ["  ", "Plain ", "answer"]] == ["", "  Plain ", "answer"]
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from backend import semantic_cache
+from backend.semantic_cache import HashingEmbedder, SemanticCache
+
+ANSWER = {"result": "Plants turn light into sugar.", "diagram": ""}
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("threshold", 0.85)
+    kwargs.setdefault("max_entries", 10)
+    return SemanticCache(HashingEmbedder(), **kwargs)
+
+
+def vector(cache, prompt):
+    return cache.embedder.embed([prompt])[0]
+
+
+def similarity(a, b):
+    vectors = HashingEmbedder().embed([a, b])
+    return float(vectors[0] @ vectors[1])
+
+
+def test_reworded_question_hits():
+    cache = make_cache()
+    cache.add(vector(cache, "What's the process of photosynthesis?"), "neutral", "q", ANSWER)
+
+    assert cache.find(vector(cache, "what is photosynthesis process"), "neutral") == ANSWER
+    assert cache.find(vector(cache, "what is mitosis"), "neutral") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("what is 2 plus 3", "what is 3 plus 2"),
+    ("does ice float on water", "does water float on ice"),
+    ("why is the sky blue", "why is the sky not blue"),
+])
+def test_word_order_and_negation_miss(a, b):
+    assert similarity(a, b) < 0.85
+
+
+def test_answers_are_kept_apart_per_emotion():
+    cache = make_cache()
+    cache.add(vector(cache, "what is photosynthesis"), "sad", "q", ANSWER)
+
+    assert cache.find(vector(cache, "what is photosynthesis"), "happy") is None
+    assert cache.find(vector(cache, "what is photosynthesis"), "sad") == ANSWER
+
+
+def test_expired_answers_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = make_cache(ttl=60)
+    cache.add(vector(cache, "what is photosynthesis"), "neutral", "q", ANSWER)
+
+    now[0] += 61
+    assert cache.find(vector(cache, "what is photosynthesis"), "neutral") is None
+
+
+def test_full_cache_overwrites_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = make_cache(max_entries=2)
+    for prompt in ("what is photosynthesis", "what is mitosis"):
+        now[0] += 1
+        cache.add(vector(cache, prompt), "neutral", prompt, ANSWER)
+    now[0] += 1
+    assert cache.find(vector(cache, "what is photosynthesis"), "neutral") == ANSWER
+
+    now[0] += 1
+    cache.add(vector(cache, "what is gravity"), "neutral", "what is gravity", ANSWER)
+
+    assert (len(cache), cache.evictions) == (2, 1)
+    assert cache.find(vector(cache, "what is mitosis"), "neutral") is None
+    assert cache.find(vector(cache, "what is photosynthesis"), "neutral") == ANSWER
+
+
+def test_saved_index_reloads_into_one_file(tmp_path):
+    path = str(tmp_path / "semantic")
+    cache = make_cache(path=path)
+    cache.add(vector(cache, "what is photosynthesis"), "neutral", "q", ANSWER)
+    cache.save()
+
+    assert os.listdir(tmp_path) == ["semantic.npz"]
+    reloaded = make_cache(path=path)
+    assert len(reloaded) == 1
+    assert reloaded.find(vector(reloaded, "what's photosynthesis?"), "neutral") == ANSWER
+
+
+def test_index_from_another_embedder_is_ignored(tmp_path):
+    path = str(tmp_path / "semantic")
+    cache = make_cache(path=path)
+    cache.add(vector(cache, "what is photosynthesis"), "neutral", "q", ANSWER)
+    cache.save()
+
+    other = SemanticCache(HashingEmbedder(dim=256), threshold=0.85, max_entries=10, path=path)
+    assert len(other) == 0
+
+    (tmp_path / "semantic.npz").write_bytes(b"not an index")
+    assert len(make_cache(path=path)) == 0
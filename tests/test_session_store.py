@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from backend import session_store
+from backend.main import ConnectionManager
+from backend.session_store import MemorySessionStore, SessionStore
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+
+class RecordingStore(MemorySessionStore):
+    """Memory store that records updates and can be made to fail."""
+
+    def __init__(self, ttl=60):
+        super().__init__(ttl)
+        self.updates = []
+        self.failing = False
+
+    async def load(self, client_id):
+        if self.failing:
+            raise ConnectionError("store down")
+        return await super().load(client_id)
+
+    async def update(self, client_id, fields):
+        if self.failing:
+            raise ConnectionError("store down")
+        self.updates.append(fields)
+        await super().update(client_id, fields)
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_memory_store_merges_updates_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "monotonic", lambda: now[0])
+    store = MemorySessionStore(ttl=60)
+
+    async def run():
+        assert await store.load("a") == {}
+        await store.update("a", {"mode": "single", "emotion": "happy"})
+        await store.update("a", {"emotion": "sad"})
+        assert await store.load("a") == {"mode": "single", "emotion": "sad"}
+
+        now[0] += 61
+        assert await store.load("a") == {}
+
+        await store.update("b", {"mode": "classroom"})
+        await store.delete("b")
+        assert await store.load("b") == {}
+
+    asyncio.run(run())
+
+
+def test_reconnecting_client_resumes_session_with_requested_mode():
+    store = RecordingStore()
+
+    async def run():
+        first = ConnectionManager(store)
+        await first.connect(FakeWebSocket(), "a", mode="single")
+        await first.set_emotion("a", "happy")
+        await first.set_last_text("a", "what is gravity")
+        first.disconnect("a")
+
+        # Another worker sharing the store
+        second = ConnectionManager(store)
+        await second.connect(FakeWebSocket(), "a", mode="classroom")
+        return second
+
+    manager = asyncio.run(run())
+    assert manager.get_emotion("a") == "happy"
+    assert manager.get_last_text("a") == "what is gravity"
+    assert manager.get_mode("a") == "classroom"
+
+
+def test_unchanged_emotion_is_not_written_to_store():
+    store = RecordingStore()
+
+    async def run():
+        manager = ConnectionManager(store)
+        await manager.connect(FakeWebSocket(), "a")
+        for emotion in ("happy", "happy", "happy", "sad"):
+            await manager.set_emotion("a", emotion)
+
+    asyncio.run(run())
+    assert store.updates == [{"mode": "single"}, {"emotion": "happy"}, {"emotion": "sad"}]
+
+
+def test_failing_store_does_not_break_the_connection():
+    store = RecordingStore()
+    store.failing = True
+
+    async def run():
+        manager = ConnectionManager(store)
+        await manager.connect(FakeWebSocket(), "a", mode="classroom")
+        await manager.set_emotion("a", "happy")
+        return manager
+
+    manager = asyncio.run(run())
+    assert manager.get_mode("a") == "classroom"
+    assert manager.get_emotion("a") == "happy"
@@ -0,0 +1,25 @@
+from backend.signing import TokenSigner, load_secret
+
+
+def test_round_trip():
+    signer = TokenSigner(b"secret")
+    payload = {"text": "Photosynthesis 🌱", "voice": "en-US-AriaNeural"}
+
+    assert signer.loads(signer.dumps(payload)) == payload
+
+
+def test_rejects_tampered_and_foreign_tokens():
+    token = TokenSigner(b"secret").dumps("https://example.com/a.png")
+    body, _, signature = token.rpartition(".")
+
+    assert TokenSigner(b"secret").loads(body[:-1] + "A" + "." + signature) is None
+    assert TokenSigner(b"other").loads(token) is None
+    assert TokenSigner(b"secret").loads("garbage") is None
+
+
+def test_workers_on_one_node_share_the_generated_secret(tmp_path, monkeypatch):
+    monkeypatch.delenv("URL_SIGNING_SECRET", raising=False)
+    path = str(tmp_path / "secret")
+
+    assert load_secret(path) == load_secret(path)
+    assert [p.name for p in tmp_path.iterdir()] == ["secret"]
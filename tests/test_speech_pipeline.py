@@ -0,0 +1,45 @@
+import asyncio
+
+from backend.speech_pipeline import SentenceSplitter, SpeechPipeline
+
+
+def test_splits_streamed_text_into_sentences():
+    splitter = SentenceSplitter(min_chars=20)
+    sentences = []
+    for chunk in ["Plants make food from ", "light. Yes. They also", " need water!\nRoots", " take it up"]:
+        sentences += splitter.feed(chunk)
+
+    assert sentences == ["Plants make food from light.", "Yes. They also need water!"]
+    assert splitter.flush() == ["Roots take it up"]
+    assert splitter.flush() == []
+
+
+def test_delivers_audio_in_sentence_order_while_synthesizing_concurrently():
+    delays = {"first": 0.03, "second": 0.0, "broken": 0.0, "third": 0.01}
+    delivered = []
+
+    async def synthesize(sentence):
+        await asyncio.sleep(delays[sentence])
+        if sentence == "broken":
+            raise RuntimeError("engine failed")
+        for part in (1, 2):
+            yield f"{sentence}-{part}".encode()
+
+    async def deliver(index, chunk):
+        delivered.append((index, chunk.decode()))
+
+    async def end_segment(index):
+        delivered.append((index, "end"))
+
+    async def run():
+        pipeline = SpeechPipeline(synthesize, deliver, end_segment, max_in_flight=4)
+        for sentence in delays:
+            pipeline.add(sentence)
+        await pipeline.finish()
+        return pipeline.count
+
+    assert asyncio.run(run()) == 4
+    # A sentence that failed to synthesize is skipped without leaving a gap in the indexes
+    assert delivered == [(0, "first-1"), (0, "first-2"), (0, "end"),
+                         (1, "second-1"), (1, "second-2"), (1, "end"),
+                         (2, "third-1"), (2, "third-2"), (2, "end")]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backend.speech_to_text import ASR_SAMPLE_RATE, Recognizer, VoiceActivityDetector, pcm_to_samples
+
+
+def tone(ms: int, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(ASR_SAMPLE_RATE * ms // 1000) / ASR_SAMPLE_RATE
+    return (amplitude * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+def silence(ms: int) -> np.ndarray:
+    return np.zeros(ASR_SAMPLE_RATE * ms // 1000, dtype=np.int16)
+
+
+def make_vad() -> VoiceActivityDetector:
+    return VoiceActivityDetector(threshold_db=12, min_dbfs=-50, hangover_ms=200, pre_roll_ms=100,
+                                 min_speech_ms=100, max_segment_s=5)
+
+
+def feed_in_chunks(vad: VoiceActivityDetector, audio: np.ndarray, chunk: int = 777):
+    segments = []
+    for start in range(0, len(audio), chunk):
+        segments += vad.feed(audio[start:start + chunk])
+    return segments
+
+
+def test_cuts_an_utterance_with_pre_roll():
+    vad = make_vad()
+    segments = feed_in_chunks(vad, np.concatenate([silence(500), tone(600), silence(400)]))
+
+    assert len(segments) == 1
+    # Speech plus about 100 ms of pre-roll and 200 ms of hangover
+    duration_ms = len(segments[0]) * 1000 // ASR_SAMPLE_RATE
+    assert 850 <= duration_ms <= 950
+    assert not vad.in_speech
+
+
+def test_drops_clicks_and_reports_no_interim_audio_for_them():
+    vad = make_vad()
+    vad.feed(np.concatenate([silence(500), tone(60)]))
+
+    assert vad.in_speech and vad.current() is None
+    assert feed_in_chunks(vad, silence(400)) == []
+
+
+def test_resamples_pcm_to_the_recognizer_rate():
+    samples = pcm_to_samples(memoryview(tone(100).astype("<i2").tobytes()), ASR_SAMPLE_RATE * 3)
+
+    assert samples.dtype == np.int16
+    assert len(samples) == ASR_SAMPLE_RATE * 100 // 1000 // 3
+
+
+def test_recognizer_must_implement_transcribe():
+    class Incomplete(Recognizer):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from backend.tts_cache import TTSCache
+
+
+class SlowTTS:
+    """Writes part of the audio, then waits until cancelled."""
+
+    extension = ".wav"
+    current_voice = "test-voice"
+
+    async def save_audio_async(self, text, path, voice, rate, pitch):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        await asyncio.sleep(10)
+        return True
+
+
+def test_cancelled_synthesis_leaves_no_temp_file(tmp_path):
+    cache = TTSCache(SlowTTS(), str(tmp_path))
+
+    async def run():
+        task = asyncio.create_task(cache.get_or_synthesize("Hello there."))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert list(tmp_path.iterdir()) == []
+
+
+class TakeoverTTS:
+    """Hangs on the first synthesis until cancelled; later ones finish at once."""
+
+    extension = ".wav"
+    current_voice = "test-voice"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def save_audio_async(self, text, path, voice, rate, pitch):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(10)
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        return True
+
+    async def stream_audio(self, text, voice, rate, pitch):
+        self.calls += 1
+        yield b"first "
+        if self.calls == 1:
+            await asyncio.sleep(10)
+        yield b"audio"
+
+
+def test_waiter_takes_over_when_synthesizing_caller_is_cancelled(tmp_path):
+    tts = TakeoverTTS()
+    cache = TTSCache(tts, str(tmp_path))
+
+    async def run():
+        owner = asyncio.create_task(cache.get_or_synthesize("Hello there."))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_synthesize("Hello there."))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await waiter
+
+    path = asyncio.run(run())
+    assert path is not None
+    with open(path, "rb") as f:
+        assert f.read() == b"audio"
+    assert tts.calls == 2
+
+
+def test_stream_waiter_takes_over_when_listener_leaves(tmp_path):
+    tts = TakeoverTTS()
+    cache = TTSCache(tts, str(tmp_path))
+
+    async def read(stream):
+        return b"".join([chunk async for chunk in stream])
+
+    async def run():
+        owner = cache.stream("Hello there.")
+        assert await owner.__anext__() == b"first "
+        waiter = asyncio.create_task(read(cache.stream("Hello there.")))
+        await asyncio.sleep(0.01)
+        await owner.aclose()
+        return await waiter
+
+    assert asyncio.run(run()) == b"first audio"
+    assert tts.calls == 2